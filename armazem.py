@@ -0,0 +1,308 @@
+# Armazém de resultados - um único arquivo SQLite em vez de .txt + .json por teste
+# Índices por tipo de teste, alvo, interface, site e data; gravação em lotes.
+# Os diagnósticos gravam registros tipados (registro.Resultado) na coluna dados.
+# Resultados antigos saem para segmentos comprimidos em log_rede/arquivo/ (retencao.py);
+# consultar(arquivados=True), obter() e iterar() leem de lá quando preciso.
+# A retenção só apaga algo quando pedida (python retencao.py --aplicar) ou, com
+# ELIAS_RETENCAO=auto, na saída do programa, no máximo uma vez por dia.
+#
+# Importar os logs antigos: python armazem.py --importar log_rede
+
+import atexit
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import registro
+
+DIR_PADRAO = "log_rede"
+ARQUIVO_PADRAO = "elias.db"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    tipo TEXT NOT NULL,
+    titulo TEXT,
+    alvo TEXT,
+    interface TEXT,
+    site TEXT,
+    dados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ts ON resultados (ts);
+CREATE INDEX IF NOT EXISTS idx_tipo_ts ON resultados (tipo, ts);
+CREATE INDEX IF NOT EXISTS idx_alvo_ts ON resultados (alvo, ts);
+CREATE INDEX IF NOT EXISTS idx_interface_ts ON resultados (interface, ts);
+CREATE INDEX IF NOT EXISTS idx_site_tipo_ts ON resultados (site, tipo, ts);
+CREATE TABLE IF NOT EXISTS estado (
+    nome TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+COLUNAS = ("id", "ts", "tipo", "titulo", "alvo", "interface", "site", "dados")
+
+# nome_do_teste_2025-06-30_14-05-09.json (formato antigo de save_log)
+LEGADO = re.compile(r"^(?P<titulo>.+)_(?P<data>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$")
+
+
+class Armazem:
+    def __init__(self, caminho=None, lote=50, intervalo=2.0):
+        self.caminho = caminho or os.environ.get("ELIAS_DB") or os.path.join(DIR_PADRAO, ARQUIVO_PADRAO)
+        self.lote = lote
+        self.intervalo = intervalo
+        self.site = os.environ.get("ELIAS_SITE")
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        novo = not os.path.exists(self.caminho)
+        self._db = sqlite3.connect(self.caminho, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(ESQUEMA)
+        self._pendentes = []
+        self._ultimo_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._arquivo = None
+        if novo and pasta:
+            self.importar_legado(pasta)
+
+    def registrar(self, tipo, dados, alvo=None, interface=None, site=None, titulo=None, ts=None):
+        linha = (ts or time.time(), tipo, titulo or tipo, alvo, interface, site or self.site,
+                 registro.dumps(dados))
+        with self._lock:
+            self._pendentes.append(linha)
+            cheio = len(self._pendentes) >= self.lote
+            velho = time.monotonic() - self._ultimo_flush >= self.intervalo
+        if cheio or velho:
+            self.flush()
+
+    def registrar_resultado(self, resultado, site=None):
+        # Resultado tipado: as colunas indexadas saem do próprio registro
+        self.registrar(resultado.tipo, resultado.como_dict(), alvo=resultado.alvo,
+                       interface=resultado.interface, site=site, titulo=resultado.titulo, ts=resultado.ts)
+
+    def flush(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+            self._ultimo_flush = time.monotonic()
+            if not pendentes:
+                return 0
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO resultados (ts, tipo, titulo, alvo, interface, site, dados) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", pendentes)
+        return len(pendentes)
+
+    def consultar(self, tipo=None, alvo=None, interface=None, site=None, desde=None, ate=None,
+                  depois_de_id=None, limite=None, recentes_primeiro=True, arquivados=False):
+        # desde/ate: epoch em segundos (ou datetime); arquivados=True inclui os segmentos
+        self.flush()
+        desde = desde.timestamp() if isinstance(desde, datetime) else desde
+        ate = ate.timestamp() if isinstance(ate, datetime) else ate
+        filtros, params = [], []
+        for coluna, valor in (("tipo", tipo), ("alvo", alvo), ("interface", interface), ("site", site)):
+            if valor is not None:
+                filtros.append(f"{coluna} = ?")
+                params.append(valor)
+        if desde is not None:
+            filtros.append("ts >= ?")
+            params.append(desde)
+        if ate is not None:
+            filtros.append("ts <= ?")
+            params.append(ate)
+        if depois_de_id is not None:
+            filtros.append("id > ?")
+            params.append(depois_de_id)
+        sql = "SELECT " + ", ".join(COLUNAS) + " FROM resultados"
+        if filtros:
+            sql += " WHERE " + " AND ".join(filtros)
+        sql += " ORDER BY ts DESC, id DESC" if recentes_primeiro else " ORDER BY id"
+        if limite:
+            sql += f" LIMIT {int(limite)}"
+        with self._lock:
+            linhas = self._db.execute(sql, params).fetchall()
+        itens = [self._linha(l) for l in linhas]
+        if not arquivados or (limite and len(itens) >= limite):
+            return itens
+        # Os arquivados são todos mais antigos (ids menores) que os do banco
+        antigos = [item for item in self.arquivo().consultar(tipo, alvo, interface, site, desde, ate,
+                                                              limite and limite - len(itens), recentes_primeiro)
+                   if depois_de_id is None or item["id"] > depois_de_id]
+        return itens + antigos if recentes_primeiro else antigos + itens
+
+    def obter(self, id_):
+        self.flush()
+        with self._lock:
+            linha = self._db.execute("SELECT " + ", ".join(COLUNAS) + " FROM resultados WHERE id = ?",
+                                     (id_,)).fetchone()
+        return self._linha(linha) if linha else self.arquivo().obter(id_)
+
+    def contar(self, ate=None):
+        self.flush()
+        with self._lock:
+            if ate is not None:
+                return self._db.execute("SELECT COUNT(*) FROM resultados WHERE ts < ?", (ate,)).fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+    def iterar(self, depois_de_id=0, lote=1000):
+        # Percorre os resultados em ordem de inserção sem carregar tudo na memória;
+        # começa pelos segmentos arquivados se o cursor estiver antes deles
+        self.flush()
+        for seg in self.arquivo().segmentos():
+            if seg.id1 <= depois_de_id:
+                continue
+            for item in seg.iterar():
+                if item["id"] > depois_de_id:
+                    yield item
+                    depois_de_id = item["id"]
+        while True:
+            with self._lock:
+                linhas = self._db.execute(
+                    "SELECT " + ", ".join(COLUNAS) + " FROM resultados WHERE id > ? ORDER BY id LIMIT ?",
+                    (depois_de_id, lote)).fetchall()
+            if not linhas:
+                return
+            for linha in linhas:
+                yield self._linha(linha)
+            depois_de_id = linhas[-1][0]
+
+    # Estado persistente de outros módulos (ex: agregados do prognóstico)
+    def ler_estado(self, nome, padrao=None):
+        with self._lock:
+            linha = self._db.execute("SELECT valor FROM estado WHERE nome = ?", (nome,)).fetchone()
+        return json.loads(linha[0]) if linha else padrao
+
+    def gravar_estado(self, nome, valor):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO estado (nome, valor) VALUES (?, ?)",
+                             (nome, json.dumps(valor, ensure_ascii=False, separators=(",", ":"))))
+
+    # ---------- arquivamento (retencao.py) ----------
+
+    def arquivo(self):
+        if self._arquivo is None:
+            import retencao
+            self._arquivo = retencao.Arquivo(os.path.join(os.path.dirname(self.caminho), retencao.PASTA_ARQUIVO))
+        return self._arquivo
+
+    def arquivar(self, antes_de, compressao="auto"):
+        # Move para um segmento os resultados com ts < antes_de; devolve (quantidade, caminho).
+        # O de maior id fica sempre no banco: sem AUTOINCREMENT, uma tabela vazia
+        # voltaria a numerar do 1 e os ids repetiriam os do arquivo.
+        import retencao
+        self.flush()
+        filtro = "ts < ? AND id < (SELECT MAX(id) FROM resultados)"
+        with self._lock:
+            maior = self._db.execute(f"SELECT MAX(id), COUNT(*) FROM resultados WHERE {filtro}",
+                                     (antes_de,)).fetchone()
+            if not maior[1]:
+                return 0, None
+            cursor = self._db.execute("SELECT " + ", ".join(COLUNAS) + f" FROM resultados WHERE {filtro} "
+                                      "AND id <= ? ORDER BY id", (antes_de, maior[0]))
+            linhas = (linha for lote in iter(lambda: cursor.fetchmany(500), []) for linha in lote)
+            caminho = retencao.escrever_segmento(self.arquivo().pasta, linhas, compressao)
+            # Só apaga depois do segmento gravado (fsync + rename)
+            with self._db:
+                self._db.execute(f"DELETE FROM resultados WHERE {filtro} AND id <= ?", (antes_de, maior[0]))
+        return maior[1], caminho
+
+    def compactar(self):
+        # Devolve ao disco o espaço dos resultados arquivados quando sobra muito livre
+        with self._lock:
+            livres = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+            total = self._db.execute("PRAGMA page_count").fetchone()[0]
+            if total and livres > total // 4:
+                self._db.execute("VACUUM")
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def manter(self, politica=None, forcar=False):
+        # Retenção automática, no máximo uma vez por intervalo_h; devolve o relatório ou None
+        import retencao
+        p = dict(retencao.POLITICA_PADRAO, **(politica or {}))
+        ultima = self.ler_estado("retencao", {}).get("ts", 0)
+        if not forcar and time.time() - ultima < p["intervalo_h"] * 3600:
+            return None
+        rel = retencao.aplicar(self, p)
+        self.gravar_estado("retencao", {"ts": time.time()})
+        return rel
+
+    @staticmethod
+    def _linha(linha):
+        item = dict(zip(COLUNAS, linha))
+        item["dados"] = registro.loads(item["dados"])
+        return item
+
+    def importar_legado(self, pasta, simular=False):
+        # Converte os .json antigos de save_log; os .txt eram cópia do mesmo conteúdo.
+        # Devolve os .json que estão guardados no banco (importados agora ou antes);
+        # os ilegíveis ficam de fora e continuam no disco.
+        guardados = []
+        try:
+            nomes = sorted(os.listdir(pasta))
+        except OSError:
+            return guardados
+        for nome in nomes:
+            m = LEGADO.match(nome)
+            if not m:
+                continue
+            caminho = os.path.join(pasta, nome)
+            try:
+                with open(caminho, encoding="utf-8") as f:
+                    conteudo = json.load(f)
+                ts = datetime.strptime(m.group("data"), "%Y-%m-%d_%H-%M-%S").timestamp()
+            except (OSError, ValueError):
+                continue
+            if not isinstance(conteudo, dict):
+                continue
+            titulo = conteudo.get("title") or m.group("titulo")
+            if not simular:
+                with self._lock:
+                    existe = self._db.execute("SELECT 1 FROM resultados WHERE ts = ? AND titulo = ?",
+                                              (ts, titulo)).fetchone()
+                if not existe:
+                    self.registrar(titulo, {"output": conteudo.get("output", "")}, titulo=titulo, ts=ts)
+            guardados.append(caminho)
+        self.flush()
+        return guardados
+
+    def fechar(self):
+        self.flush()
+        if self._arquivo:
+            self._arquivo.fechar()
+        self._db.close()
+
+
+_armazem = None
+
+
+def abrir(caminho=None):
+    # Instância única da sessão; os pendentes são gravados na saída do programa
+    global _armazem
+    if _armazem is None:
+        _armazem = Armazem(caminho)
+        atexit.register(_armazem.flush)
+        if os.environ.get("ELIAS_RETENCAO") == "auto":
+            atexit.register(_manter_na_saida, _armazem)
+    return _armazem
+
+
+def _manter_na_saida(db):
+    # Retenção diária na saída do programa (só com ELIAS_RETENCAO=auto): não atrasa a
+    # abertura nem os testes
+    try:
+        db.manter()
+    except (OSError, ValueError, sqlite3.Error):
+        pass
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--importar":
+        print(f"{len(abrir().importar_legado(sys.argv[2]))} resultados no banco")
+    else:
+        print("Uso: python armazem.py --importar <pasta_de_logs>")
@@ -0,0 +1,462 @@
+# Teste de banda na LAN estilo iperf - um notebook roda o servidor, outro o cliente
+# Separa problema de Wi-Fi/LAN de problema do link de internet.
+# TCP: N fluxos por sentido (upload, download ou os dois ao mesmo tempo); quem envia
+# usa os.sendfile a partir de um memfd (sem cópia para o espaço do usuário) ou
+# send() de um memoryview fixo; quem recebe usa recv_into num buffer reaproveitado.
+# UDP: taxa alvo fixa, com perda, fora de ordem e jitter (RFC 3550) medidos no receptor.
+#
+# Uso: python elias.py --banda --servidor
+#      python elias.py --banda 192.168.0.10 --sentido bidir --fluxos 4 --duracao 10
+#      python elias.py --banda 192.168.0.10 --udp --taxa 300
+
+import argparse
+import json
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+
+import estatistica
+import instrumentos
+
+PORTA_PADRAO = 5201
+TAMANHO_BUFFER = 128 * 1024
+TAMANHO_FONTE = 4 * 2**20
+TAMANHO_UDP = 1400
+CABECALHO_UDP = struct.Struct("!IQ")  # seq, envio em ns (relógio de quem envia)
+SEQ_FIM = 0xFFFFFFFF
+
+
+def _enviar_json(sock, obj):
+    sock.sendall(json.dumps(obj, separators=(",", ":")).encode() + b"\n")
+
+
+def _ler_json(sock):
+    # Lê byte a byte até o \n: o que vem depois da linha pertence ao fluxo de dados
+    linha = bytearray()
+    while True:
+        c = sock.recv(1)
+        if not c:
+            raise ConnectionError("Conexão fechada pelo outro lado")
+        if c == b"\n":
+            return json.loads(linha)
+        linha += c
+        if len(linha) > 65536:
+            raise ValueError("Mensagem de controle grande demais")
+
+
+class _Contador:
+    # Bytes recebidos, em baldes de `intervalo` segundos a partir de `inicio`
+    def __init__(self, inicio, intervalo=1.0):
+        self.inicio = inicio
+        self.intervalo = intervalo
+        self.bytes = 0
+        self.baldes = []
+        self.primeiro = None
+        self.ultimo = None
+
+    def somar(self, n):
+        agora = time.perf_counter()
+        i = int((agora - self.inicio) / self.intervalo)
+        if i >= len(self.baldes):
+            self.baldes.extend([0] * (i + 1 - len(self.baldes)))
+        self.baldes[i] += n
+        self.bytes += n
+        self.primeiro = self.primeiro or agora
+        self.ultimo = agora
+
+    @property
+    def segundos(self):
+        return (self.ultimo - self.primeiro) if self.primeiro and self.ultimo > self.primeiro else 0.0
+
+    def como_dict(self):
+        return {"bytes": self.bytes, "segundos": self.segundos, "baldes": self.baldes}
+
+
+def _fonte_sendfile():
+    # Arquivo em memória para os.sendfile; None se o sistema não tiver memfd
+    if not hasattr(os, "memfd_create") or not hasattr(os, "sendfile"):
+        return None
+    fd = os.memfd_create("elias-banda")
+    os.ftruncate(fd, TAMANHO_FONTE)
+    return fd
+
+
+def _enviar_tcp(sock, duracao, fonte=None):
+    fim = time.perf_counter() + duracao
+    enviados = 0
+    try:
+        if fonte is not None:
+            deslocamento = 0
+            saida = sock.fileno()
+            while time.perf_counter() < fim:
+                try:
+                    n = os.sendfile(saida, fonte, deslocamento, min(4 * TAMANHO_BUFFER, TAMANHO_FONTE - deslocamento))
+                except BlockingIOError:
+                    # Socket com timeout é não bloqueante por baixo: espera caber mais
+                    if not select.select([], [sock], [], max(0.0, fim - time.perf_counter()))[1]:
+                        break
+                    continue
+                enviados += n
+                deslocamento = (deslocamento + n) % TAMANHO_FONTE
+        else:
+            visao = memoryview(bytes(TAMANHO_BUFFER))
+            while time.perf_counter() < fim:
+                enviados += sock.send(visao)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    return enviados
+
+
+def _receber_tcp(sock, contador, buffer=TAMANHO_BUFFER):
+    visao = memoryview(bytearray(buffer))
+    recv_into = sock.recv_into
+    somar = contador.somar
+    try:
+        while True:
+            n = recv_into(visao)
+            if not n:
+                break
+            somar(n)
+    except OSError:
+        pass
+
+
+def _enviar_udp(sock, destino, duracao, taxa_mbps, tamanho=TAMANHO_UDP):
+    # Ritmo por fatias de 1 ms; datagramas reaproveitam o mesmo buffer
+    buf = bytearray(tamanho)
+    por_segundo = taxa_mbps * 1e6 / 8 / tamanho
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+    seq = 0
+    try:
+        while True:
+            agora = time.perf_counter()
+            if agora >= fim:
+                break
+            devidos = int((agora - inicio) * por_segundo)
+            while seq < devidos:
+                CABECALHO_UDP.pack_into(buf, 0, seq, time.time_ns())
+                sock.sendto(buf, destino)
+                seq += 1
+            time.sleep(0.001)
+        for _ in range(5):
+            CABECALHO_UDP.pack_into(buf, 0, SEQ_FIM, time.time_ns())
+            sock.sendto(buf[:CABECALHO_UDP.size], destino)
+    except OSError:
+        pass
+    return seq
+
+
+def _receber_udp(sock, contador, limite):
+    # Termina com o datagrama de fim ou após `limite` segundos
+    jitter = estatistica.Jitter()
+    recebidos = fora_de_ordem = 0
+    maior = -1
+    visao = memoryview(bytearray(65535))
+    fim = time.perf_counter() + limite
+    sock.settimeout(0.5)
+    try:
+        # Rajadas de 1 ms do emissor não podem estourar o buffer padrão do kernel
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 2**20)
+    except OSError:
+        pass
+    while time.perf_counter() < fim:
+        try:
+            n = sock.recv_into(visao)
+        except socket.timeout:
+            continue
+        except OSError:
+            break
+        if n < CABECALHO_UDP.size:
+            continue
+        seq, enviado_ns = CABECALHO_UDP.unpack_from(visao)
+        if seq == SEQ_FIM:
+            break
+        contador.somar(n)
+        recebidos += 1
+        # O deslocamento entre relógios some na diferença entre trânsitos
+        jitter.adicionar((time.time_ns() - enviado_ns) / 1e6)
+        if seq < maior:
+            fora_de_ordem += 1
+        else:
+            maior = seq
+    esperados = maior + 1
+    return {"recebidos": recebidos, "esperados": esperados, "fora_de_ordem": fora_de_ordem,
+            "perda_pct": 100.0 * max(0, esperados - recebidos) / esperados if esperados else 0.0,
+            "jitter_ms": jitter.valor}
+
+
+def _resumo_sentido(contadores, intervalo, udp=None):
+    segundos = max((c["segundos"] for c in contadores), default=0.0)
+    total = sum(c["bytes"] for c in contadores)
+    n = max((len(c["baldes"]) for c in contadores), default=0)
+    baldes = [sum(c["baldes"][i] for c in contadores if i < len(c["baldes"])) for i in range(n)]
+    resumo = {"bytes": total, "segundos": segundos, "fluxos": len(contadores),
+              "vazao_mbps": total * 8 / (segundos * 1e6) if segundos else 0.0,
+              "intervalos_mbps": [b * 8 / (intervalo * 1e6) for b in baldes]}
+    if udp:
+        resumo.update(udp)
+    return resumo
+
+
+# ---------- servidor ----------
+
+class Servidor:
+    def __init__(self, host="0.0.0.0", porta=PORTA_PADRAO, ao_evento=None):
+        self.sock = socket.create_server((host, porta), reuse_port=False)
+        self.host, self.porta = self.sock.getsockname()[:2]
+        self.ao_evento = ao_evento
+        self.fonte = _fonte_sendfile()
+        self._sessoes = {}
+        self._lock = threading.Lock()
+        self._rodando = True
+
+    def servir(self):
+        while self._rodando:
+            try:
+                conn, origem = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._conexao, args=(conn, origem), daemon=True).start()
+
+    def iniciar(self):
+        threading.Thread(target=self.servir, daemon=True).start()
+        return self
+
+    def parar(self):
+        self._rodando = False
+        self.sock.close()
+        if self.fonte is not None:
+            os.close(self.fonte)
+            self.fonte = None
+
+    def _evento(self, texto):
+        if self.ao_evento:
+            self.ao_evento(texto)
+
+    def _conexao(self, conn, origem):
+        with conn:
+            try:
+                msg = _ler_json(conn)
+                if "sessao" in msg and "fluxo" in msg:
+                    self._fluxo(conn, msg)
+                else:
+                    self._controle(conn, origem, msg)
+            except (OSError, ValueError) as e:
+                self._evento(f"{origem[0]}: conexão encerrada ({e})")
+
+    def _controle(self, conn, origem, pedido):
+        sessao = uuid.uuid4().hex
+        intervalo = pedido.get("intervalo", 1.0)
+        estado = {"pedido": pedido, "inicio": None, "intervalo": intervalo,
+                  "contadores": [], "udp": None, "threads": []}
+        with self._lock:
+            self._sessoes[sessao] = estado
+        resposta = {"sessao": sessao}
+        udp = None
+        if pedido["protocolo"] == "udp":
+            udp = socket.socket(socket.AF_INET6 if ":" in origem[0] else socket.AF_INET, socket.SOCK_DGRAM)
+            udp.bind((self.host, 0))
+            resposta["porta_udp"] = udp.getsockname()[1]
+        self._evento(f"{origem[0]}: {pedido['protocolo'].upper()} {pedido['sentido']}, "
+                     f"{pedido['fluxos']} fluxo(s), {pedido['duracao']} s")
+        _enviar_json(conn, resposta)
+        try:
+            if udp:
+                self._udp(conn, udp, estado)
+            # Espera o cliente avisar que terminou de enviar/receber
+            _ler_json(conn)
+            for t in estado["threads"]:
+                t.join(pedido["duracao"] + 5)
+            relatorio = {"contadores": [c.como_dict() for c in estado["contadores"]], "udp": estado["udp"]}
+            _enviar_json(conn, relatorio)
+        finally:
+            if udp:
+                udp.close()
+            with self._lock:
+                self._sessoes.pop(sessao, None)
+
+    def _udp(self, conn, udp, estado):
+        pedido = estado["pedido"]
+        # O cliente manda um datagrama "olá" primeiro: é assim que sabemos para onde enviar
+        udp.settimeout(5.0)
+        _, cliente = udp.recvfrom(64)
+        inicio = time.perf_counter()
+        if pedido["sentido"] in ("download", "bidir"):
+            # Envia pela mesma porta que recebeu o "olá" (atravessa NAT/firewall de estado)
+            t = threading.Thread(target=_enviar_udp, args=(udp, cliente, pedido["duracao"], pedido["taxa_mbps"]),
+                                 daemon=True)
+            t.start()
+            estado["threads"].append(t)
+        if pedido["sentido"] in ("upload", "bidir"):
+            contador = _Contador(inicio, estado["intervalo"])
+            estado["contadores"].append(contador)
+            _enviar_json(conn, {"pronto": True})
+            estado["udp"] = _receber_udp(udp, contador, pedido["duracao"] + 3)
+        else:
+            _enviar_json(conn, {"pronto": True})
+
+    def _fluxo(self, conn, msg):
+        with self._lock:
+            estado = self._sessoes.get(msg["sessao"])
+        if estado is None:
+            return
+        pedido = estado["pedido"]
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if estado["inicio"] is None:
+            estado["inicio"] = time.perf_counter()
+        t = threading.current_thread()
+        estado["threads"].append(t)
+        if msg["sentido"] == "upload":
+            contador = _Contador(estado["inicio"], estado["intervalo"])
+            with self._lock:
+                estado["contadores"].append(contador)
+            _receber_tcp(conn, contador)
+        else:
+            _enviar_tcp(conn, pedido["duracao"], self.fonte)
+            # Espera o cliente fechar: garante que tudo foi entregue antes do close
+            try:
+                conn.settimeout(5.0)
+                while conn.recv(4096):
+                    pass
+            except OSError:
+                pass
+
+
+# ---------- cliente ----------
+
+def testar(servidor, porta=PORTA_PADRAO, protocolo="tcp", sentido="upload", fluxos=4, duracao=10.0,
+           taxa_mbps=100.0, intervalo=1.0, timeout=5.0):
+    # sentido: upload (cliente -> servidor), download ou bidir
+    pedido = {"protocolo": protocolo, "sentido": sentido, "fluxos": fluxos, "duracao": duracao,
+              "taxa_mbps": taxa_mbps, "intervalo": intervalo}
+    controle = socket.create_connection((servidor, porta), timeout)
+    controle.settimeout(duracao + 15)
+    with controle:
+        _enviar_json(controle, pedido)
+        resposta = _ler_json(controle)
+        sessao = resposta["sessao"]
+        inicio = time.perf_counter()
+        recebidos = []
+        threads = []
+        udp_cliente = None
+
+        if protocolo == "tcp":
+            sentidos = {"upload": ["upload"], "download": ["download"],
+                        "bidir": ["upload", "download"]}[sentido]
+            fonte = _fonte_sendfile() if "upload" in sentidos else None
+            for s in sentidos:
+                for i in range(fluxos):
+                    dados = socket.create_connection((servidor, porta), timeout)
+                    dados.settimeout(duracao + 10)
+                    dados.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    _enviar_json(dados, {"sessao": sessao, "fluxo": i, "sentido": s})
+                    if s == "upload":
+                        alvo, args = _enviar_tcp, (dados, duracao, fonte)
+                    else:
+                        contador = _Contador(inicio, intervalo)
+                        recebidos.append(contador)
+                        alvo, args = _receber_tcp, (dados, contador)
+                    t = threading.Thread(target=lambda a=alvo, g=args, d=dados: (a(*g), d.close()), daemon=True)
+                    t.start()
+                    threads.append(t)
+        else:
+            destino = (servidor, resposta["porta_udp"])
+            familia = socket.AF_INET6 if ":" in servidor else socket.AF_INET
+            udp = socket.socket(familia, socket.SOCK_DGRAM)
+            udp.sendto(b"ola", destino)
+            _ler_json(controle)  # servidor pronto
+            resultado_udp = {}
+            if sentido in ("upload", "bidir"):
+                envio = socket.socket(familia, socket.SOCK_DGRAM)
+                t = threading.Thread(target=lambda: (_enviar_udp(envio, destino, duracao, taxa_mbps),
+                                                     envio.close()), daemon=True)
+                t.start()
+                threads.append(t)
+            if sentido in ("download", "bidir"):
+                contador = _Contador(inicio, intervalo)
+                recebidos.append(contador)
+                t = threading.Thread(target=lambda: resultado_udp.update(
+                    _receber_udp(udp, contador, duracao + 3)), daemon=True)
+                t.start()
+                threads.append(t)
+            udp_cliente = (udp, resultado_udp)
+
+        for t in threads:
+            t.join(duracao + 10)
+        if protocolo == "tcp" and "upload" in sentidos and fonte is not None:
+            os.close(fonte)
+        _enviar_json(controle, {"fim": True})
+        relatorio = _ler_json(controle)
+        if udp_cliente:
+            udp_cliente[0].close()
+
+    resultado = {"servidor": servidor, "porta": porta, "protocolo": protocolo, "sentido": sentido,
+                 "fluxos": fluxos if protocolo == "tcp" else 1, "duracao_s": duracao}
+    if sentido in ("upload", "bidir"):
+        resultado["upload"] = _resumo_sentido(relatorio["contadores"], intervalo, relatorio.get("udp"))
+    if sentido in ("download", "bidir"):
+        resultado["download"] = _resumo_sentido([c.como_dict() for c in recebidos], intervalo,
+                                                udp_cliente[1] if udp_cliente else None)
+    for s, direcao in (("upload", "tx"), ("download", "rx")):
+        if s in resultado:
+            instrumentos.contar("bytes", resultado[s]["bytes"], origem="banda_" + protocolo, sentido=direcao)
+    # Campo que o prognóstico acompanha: a pior direção medida
+    resultado["vazao_mbps"] = min(resultado[s]["vazao_mbps"] for s in ("upload", "download") if s in resultado)
+    return resultado
+
+
+def formatar(resultado):
+    linhas = [f"{resultado['protocolo'].upper()} com {resultado['servidor']}:{resultado['porta']} "
+              f"({resultado['fluxos']} fluxo(s), {resultado['duracao_s']:g} s)"]
+    for s in ("upload", "download"):
+        r = resultado.get(s)
+        if not r:
+            continue
+        linha = f"{s.capitalize():9} {r['vazao_mbps']:9.2f} Mbps  ({r['bytes'] / 1e6:.1f} MB)"
+        if "perda_pct" in r:
+            linha += f"  perda {r['perda_pct']:.2f}%  jitter {r['jitter_ms']:.3f} ms  fora de ordem {r['fora_de_ordem']}"
+        linhas.append(linha)
+        linhas.append("          por segundo: " + " ".join(f"{m:.0f}" for m in r["intervalos_mbps"]))
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="elias --banda", description="Teste de banda na LAN (estilo iperf)")
+    parser.add_argument("servidor", nargs="?", help="endereço do servidor (modo cliente)")
+    parser.add_argument("--servidor", dest="modo_servidor", action="store_true", help="roda como servidor")
+    parser.add_argument("-p", "--porta", type=int, default=PORTA_PADRAO)
+    parser.add_argument("--udp", action="store_true", help="UDP com taxa fixa (perda e jitter)")
+    parser.add_argument("--sentido", choices=["upload", "download", "bidir"], default="upload")
+    parser.add_argument("--fluxos", type=int, default=4)
+    parser.add_argument("--duracao", type=float, default=10.0)
+    parser.add_argument("--taxa", type=float, default=100.0, help="taxa alvo do UDP em Mbps")
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    if args.modo_servidor:
+        srv = Servidor(porta=args.porta, ao_evento=lambda t: print(t, flush=True))
+        print(f"Servidor de banda escutando na porta {srv.porta} (Ctrl+C para sair)", flush=True)
+        try:
+            srv.servir()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.parar()
+        return 0
+    if not args.servidor:
+        parser.error("informe o endereço do servidor ou use --servidor")
+    r = testar(args.servidor, args.porta, "udp" if args.udp else "tcp", args.sentido,
+               args.fluxos, args.duracao, args.taxa)
+    print(json.dumps(r, ensure_ascii=False, indent=2) if args.json else formatar(r))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+# Latência sob carga (bufferbloat) - quanto o RTT sobe quando o link está cheio
+# Mede o RTT com o link ocioso e depois enquanto N fluxos HTTP saturam o download e,
+# em seguida, o upload. As sondas (ICMP; TCP connect sem permissão) saem a cada
+# `intervalo` o tempo todo e rodam no mesmo event loop que os geradores de carga:
+# cada amostra pertence à fase em que foi enviada, sem threads disputando o relógio.
+# Ao fim de cada fase as conexões são derrubadas com RST (SO_LINGER 0) para o que
+# ficou no buffer do kernel não vazar para a fase seguinte.
+# O acréscimo é a mediana do RTT sob carga menos a mediana ociosa; a nota segue a
+# escala usual dos testes de bufferbloat (A+ até 5 ms a mais, F acima de 400 ms).
+# Sob carga a sonda espera mais (`timeout_carga`) e a que não volta entra na mediana
+# valendo o próprio timeout: fila de vários segundos dá F, não "sem resposta". Perda
+# sob carga PERDA_CARGA_F pontos acima da ociosa também dá F.
+#
+# Uso: python carga.py [--alvo 1.1.1.1] [--fluxos 8] [--duracao 10] [--json]
+#      python carga.py --local     (servidor em loopback, sem internet)
+
+import argparse
+import asyncio
+import json
+import socket
+import ssl
+import struct
+import sys
+import time
+from urllib.parse import urlsplit
+
+import estatistica
+import instrumentos
+import sonda
+
+URL_DOWNLOAD = "https://speed.cloudflare.com/__down?bytes=100000000"
+URL_UPLOAD = "https://speed.cloudflare.com/__up"
+ALVO_PADRAO = "1.1.1.1"
+
+OCIOSO, DOWNLOAD, UPLOAD = "ocioso", "download", "upload"
+FASES = (OCIOSO, DOWNLOAD, UPLOAD)
+
+TAMANHO_BUFFER = 256 * 1024
+TAMANHO_UPLOAD = 25 * 10**6  # corpo de cada POST; ao terminar, outro na mesma conexão
+USER_AGENT = "elias-carga"
+
+# acréscimo de latência sob carga (ms) -> nota
+NOTAS = ((5, "A+"), (30, "A"), (60, "B"), (200, "C"), (400, "D"))
+LETRAS = [letra for _, letra in NOTAS] + ["F"]
+# Pontos percentuais de perda a mais sob carga que já valem F (fila transbordando)
+PERDA_CARGA_F = 10.0
+
+
+def nota(acrescimo_ms, perda_a_mais=0.0):
+    if acrescimo_ms is None:
+        return None
+    if perda_a_mais >= PERDA_CARGA_F:
+        return "F"
+    for limite, letra in NOTAS:
+        if acrescimo_ms <= limite:
+            return letra
+    return "F"
+
+
+class _Gerador:
+    # Um fluxo de carga: conexão keep-alive baixando (GET) ou enviando (POST) em laço
+    def __init__(self, url, sentido, timeout, contexto_ssl):
+        self.url = url
+        self.partes = urlsplit(url)
+        self.sentido = sentido
+        self.timeout = timeout
+        self.contexto_ssl = contexto_ssl
+        self.bytes = 0
+        self.conexoes = 0
+        self.requisicoes = 0
+        self.erro = None
+        self.parar = False
+        self.reader = None
+        self.writer = None
+
+    async def _conectar(self):
+        https = self.partes.scheme == "https"
+        porta = self.partes.port or (443 if https else 80)
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(
+            self.partes.hostname, porta, ssl=self.contexto_ssl if https else None,
+            limit=TAMANHO_BUFFER), self.timeout)
+        sock = self.writer.get_extra_info("socket")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.conexoes += 1
+
+    def _derrubar(self):
+        # RST em vez de FIN: descarta na hora o que ainda estava no buffer de envio
+        if self.writer is None:
+            return
+        sock = self.writer.get_extra_info("socket")
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+        self.writer.transport.abort()
+        self.reader = self.writer = None
+
+    def _pedido(self, metodo, extras=""):
+        caminho = (self.partes.path or "/") + (f"?{self.partes.query}" if self.partes.query else "")
+        return (f"{metodo} {caminho} HTTP/1.1\r\nHost: {self.partes.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                f"Accept-Encoding: identity\r\n{extras}\r\n").encode("latin-1")
+
+    async def _resposta(self):
+        linha = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not linha:
+            raise ConnectionError("Conexão fechada sem resposta")
+        status = int(linha.split()[1])
+        headers = {}
+        while True:
+            linha = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not linha.strip():
+                break
+            k, _, v = linha.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if status >= 400:
+            raise ValueError(f"HTTP {status}")
+        self.requisicoes += 1
+        return headers
+
+    async def _descartar(self, headers, contar):
+        # Lê o corpo da resposta; devolve True se a conexão pode ser reaproveitada
+        tamanho = headers.get("content-length")
+        restante = int(tamanho) if tamanho is not None else None
+        read = self.reader.read
+        while not self.parar and (restante is None or restante > 0):
+            dados = await asyncio.wait_for(read(TAMANHO_BUFFER if restante is None
+                                                else min(restante, TAMANHO_BUFFER)), self.timeout)
+            if not dados:
+                if restante is not None:
+                    raise ConnectionError("Conexão fechada no meio da resposta")
+                break
+            if contar:
+                self.bytes += len(dados)
+            if restante is not None:
+                restante -= len(dados)
+        return restante == 0 and headers.get("connection", "").lower() != "close"
+
+    async def _baixar(self):
+        self.writer.write(self._pedido("GET"))
+        return await self._descartar(await self._resposta(), True)
+
+    async def _enviar(self, bloco):
+        self.writer.write(self._pedido("POST", "Content-Type: application/octet-stream\r\n"
+                                               f"Content-Length: {TAMANHO_UPLOAD}\r\n"))
+        restante = TAMANHO_UPLOAD
+        while not self.parar and restante > 0:
+            n = min(restante, len(bloco))
+            self.writer.write(bloco[:n])
+            # drain só volta quando o buffer do transporte esvazia: conta o que saiu
+            await asyncio.wait_for(self.writer.drain(), self.timeout)
+            self.bytes += n
+            restante -= n
+        if self.parar:
+            return False
+        return await self._descartar(await self._resposta(), False)
+
+    async def rodar(self, bloco):
+        try:
+            while not self.parar:
+                if self.writer is None:
+                    await self._conectar()
+                reaproveitar = await (self._baixar() if self.sentido == DOWNLOAD else self._enviar(bloco))
+                if not reaproveitar:
+                    self._derrubar()
+        except (OSError, ValueError, IndexError, EOFError, asyncio.TimeoutError) as e:
+            self.erro = str(e) or type(e).__name__
+        finally:
+            self._derrubar()
+
+
+def _resumo_fase(st, geradores, bytes_medidos, segundos):
+    r = st.resumo()
+    r["vazao_mbps"] = bytes_medidos * 8 / (segundos * 1e6) if geradores and segundos > 0 else None
+    r["bytes"] = sum(g.bytes for g in geradores)
+    r["conexoes"] = sum(g.conexoes for g in geradores)
+    r["erros"] = sorted({g.erro for g in geradores if g.erro})
+    return r
+
+
+async def medir(url_download=URL_DOWNLOAD, url_upload=URL_UPLOAD, alvo=ALVO_PADRAO, fluxos=8, duracao=10.0,
+                ocioso=5.0, aquecimento=2.0, respiro=1.0, intervalo=0.05, timeout=2.0, timeout_carga=5.0,
+                metodo="auto", porta=None, ao_intervalo=None, contexto_ssl=None):
+    # url_download/url_upload=None pulam o sentido. Vazão ignora os primeiros
+    # `aquecimento` segundos de cada fase (slow start); a latência conta a fase toda.
+    # ao_intervalo(fase, t, mbps, stats) a cada segundo; mbps é None no ocioso.
+    try:
+        familia, endereco = await sonda._resolver(alvo)
+    except (socket.gaierror, OSError):
+        raise ValueError(f"Não foi possível resolver {alvo}")
+    if metodo == "auto":
+        metodo = "icmp" if sonda.icmp_disponivel(familia) else "tcp"
+    porta = porta or sonda.PORTA_PADRAO.get(metodo)
+    canal = sonda.CanalICMP(familia) if metodo == "icmp" else None
+
+    def _eco(limite):
+        if canal:
+            return canal.eco(endereco, limite)
+        if metodo == "udp":
+            return sonda.eco_udp(endereco, porta, limite, familia)
+        return sonda.eco_tcp(endereco, porta, limite)
+
+    limites = {OCIOSO: timeout, DOWNLOAD: timeout_carga, UPLOAD: timeout_carga}
+    stats = {f: sonda.EstatisticasRTT(alvo) for f in FASES}
+    com_perdas = {f: [] for f in FASES}  # RTT de cada sonda; perda vale o timeout da fase
+    serie = []
+    atual = [None]  # fase que recebe as sondas enviadas agora (None no respiro)
+    inicio = time.perf_counter()
+    pendentes = set()
+
+    async def _sonda(fase, seq, t):
+        rtt = await _eco(limites[fase])
+        instrumentos.contar("sondas", metodo=metodo)
+        if rtt is None:
+            stats[fase].registrar_perda(seq)
+        else:
+            stats[fase].registrar_resposta(seq, rtt)
+        com_perdas[fase].append(rtt if rtt is not None else limites[fase] * 1000)
+        serie.append([round(t, 2), fase, round(rtt, 2) if rtt is not None else None])
+
+    async def _sondador():
+        seq = 0
+        proximo = time.perf_counter()
+        while True:
+            fase = atual[0]
+            if fase is not None:
+                stats[fase].registrar_envio(seq)
+                tarefa = asyncio.ensure_future(_sonda(fase, seq, time.perf_counter() - inicio))
+                pendentes.add(tarefa)
+                tarefa.add_done_callback(pendentes.discard)
+                seq += 1
+            # Intervalo fixo a partir do relógio, sem acumular atraso
+            proximo += intervalo
+            await asyncio.sleep(max(0.0, proximo - time.perf_counter()))
+
+    async def _fase(nome, segundos, geradores=()):
+        bloco = memoryview(bytes(TAMANHO_BUFFER))
+        tarefas = [asyncio.ensure_future(g.rodar(bloco)) for g in geradores]
+        atual[0] = nome
+        t0 = anterior_t = time.perf_counter()
+        anterior = 0
+        base = None  # (bytes, instante) no fim do aquecimento
+        try:
+            while True:
+                agora = time.perf_counter()
+                if agora - t0 >= segundos or (tarefas and all(t.done() for t in tarefas)):
+                    break
+                await asyncio.sleep(min(1.0, t0 + segundos - agora))
+                agora = time.perf_counter()
+                total = sum(g.bytes for g in geradores)
+                mbps = (total - anterior) * 8 / ((agora - anterior_t) * 1e6) if geradores else None
+                if base is None and agora - t0 >= min(aquecimento, segundos / 2):
+                    base = (total, agora)
+                anterior, anterior_t = total, agora
+                if ao_intervalo:
+                    ao_intervalo(nome, agora - t0, mbps, stats[nome])
+        finally:
+            atual[0] = None
+            # A bandeira garante a parada mesmo se o wait_for engolir o cancelamento
+            for g in geradores:
+                g.parar = True
+            for t in tarefas:
+                t.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+        if base is None:
+            base = (0, t0)
+        return _resumo_fase(stats[nome], geradores, anterior - base[0], anterior_t - base[1])
+
+    contexto = contexto_ssl or ssl.create_default_context()
+    sondador = asyncio.ensure_future(_sondador())
+    fases = {}
+    try:
+        fases[OCIOSO] = await _fase(OCIOSO, ocioso)
+        for nome, url in ((DOWNLOAD, url_download), (UPLOAD, url_upload)):
+            if not url:
+                continue
+            # Respiro: a fila do enlace esvazia antes da próxima fase
+            await asyncio.sleep(respiro)
+            geradores = [_Gerador(url, nome, timeout * 5, contexto) for _ in range(fluxos)]
+            fases[nome] = await _fase(nome, duracao, geradores)
+            instrumentos.contar("bytes", fases[nome]["bytes"], origem="carga",
+                                sentido="rx" if nome == DOWNLOAD else "tx")
+    finally:
+        sondador.cancel()
+        await asyncio.gather(sondador, return_exceptions=True)
+        if pendentes:
+            await asyncio.gather(*pendentes, return_exceptions=True)
+        if canal:
+            canal.fechar()
+    # As sondas atrasadas só terminam agora: refaz o resumo de latência de cada fase
+    for nome, r in fases.items():
+        r.update(stats[nome].resumo())
+        quantis = estatistica.percentis(com_perdas[nome], (50, 90))
+        r["p50_com_perdas_ms"], r["p90_com_perdas_ms"] = quantis[50], quantis[90]
+        r["timeout_ms"] = limites[nome] * 1000
+
+    ociosa = fases[OCIOSO]["p50_ms"]
+    acrescimos = {}
+    for nome in (DOWNLOAD, UPLOAD):
+        if nome in fases:
+            # Sem bytes transferidos o link não foi carregado: nada a comparar
+            sob_carga = fases[nome]["p50_com_perdas_ms"] if fases[nome]["bytes"] else None
+            acrescimos[nome] = (max(0.0, sob_carga - ociosa)
+                                if sob_carga is not None and ociosa is not None else None)
+    notas = {nome: nota(a, fases[nome]["perda_pct"] - fases[OCIOSO]["perda_pct"])
+             for nome, a in acrescimos.items()}
+    validos = [a for a in acrescimos.values() if a is not None]
+    pior = max(validos) if validos else None
+    letras = [n for n in notas.values() if n]
+    return {
+        "alvo": alvo,
+        "metodo": metodo,
+        "urls": {DOWNLOAD: url_download, UPLOAD: url_upload},
+        "fluxos": fluxos,
+        "intervalo_s": intervalo,
+        "fases": fases,
+        "acrescimo_ms": acrescimos,
+        "pior_acrescimo_ms": pior,
+        "pior_perda_pct": max((fases[n]["perda_pct"] for n in acrescimos), default=None),
+        "notas": notas,
+        "nota": max(letras, key=LETRAS.index) if letras else None,
+        "serie": serie,
+    }
+
+
+def testar(**kwargs):
+    return asyncio.run(medir(**kwargs))
+
+
+def formatar(r):
+    def ms(v):
+        return f"{v:.1f}" if v is not None else "-"
+
+    def quantil(nome, f, p):
+        # Sob carga, os quantis contam as perdas; no timeout, são só um limite inferior
+        if nome == OCIOSO:
+            return ms(f[f"{p}_ms"])
+        v = f[f"{p}_com_perdas_ms"]
+        return f">={v:.0f}" if v is not None and v >= f["timeout_ms"] else ms(v)
+
+    linhas = [f"Sondas {r['metodo'].upper()} para {r['alvo']} a cada {r['intervalo_s'] * 1000:.0f} ms",
+              f"{'Fase':<9} {'p50 ms':>8} {'p90 ms':>8} {'+p50 ms':>8} {'Perda':>6} {'Mbps':>8}  Nota"]
+    for nome in FASES:
+        f = r["fases"].get(nome)
+        if f is None:
+            continue
+        acrescimo = r["acrescimo_ms"].get(nome)
+        mbps = f"{f['vazao_mbps']:.1f}" if f["vazao_mbps"] is not None else "-"
+        linhas.append(f"{nome:<9} {quantil(nome, f, 'p50'):>8} {quantil(nome, f, 'p90'):>8} {ms(acrescimo):>8} "
+                      f"{f['perda_pct']:>5.1f}% {mbps:>8}  {r['notas'].get(nome) or ''}")
+        if f["erros"]:
+            linhas.append(f"          erros: {', '.join(f['erros'])}")
+    if r["nota"]:
+        perda = f", {r['pior_perda_pct']:.1f}% de perda" if r["pior_perda_pct"] else ""
+        linhas.append(f"\nNota: {r['nota']} (+{r['pior_acrescimo_ms']:.1f} ms sob carga{perda})")
+    else:
+        linhas.append("\nSem nota: sondas sem resposta ou link sem carga")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latência sob carga (bufferbloat)")
+    parser.add_argument("--alvo", default=None, help=f"destino das sondas (padrão: {ALVO_PADRAO})")
+    parser.add_argument("--download", default=URL_DOWNLOAD, help="URL para saturar o download ('' pula)")
+    parser.add_argument("--upload", default=URL_UPLOAD, help="URL que aceita POST para saturar o upload ('' pula)")
+    parser.add_argument("--fluxos", type=int, default=8, help="conexões em paralelo por sentido")
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos de carga por sentido")
+    parser.add_argument("--ocioso", type=float, default=5.0, help="segundos medindo o RTT ocioso")
+    parser.add_argument("--intervalo", type=float, default=0.05, help="segundos entre sondas")
+    parser.add_argument("--timeout-carga", type=float, default=5.0,
+                        help="segundos que uma sonda espera durante a carga")
+    parser.add_argument("--metodo", choices=["auto", "icmp", "tcp", "udp"], default="auto")
+    parser.add_argument("--local", action="store_true", help="carga contra um servidor em loopback")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    local = None
+    if args.local:
+        import vazao
+        local = vazao.ServidorLocal().iniciar()
+        args.download, args.upload = local.url, f"http://{local.host}:{local.porta}/"
+        args.alvo = args.alvo or local.host
+
+    def ao_intervalo(fase, t, mbps, st):
+        if not args.json:
+            rtt = st.esboco.quantil(0.5)
+            print(f"  {fase:<9} {t:5.1f} s  RTT p50 {rtt if rtt is not None else 0:7.1f} ms" +
+                  (f"  {mbps:9.2f} Mbps" if mbps is not None else ""), flush=True)
+
+    try:
+        r = testar(url_download=args.download or None, url_upload=args.upload or None,
+                   alvo=args.alvo or ALVO_PADRAO, fluxos=args.fluxos, duracao=args.duracao, ocioso=args.ocioso,
+                   intervalo=args.intervalo, timeout_carga=args.timeout_carga, metodo=args.metodo,
+                   ao_intervalo=ao_intervalo)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if local:
+            local.parar()
+    if args.json:
+        print(json.dumps(r, ensure_ascii=False, indent=2))
+    else:
+        print(formatar(r))
+    return 0 if r["nota"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# Checkup completo sem interação - executa diagnósticos em paralelo e devolve JSON
+# Uso: python elias.py --checkup [perfil.json] [-o resultado.json]
+#      python checkup.py --diagnosticos ping_gateway,dns,mtu
+#
+# Perfil (JSON): {"nome": "...", "diagnosticos": [{"tipo": "ping_gateway", "contagem": 10}, ...]}
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from datetime import datetime
+
+import estado_rede
+import instrumentos
+import pmtu
+import resolvedor
+import sonda
+import web
+
+OK = "ok"
+ALERTA = "alerta"
+FALHA = "falha"
+ERRO = "erro"
+
+PERFIL_PADRAO = {
+    "nome": "completo",
+    "diagnosticos": [
+        {"tipo": "ping_gateway"},
+        {"tipo": "dns"},
+        {"tipo": "captive"},
+        {"tipo": "mtu"},
+        {"tipo": "dns_bloqueado"},
+        {"tipo": "ip_publico"},
+    ],
+}
+
+
+# ---------- diagnósticos ----------
+
+async def checar_ping_gateway(contagem=10, intervalo=0.2, alvo=None):
+    alvo = alvo or estado_rede.obter().gateway()
+    if not alvo:
+        return FALHA, {"erro": "Gateway não encontrado"}
+    st = (await sonda.sondar([alvo], contagem=contagem, intervalo=intervalo,
+                             parar_quando=sonda.resultado_claro))[alvo]
+    dados = st.resumo()
+    if st.erro or st.recebidos == 0 or st.perda_pct > 20 or st.media > 150:
+        return FALHA, dados
+    if st.perda_pct > 5 or st.media > 80 or st.jitter > 20:
+        return ALERTA, dados
+    return OK, dados
+
+
+async def checar_dns(nomes=None, servidores=None, publicos=False, repeticoes=1, timeout=2.0):
+    # servidores: {"rótulo": "ip"}; padrão = resolvedores do /etc/resolv.conf
+    servidores = servidores or resolvedor.servidores_padrao(publicos=publicos)
+    if not servidores:
+        return FALHA, {"erro": "Nenhum resolvedor configurado"}
+    bench = await resolvedor.benchmark(servidores, nomes=nomes, repeticoes=repeticoes, timeout=timeout)
+    falhas = [r["falha_pct"] for r in bench["resolvedores"]]
+    status = FALHA if min(falhas) >= 50 else (ALERTA if max(falhas) > 0 else OK)
+    return status, bench
+
+
+async def checar_captive(url=None, timeout=5.0):
+    # url: uma URL de teste (esperado 204); padrão = as URLs de teste de Android, Firefox e Apple juntas
+    r = await web.detectar_captive([url] if url else None, timeout)
+    status = {web.LIVRE: OK, web.SEM_ACESSO: FALHA}.get(r["estado"], ALERTA)
+    return status, {"estado": r["estado"], "portal": r["portal"], "sondas": [web.resumo(s) for s in r["sondas"]]}
+
+
+async def checar_web(urls=None, timeout=5.0, lento_ms=2000):
+    # Tempo por fase (DNS/TCP/TLS/TTFB) de cada URL; a fase mais lenta aponta o gargalo
+    resultados = await web.sondar_varias(urls or web.URLS_PADRAO, timeout=timeout)
+    erros = [r for r in resultados if r["erro"]]
+    lentos = [r for r in resultados if not r["erro"] and r["fases"]["total_ms"] > lento_ms]
+    status = FALHA if len(erros) == len(resultados) else (ALERTA if erros or lentos else OK)
+    return status, {"urls": [web.resumo(r) for r in resultados]}
+
+
+async def checar_mtu(destinos=("8.8.8.8",)):
+    resultados = await pmtu.descobrir(list(destinos))
+    ruins = [r for r in resultados.values() if r["status"] != "ok"]
+    baixos = [r for r in resultados.values() if r["pmtu"] and r["pmtu"] < 1500]
+    status = FALHA if len(ruins) == len(resultados) else (ALERTA if ruins or baixos else OK)
+    return status, {"destinos": list(resultados.values())}
+
+
+async def checar_dns_bloqueado(servidor="8.8.8.8", timeout=2.0):
+    loop = asyncio.get_running_loop()
+    dados = {"servidor": servidor}
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(servidor, 53), timeout)
+        writer.close()
+        dados["tcp"] = True
+    except (OSError, asyncio.TimeoutError):
+        dados["tcp"] = False
+    # UDP "connect" não prova nada: só conta como acessível se vier resposta DNS
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        try:
+            s.connect((servidor, 53))
+            consulta = resolvedor.montar_consulta("google.com")
+            await loop.sock_sendall(s, consulta)
+            resposta = await asyncio.wait_for(loop.sock_recv(s, 512), timeout)
+            dados["udp"] = resposta[:2] == consulta[:2]
+        except (OSError, asyncio.TimeoutError):
+            dados["udp"] = False
+    status = OK if dados["tcp"] and dados["udp"] else (FALHA if not dados["udp"] else ALERTA)
+    return status, dados
+
+
+async def checar_ip_publico(url=web.IP_PUBLICO, timeout=5.0):
+    r = await web.sondar(url, timeout)
+    if r["erro"]:
+        return FALHA, {"url": url, "erro": r["erro"], "fase_erro": r["fase_erro"]}
+    ip = r["corpo"].decode("latin-1").strip()
+    return (OK if r["status"] == 200 and ip else ALERTA), {"url": url, "status_http": r["status"], "ip": ip,
+                                                           "fases": web.resumo(r)["fases"]}
+
+
+DIAGNOSTICOS = {
+    "ping_gateway": checar_ping_gateway,
+    "dns": checar_dns,
+    "captive": checar_captive,
+    "mtu": checar_mtu,
+    "dns_bloqueado": checar_dns_bloqueado,
+    "ip_publico": checar_ip_publico,
+    "web": checar_web,
+}
+
+
+async def _executar_um(item, timeout_padrao):
+    params = dict(item)
+    tipo = params.pop("tipo")
+    limite = params.pop("timeout_total", timeout_padrao)
+    inicio = time.perf_counter()
+    if tipo not in DIAGNOSTICOS:
+        return {"tipo": tipo, "status": ERRO, "duracao_s": 0.0,
+                "dados": {"erro": f"Diagnóstico desconhecido: {tipo}"}}
+    with instrumentos.Trecho(tipo, "diagnostico") as trecho:
+        try:
+            status, dados = await asyncio.wait_for(DIAGNOSTICOS[tipo](**params), limite)
+        except asyncio.TimeoutError:
+            instrumentos.contar("timeouts", origem="diagnostico")
+            status, dados = FALHA, {"erro": f"Tempo limite de {limite}s excedido"}
+        except Exception as e:
+            status, dados = ERRO, {"erro": f"{type(e).__name__}: {e}"}
+        trecho.atributos["status"] = status
+    return {"tipo": tipo, "status": status,
+            "duracao_s": round(time.perf_counter() - inicio, 3), "dados": dados}
+
+
+async def executar_perfil(perfil, timeout_padrao=30.0):
+    data_inicio = datetime.now().isoformat(timespec="seconds")
+    inicio = time.perf_counter()
+    resultados = await asyncio.gather(*(_executar_um(item, timeout_padrao)
+                                        for item in perfil["diagnosticos"]))
+    return {
+        "perfil": perfil.get("nome", "personalizado"),
+        "inicio": data_inicio,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+        "resumo": {s: sum(1 for r in resultados if r["status"] == s) for s in (OK, ALERTA, FALHA, ERRO)},
+        "resultados": resultados,
+    }
+
+
+def carregar_perfil(caminho=None, diagnosticos=None):
+    if caminho:
+        with open(caminho, encoding="utf-8") as f:
+            perfil = json.load(f)
+    else:
+        perfil = dict(PERFIL_PADRAO)
+    if diagnosticos:
+        escolhidos = set(diagnosticos)
+        perfil["diagnosticos"] = [d for d in perfil["diagnosticos"] if d["tipo"] in escolhidos] + \
+            [{"tipo": t} for t in diagnosticos if t not in {d["tipo"] for d in perfil["diagnosticos"]}]
+    return perfil
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="elias --checkup", description="Checkup de rede sem interação")
+    parser.add_argument("perfil", nargs="?", help="arquivo JSON com a lista de diagnósticos")
+    parser.add_argument("--diagnosticos", help=f"lista separada por vírgula ({','.join(DIAGNOSTICOS)})")
+    parser.add_argument("-o", "--saida", help="grava o JSON neste arquivo em vez da saída padrão")
+    parser.add_argument("--timeout", type=float, default=30.0, help="tempo limite por diagnóstico (s)")
+    parser.add_argument("--trace", metavar="PASTA",
+                        help="grava trechos e contadores da execução (JSON, Chrome trace e Prometheus)")
+    parser.add_argument("--profile", action="store_true",
+                        help="roda o diagnóstico sob cProfile (exige um só em --diagnosticos)")
+    args = parser.parse_args(argv)
+
+    diagnosticos = args.diagnosticos.split(",") if args.diagnosticos else None
+    if args.profile and (not diagnosticos or len(diagnosticos) != 1):
+        parser.error("--profile exige exatamente um diagnóstico em --diagnosticos")
+    perfil = carregar_perfil(args.perfil, diagnosticos)
+    if args.profile:
+        arquivo = os.path.join(args.trace, f"perfil_{diagnosticos[0]}.pstats") if args.trace else None
+        if arquivo:
+            os.makedirs(args.trace, exist_ok=True)
+        relatorio, texto_perfil = instrumentos.perfilar(asyncio.run, executar_perfil(perfil, args.timeout),
+                                                        arquivo=arquivo)
+        print(texto_perfil, file=sys.stderr)
+    else:
+        relatorio = asyncio.run(executar_perfil(perfil, args.timeout))
+    if args.trace:
+        print(instrumentos.resumo(), file=sys.stderr)
+        for caminho in instrumentos.exportar(args.trace).values():
+            print(f"Trace: {caminho}", file=sys.stderr)
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto)
+    else:
+        print(texto)
+    return 0 if relatorio["resumo"][OK] == len(relatorio["resultados"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+# Execução de comandos externos - tudo que elias.py ainda roda por fora passa aqui
+# Lista de argumentos (nunca shell=True), tempo limite por comando com morte do grupo
+# de processos inteiro (sudo + filho), mapa de ferramentas disponíveis montado uma
+# vez só e um pool de threads para rodar comandos independentes ao mesmo tempo.
+# Cada execução vira um trecho "comando" (com o spawn medido à parte) na instrumentação.
+
+import collections
+import contextvars
+import os
+import shutil
+import signal
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentos
+
+TIMEOUT_PADRAO = 30.0
+FERRAMENTAS = ("dig", "host", "mtr", "nc", "nmcli", "whois", "speedtest",
+               "curl", "journalctl", "ping", "ip", "sudo")
+
+CODIGO_TIMEOUT = 124   # mesmo código do coreutils `timeout`
+CODIGO_AUSENTE = 127   # mesmo código do shell para comando inexistente
+
+_ferramentas = None
+_pool = None
+_lock = threading.Lock()
+
+
+def ferramentas():
+    # {nome: caminho ou None}, montado na primeira chamada
+    global _ferramentas
+    if _ferramentas is None:
+        _ferramentas = {nome: shutil.which(nome) for nome in FERRAMENTAS}
+    return _ferramentas
+
+
+def existe(nome):
+    caminhos = ferramentas()
+    if nome not in caminhos:
+        caminhos[nome] = shutil.which(nome)
+    return caminhos[nome] is not None
+
+
+def com_sudo(args):
+    # Como root o sudo é dispensável (e pode nem estar instalado)
+    return list(args) if os.geteuid() == 0 else ["sudo"] + list(args)
+
+
+def _matar(processo):
+    try:
+        os.killpg(processo.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        processo.kill()
+
+
+def _medir(args, funcao, *resto):
+    # Trecho + contadores em volta de uma execução; o código de saída é o último item
+    nome = os.path.basename(args[0])
+    with instrumentos.Trecho(nome, "comando", args=" ".join(args)[:200]) as trecho:
+        resultado = funcao(args, *resto)
+        trecho.atributos["codigo"] = resultado[-1]
+    instrumentos.contar("comandos", comando=nome)
+    if resultado[-1] == CODIGO_TIMEOUT:
+        instrumentos.contar("timeouts", origem="comando", comando=nome)
+    return resultado
+
+
+def _abrir(args, **opcoes):
+    with instrumentos.Trecho("spawn", "comando"):
+        return subprocess.Popen(args, text=True, start_new_session=True, **opcoes)
+
+
+def executar(args, timeout=TIMEOUT_PADRAO, entrada=None):
+    # Devolve (saida, erro, codigo); nunca levanta exceção por falha do comando
+    return _medir([str(a) for a in args], _executar, timeout, entrada)
+
+
+def _executar(args, timeout, entrada):
+    try:
+        processo = _abrir(args, stdin=subprocess.PIPE if entrada else subprocess.DEVNULL,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        return "", f"Comando '{args[0]}' não encontrado", CODIGO_AUSENTE
+    except OSError as e:
+        return "", str(e), CODIGO_AUSENTE
+    try:
+        saida, erro = processo.communicate(entrada, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _matar(processo)
+        saida, erro = processo.communicate()
+        erro = (erro or "").strip()
+        aviso = f"Tempo limite de {timeout:g}s excedido ({args[0]})"
+        return saida.strip(), f"{erro}\n{aviso}".strip(), CODIGO_TIMEOUT
+    return saida.strip(), erro.strip(), processo.returncode
+
+
+def executar_live(args, ao_linha=None, timeout=TIMEOUT_PADRAO, cauda=None):
+    # Repassa cada linha (stdout + stderr) a ao_linha enquanto o comando roda.
+    # Devolve (saida, codigo); com cauda=N a saída guardada é só das últimas N linhas
+    # (cauda=0: nada além do aviso de interrupção/tempo limite) e a memória fica
+    # constante - quem precisa do resto grava em ao_linha.
+    return _medir([str(a) for a in args], _executar_live, ao_linha, timeout, cauda)
+
+
+def _executar_live(args, ao_linha, timeout, cauda):
+    try:
+        processo = _abrir(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT)
+    except FileNotFoundError:
+        return f"Comando '{args[0]}' não encontrado", CODIGO_AUSENTE
+    except OSError as e:
+        return str(e), CODIGO_AUSENTE
+    estourou = threading.Event()
+
+    def _estouro():
+        estourou.set()
+        _matar(processo)
+
+    relogio = threading.Timer(timeout, _estouro) if timeout else None
+    if relogio:
+        relogio.daemon = True
+        relogio.start()
+    linhas = collections.deque(maxlen=cauda)
+    aviso = ""
+    try:
+        for linha in processo.stdout:
+            linhas.append(linha)
+            if ao_linha:
+                ao_linha(linha.rstrip("\n"))
+        processo.wait()
+    except KeyboardInterrupt:
+        _matar(processo)
+        processo.wait()
+        aviso = "\n[Interrompido pelo usuário]\n"
+    finally:
+        if relogio:
+            relogio.cancel()
+        processo.stdout.close()
+    if estourou.is_set():
+        aviso = f"\n[Tempo limite de {timeout:g}s excedido]\n"
+        return "".join(linhas) + aviso, CODIGO_TIMEOUT
+    return "".join(linhas) + aviso, processo.returncode
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="comando")
+        return _pool
+
+
+def executar_em_paralelo(comandos, timeout=TIMEOUT_PADRAO):
+    # comandos: {"rótulo": [args]}; devolve {"rótulo": (saida, erro, codigo)}
+    # Cada tarefa leva uma cópia do contexto: o trecho do comando fica dentro do trecho de quem chamou
+    futuros = {rotulo: _executor().submit(contextvars.copy_context().run, executar, args, timeout)
+               for rotulo, args in comandos.items()}
+    return {rotulo: f.result() for rotulo, f in futuros.items()}
+
+
+def submeter(args, timeout=TIMEOUT_PADRAO):
+    # Dispara em segundo plano; o Future devolve (saida, erro, codigo)
+    return _executor().submit(contextvars.copy_context().run, executar, args, timeout)
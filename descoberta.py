@@ -0,0 +1,406 @@
+# Descoberta de hosts numa faixa de rede - substitui o netdiscover
+# No segmento local: ARP request para todos os endereços de uma vez por um socket
+# AF_PACKET, reenviando só para quem ainda não respondeu. Fora do segmento (ou sem
+# permissão para AF_PACKET): eco ICMP para todos e, para quem não respondeu, conexão
+# TCP em portas comuns (RST também conta como vivo). No fim mescla a tabela de
+# vizinhos do kernel (/proc/net/arp). Cada host é entregue a ao_host assim que aparece.
+#
+# Fabricante pelo prefixo do MAC a partir de oui.txt (índice compacto que acompanha
+# o script; pode ser trocado pelo registro completo do IEEE com --compilar-oui).
+#
+#   python descoberta.py 192.168.1.0/24 [-i eth0] [--timeout 1] [--json]
+
+import argparse
+import asyncio
+import csv
+import ipaddress
+import json
+import os
+import resource
+import socket
+import struct
+import sys
+import time
+
+import estado_rede
+import instrumentos
+import sonda
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARP_REQUEST = 1
+ARP_REPLY = 2
+ARP_COMPLETO = 0x2   # flag ATF_COM de /proc/net/arp
+
+PORTAS_TCP = (80, 443, 22, 445)
+LIMITE_ENDERECOS = 65536
+ARQUIVO_OUI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oui.txt")
+
+_oui = None
+
+
+# ---------- fabricante (OUI) ----------
+
+def _carregar_oui(caminho=ARQUIVO_OUI):
+    global _oui
+    if _oui is None:
+        _oui = {}
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                for linha in f:
+                    if linha.startswith("#") or "\t" not in linha:
+                        continue
+                    prefixo, nome = linha.rstrip("\n").split("\t", 1)
+                    _oui[prefixo] = nome
+        except OSError:
+            pass
+    return _oui
+
+
+def fabricante(mac):
+    if not mac:
+        return None
+    prefixo = mac.replace(":", "").replace("-", "").upper()[:6]
+    nome = _carregar_oui().get(prefixo)
+    if nome is None and len(prefixo) == 6 and int(prefixo[:2], 16) & 0x02:
+        # Bit "administrado localmente": MAC aleatório do celular, VM, contêiner...
+        return "MAC local (aleatório/virtual)"
+    return nome
+
+
+def _hexadecimal(texto):
+    try:
+        int(texto, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def compilar_oui(origem, destino=ARQUIVO_OUI):
+    # Aceita o oui.csv ou o oui.txt do IEEE e o nmap-mac-prefixes; grava no formato compacto
+    entradas = {}
+    with open(origem, encoding="utf-8", errors="replace") as f:
+        if origem.endswith(".csv"):
+            for linha in csv.reader(f):
+                if len(linha) >= 3 and len(linha[1]) == 6 and linha[0] == "MA-L":
+                    entradas[linha[1].upper()] = linha[2].strip()
+        else:
+            for linha in f:
+                if "(base 16)" in linha:
+                    continue  # oui.txt repete cada OUI sem hífens; o nome já veio da linha (hex)
+                if "(hex)" in linha:
+                    prefixo, _, nome = linha.partition("(hex)")
+                    entradas[prefixo.strip().replace("-", "").upper()] = nome.strip()
+                elif len(linha) > 7 and linha[6] in " \t" and _hexadecimal(linha[:6]):
+                    entradas[linha[:6].upper()] = linha[7:].strip()
+    entradas = {p: n for p, n in entradas.items() if len(p) == 6 and _hexadecimal(p) and n}
+    with open(destino, "w", encoding="utf-8") as f:
+        f.write(f"# Índice de fabricantes por OUI gerado de {os.path.basename(origem)} ({len(entradas)} entradas)\n")
+        for prefixo in sorted(entradas):
+            f.write(f"{prefixo}\t{entradas[prefixo][:48]}\n")
+    global _oui
+    _oui = None
+    return len(entradas)
+
+
+# ---------- vizinhos do kernel ----------
+
+def tabela_vizinhos():
+    # /proc/net/arp -> {ip: {"mac", "interface"}} só com entradas resolvidas
+    vizinhos = {}
+    try:
+        with open("/proc/net/arp") as f:
+            next(f, None)
+            for linha in f:
+                campos = linha.split()
+                if len(campos) < 6 or not int(campos[2], 16) & ARP_COMPLETO:
+                    continue
+                if campos[3] == "00:00:00:00:00:00":
+                    continue
+                vizinhos[campos[0]] = {"mac": campos[3].lower(), "interface": campos[5]}
+    except OSError:
+        pass
+    return vizinhos
+
+
+# ---------- segmento local ----------
+
+def segmento_local(rede, interface=None):
+    # (interface, mac, ip de origem, rede da interface) do segmento que cobre parte de `rede`
+    estado = estado_rede.obter()
+    for nome in ([interface] if interface else estado.nomes()):
+        dados = estado.interfaces.get(nome)
+        if not dados or nome == "lo":
+            continue
+        for end in dados["enderecos"]:
+            if ":" in end:
+                continue
+            local = ipaddress.ip_interface(end)
+            if local.network.overlaps(rede):
+                return nome, dados["mac"], str(local.ip), local.network
+    return None
+
+
+def rede_padrao(interface=None):
+    # Rede IPv4 da interface (ou da rota padrão); faixas maiores que /22 viram o /24 do host
+    estado = estado_rede.obter()
+    if interface is None:
+        gw = estado.gateway()
+        interface = estado.interface_para(gw) if gw else None
+    nomes = [interface] if interface else [n for n in estado.nomes() if n != "lo"]
+    for nome in nomes:
+        for end in estado.interfaces.get(nome, {}).get("enderecos", []):
+            if ":" not in end:
+                local = ipaddress.ip_interface(end)
+                if local.network.prefixlen < 22:
+                    return ipaddress.ip_interface(f"{local.ip}/24").network
+                return local.network
+    return None
+
+
+class _VarreduraARP:
+    # Socket AF_PACKET preso à interface; respostas despachadas pelo leitor do loop
+    def __init__(self, interface, mac, ip_origem, ao_resposta):
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        self.sock.bind((interface, ETH_P_ARP))
+        self.sock.setblocking(False)
+        self.mac = bytes.fromhex(mac.replace(":", ""))
+        self.ip = socket.inet_aton(ip_origem)
+        self.ao_resposta = ao_resposta
+        self.enviado = {}
+        self.enviados = 0
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.sock.fileno(), self._ao_ler)
+
+    def _quadro(self, alvo):
+        eth = b"\xff" * 6 + self.mac + struct.pack("!H", ETH_P_ARP)
+        arp = struct.pack("!HHBBH6s4s6s4s", 1, ETH_P_IP, 6, 4, ARP_REQUEST,
+                          self.mac, self.ip, b"\x00" * 6, socket.inet_aton(alvo))
+        return eth + arp
+
+    def _ao_ler(self):
+        while True:
+            try:
+                dados = self.sock.recv(128)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            agora = time.perf_counter()
+            if len(dados) < 42:
+                continue
+            _, ptipo, _, _, op, mac, ip, _, _ = struct.unpack_from("!HHBBH6s4s6s4s", dados, 14)
+            if op != ARP_REPLY or ptipo != ETH_P_IP:
+                continue
+            ip = socket.inet_ntoa(ip)
+            if ip in self.enviado:
+                rtt = (agora - self.enviado[ip]) * 1000
+                self.ao_resposta(ip, ":".join(f"{b:02x}" for b in mac), rtt)
+
+    async def enviar(self, alvos):
+        for i, alvo in enumerate(alvos):
+            quadro = self._quadro(alvo)
+            while True:
+                try:
+                    self.sock.send(quadro)
+                    break
+                except (BlockingIOError, InterruptedError):
+                    await asyncio.sleep(0.001)
+            self.enviado[alvo] = time.perf_counter()
+            self.enviados += 1
+            # Rajadas de 128 quadros para não estourar a fila da placa em faixas grandes
+            if i % 128 == 127:
+                await asyncio.sleep(0.001)
+
+    def fechar(self):
+        self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+# ---------- descoberta ----------
+
+async def descobrir(rede, interface=None, timeout=1.0, tentativas=3, portas=PORTAS_TCP,
+                    concorrencia=None, ao_host=None, vizinhos=True):
+    # ao_host(host) é chamado assim que cada host aparece (ARP, ICMP, TCP ou vizinhos)
+    inicio = time.perf_counter()
+    rede = ipaddress.ip_network(rede, strict=False)
+    if rede.version != 4:
+        raise ValueError("Descoberta só para faixas IPv4")
+    if rede.num_addresses > LIMITE_ENDERECOS:
+        raise ValueError(f"Faixa grande demais ({rede.num_addresses} endereços, máximo /16)")
+    if concorrencia is None:
+        concorrencia = max(64, min(1024, resource.getrlimit(resource.RLIMIT_NOFILE)[0] - 128))
+
+    local = segmento_local(rede, interface)
+    proprio = local[2] if local else None
+    alvos = [str(ip) for ip in rede.hosts() if str(ip) != proprio]
+    no_segmento = [a for a in alvos if local and ipaddress.ip_address(a) in local[3]]
+    fora = [a for a in alvos if not local or ipaddress.ip_address(a) not in local[3]]
+
+    hosts = {}
+    metodos = set()
+    enviados = 0
+
+    def _achou(ip, mac=None, metodo="", rtt=None):
+        host = hosts.get(ip)
+        if host is None:
+            host = hosts[ip] = {"ip": ip, "mac": mac, "fabricante": fabricante(mac),
+                                "metodo": metodo, "rtt_ms": rtt, "conflito": []}
+            if ao_host:
+                ao_host(host)
+        elif mac and host["mac"] and mac != host["mac"] and mac not in host["conflito"]:
+            # Dois MACs respondendo pelo mesmo IP: conflito de endereço
+            host["conflito"].append(mac)
+        elif mac and not host["mac"]:
+            host["mac"], host["fabricante"] = mac, fabricante(mac)
+
+    arp = None
+    if no_segmento and local[1]:
+        try:
+            arp = _VarreduraARP(local[0], local[1], local[2],
+                                lambda ip, mac, rtt: _achou(ip, mac, "arp", rtt))
+        except (PermissionError, OSError):
+            arp = None
+    if arp is None:
+        # Sem ARP próprio: as sondas ICMP/TCP fazem o kernel resolver os vizinhos
+        fora = no_segmento + fora
+    try:
+        if arp:
+            metodos.add("arp")
+            pendentes = no_segmento
+            for _ in range(tentativas):
+                await arp.enviar(pendentes)
+                await asyncio.sleep(timeout / tentativas)
+                pendentes = [a for a in pendentes if a not in hosts]
+                if not pendentes:
+                    break
+        if fora:
+            enviados += await _sondar_fora(fora, timeout, portas, concorrencia, hosts, _achou, metodos)
+    finally:
+        if arp:
+            enviados += arp.enviados
+            arp.fechar()
+
+    if vizinhos:
+        for ip, v in tabela_vizinhos().items():
+            if ip != proprio and ipaddress.ip_address(ip) in rede:
+                _achou(ip, v["mac"], "vizinhos")
+
+    lista = sorted(hosts.values(), key=lambda h: ipaddress.ip_address(h["ip"]))
+    instrumentos.contar("sondas", enviados, metodo="descoberta")
+    return {
+        "rede": str(rede),
+        "interface": local[0] if local else None,
+        "origem": proprio,
+        "metodos": sorted(metodos),
+        "hosts": lista,
+        "total": len(lista),
+        "enderecos": len(alvos),
+        "sondas": enviados,
+        "duracao_s": round(time.perf_counter() - inicio, 3),
+    }
+
+
+async def _sondar_fora(alvos, timeout, portas, concorrencia, hosts, achou, metodos):
+    # ICMP para todos pelo mesmo socket; TCP só para quem ficou calado
+    enviados = 0
+    canal = None
+    if sonda.icmp_disponivel():
+        try:
+            canal = sonda.CanalICMP()
+        except OSError:
+            canal = None
+    if canal:
+        metodos.add("icmp")
+        sem = asyncio.Semaphore(concorrencia)
+
+        async def _eco(ip):
+            async with sem:
+                rtt = await canal.eco(ip, timeout)
+            if rtt is not None:
+                achou(ip, None, "icmp", rtt)
+
+        try:
+            await asyncio.gather(*(_eco(ip) for ip in alvos))
+        finally:
+            canal.fechar()
+        enviados += len(alvos)
+
+    calados = [ip for ip in alvos if ip not in hosts]
+    if calados and portas:
+        metodos.add("tcp")
+        sem = asyncio.Semaphore(concorrencia)
+
+        async def _tcp(ip, porta):
+            if ip in hosts:
+                return
+            async with sem:
+                if ip in hosts:
+                    return
+                rtt = await sonda.eco_tcp(ip, porta, timeout)
+            if rtt is not None:
+                achou(ip, None, f"tcp/{porta}", rtt)
+
+        await asyncio.gather(*(_tcp(ip, p) for p in portas for ip in calados))
+        enviados += len(calados) * len(portas)
+    return enviados
+
+
+def descobrir_rede(rede, **kwargs):
+    return asyncio.run(descobrir(rede, **kwargs))
+
+
+# ---------- saída ----------
+
+def formatar(resultado):
+    linhas = [f"{'IP':<16} {'MAC':<18} {'Método':<9} {'RTT':>9}  Fabricante"]
+    for h in resultado["hosts"]:
+        rtt = f"{h['rtt_ms']:.1f} ms" if h["rtt_ms"] is not None else "-"
+        linhas.append(f"{h['ip']:<16} {h['mac'] or '-':<18} {h['metodo']:<9} {rtt:>9}  {h['fabricante'] or '-'}")
+        if h["conflito"]:
+            linhas.append(f"{'':<16} ⚠️ conflito de IP: também responde {', '.join(h['conflito'])}")
+    linhas.append("")
+    linhas.append(f"{resultado['total']} host(s) em {resultado['rede']} "
+                  f"({resultado['enderecos']} endereços, {resultado['sondas']} sondas, "
+                  f"{', '.join(resultado['metodos']) or 'só vizinhos'}) em {resultado['duracao_s']:.2f} s")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="descoberta.py", description="Descoberta de hosts numa faixa IPv4")
+    parser.add_argument("rede", nargs="?", help="faixa CIDR (padrão: rede da interface da rota padrão)")
+    parser.add_argument("-i", "--interface")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--tentativas", type=int, default=3)
+    parser.add_argument("--portas", default=",".join(map(str, PORTAS_TCP)),
+                        help="portas TCP para hosts fora do segmento (vazio desativa)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--compilar-oui", metavar="ARQUIVO",
+                        help="gera oui.txt a partir do oui.csv/oui.txt do IEEE ou do nmap-mac-prefixes")
+    args = parser.parse_args(argv)
+
+    if args.compilar_oui:
+        print(f"{compilar_oui(args.compilar_oui)} prefixos gravados em {ARQUIVO_OUI}")
+        return 0
+    rede = args.rede or rede_padrao(args.interface)
+    if rede is None:
+        print("Nenhuma rede IPv4 encontrada; informe a faixa (ex: 192.168.1.0/24)", file=sys.stderr)
+        return 2
+    portas = [int(p) for p in args.portas.split(",") if p.strip()]
+
+    def _ao_host(h):
+        if not args.json:
+            print(f"  {h['ip']:<16} {h['mac'] or '-':<18} {h['fabricante'] or ''}", flush=True)
+
+    try:
+        resultado = descobrir_rede(rede, interface=args.interface, timeout=args.timeout,
+                                   tentativas=args.tentativas, portas=portas, ao_host=_ao_host)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(json.dumps(resultado, ensure_ascii=False, indent=2) if args.json else "\n" + formatar(resultado))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,551 @@
+# Benchmarks de desempenho do elias
+#
+# Tempo de inicialização (mesma medida do `python -X importtime`), com limite de regressão:
+#   python desempenho.py inicio [--limite-ms 60] [--repeticoes 7]
+# Sai com código 1 se a mediana passar do limite ou se `import elias` carregar o rich.
+#
+# Suíte de diagnósticos sem rede externa nem interação:
+#   python desempenho.py suite [casos...] [--gravar-base] [--base arq] [--tolerancia 0.25]
+# Cada caso roda num processo próprio contra dublês locais: listeners TCP, servidor
+# DNS stub, servidor HTTP (204, IP público e corpos grandes) e binários falsos de
+# ping/mtr/nmcli no PATH que devolvem saídas gravadas. Mede tempo de parede e de CPU
+# do caso e o pico de RSS do processo (wait4), e compara com a linha de base gravada.
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+LIMITE_IMPORT_MS = 60.0
+RE_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+ARQUIVO_BASE = os.path.join(PASTA, "desempenho_base.json")
+VARIAVEL_AMBIENTE = "ELIAS_BENCH"
+MARCA_RESULTADO = "@@resultado "
+TOLERANCIA = 0.25
+# Folga absoluta para casos muito rápidos, onde 25% é menor que o ruído da medida
+FOLGA = {"parede_ms": 5.0, "cpu_ms": 5.0, "rss_mb": 4.0}
+NOMES_DNS = [f"host{i}.bench.lan" for i in range(20)]
+
+
+def _importtime(modulo):
+    # {modulo de topo: {self_us, cumulativo_us, diretos}} de uma execução limpa
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                          cwd=PASTA, capture_output=True, text=True, timeout=60)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falhou")
+    # O importtime lista os filhos antes do pai: os de profundidade 1 vistos desde o
+    # último módulo de topo são os imports diretos do próximo módulo de topo.
+    tempos, pendentes = {}, []
+    for linha in proc.stderr.splitlines():
+        m = RE_IMPORTTIME.match(linha)
+        if not m:
+            continue
+        nome, cumulativo = m.group(4), int(m.group(2))
+        profundidade = (len(m.group(3)) - 1) // 2
+        if profundidade == 1:
+            pendentes.append((nome, cumulativo / 1000))
+        elif profundidade == 0:
+            tempos[nome] = {"self_us": int(m.group(1)), "cumulativo_us": cumulativo, "diretos": pendentes}
+            pendentes = []
+    return tempos
+
+
+def _modulos_carregados(modulo):
+    codigo = f"import sys, {modulo}; print(' '.join(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", codigo], cwd=PASTA, capture_output=True, text=True, timeout=60)
+    return set(proc.stdout.split())
+
+
+def inicializacao(modulo="elias", repeticoes=7):
+    # Bytecode compilado antes (com PYTHONDONTWRITEBYTECODE o import não grava .pyc e a
+    # medida viraria tempo de compilação); a primeira execução só aquece o page cache
+    subprocess.run([sys.executable, "-m", "compileall", "-q", PASTA], cwd=PASTA,
+                   capture_output=True, timeout=120)
+    _importtime(modulo)
+    amostras = [_importtime(modulo) for _ in range(repeticoes)]
+    totais = [a[modulo]["cumulativo_us"] / 1000 for a in amostras if modulo in a]
+    # Imports diretos mais caros do módulo medido
+    diretas = sorted(amostras[-1].get(modulo, {}).get("diretos", []), key=lambda x: -x[1])
+    carregados = _modulos_carregados(modulo)
+    return {
+        "modulo": modulo,
+        "repeticoes": repeticoes,
+        "mediana_ms": statistics.median(totais),
+        "minimo_ms": min(totais),
+        "maximo_ms": max(totais),
+        "mais_caros": diretas[:10],
+        "modulos_carregados": len(carregados),
+        "rich_carregado": any(m == "rich" or m.startswith("rich.") for m in carregados),
+    }
+
+
+# ---------- saídas gravadas dos binários falsos ----------
+
+def _saida_ping():
+    linhas = ["PING 192.0.2.1 (192.0.2.1) 56(84) bytes of data."]
+    for i in range(1, 21):
+        linhas.append(f"64 bytes from 192.0.2.1: icmp_seq={i} ttl=64 time={0.4 + (i % 7) * 0.05:.3f} ms")
+    linhas += ["", "--- 192.0.2.1 ping statistics ---",
+               "20 packets transmitted, 20 received, 0% packet loss, time 19027ms",
+               "rtt min/avg/max/mdev = 0.400/0.548/0.700/0.091 ms"]
+    return "\n".join(linhas)
+
+
+def _saida_mtr():
+    linhas = ["Start: 2025-06-30T14:05:09-0300",
+              "HOST: bancada                     Loss%   Snt   Last   Avg  Best  Wrst StDev"]
+    for i in range(1, 13):
+        linhas.append(f"{i:>3}.|-- 10.{i}.0.1{'':<20} 0.0%    10{i * 1.7:>7.1f}{i * 1.8:>6.1f}"
+                      f"{i * 1.5:>6.1f}{i * 2.4:>6.1f}{0.3 * i:>6.1f}")
+    return "\n".join(linhas)
+
+
+def _saida_nmcli():
+    linhas = []
+    for i in range(60):
+        canal = (1, 6, 11, 3, 36, 44, 149)[i % 7]
+        freq = 2407 + canal * 5 if canal < 15 else 5000 + canal * 5
+        ssid = f"Rede {i}\\: andar {i % 3}" if i % 4 else ""
+        uso = "*" if i == 0 else " "
+        linhas.append(f"{uso}:AA\\:BB\\:CC\\:00\\:{i // 256:02X}\\:{i % 256:02X}:{ssid}:{canal}:"
+                      f"{freq} MHz:130 Mbit/s:{90 - i}:WPA2")
+    return "\n".join(linhas)
+
+
+SAIDAS_FALSAS = {"ping": _saida_ping, "mtr": _saida_mtr, "nmcli": _saida_nmcli}
+
+
+# ---------- dublês locais ----------
+
+class _HandlerFalso(BaseHTTPRequestHandler):
+    # /generate_204 -> 204, /ip -> IP de documentação, /<n> -> n bytes (keep-alive);
+    # POST em qualquer caminho descarta o corpo
+    protocol_version = "HTTP/1.1"
+    bloco = memoryview(bytes(2**20))
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # cliente derrubou a conexão entre requisições (carga encerra com RST)
+
+    def do_GET(self):
+        caminho = self.path.strip("/")
+        if caminho == "generate_204":
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if caminho == "ip":
+            corpo = b"203.0.113.7\n"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+        total = int(caminho) if caminho.isdigit() else 2**20
+        self.send_response(200)
+        self.send_header("Content-Length", str(total))
+        self.end_headers()
+        try:
+            while total > 0:
+                n = min(total, len(self.bloco))
+                self.wfile.write(self.bloco[:n])
+                total -= n
+        except OSError:
+            self.close_connection = True
+
+    def do_POST(self):
+        restante = int(self.headers.get("Content-Length") or 0)
+        visao = memoryview(bytearray(len(self.bloco)))
+        try:
+            while restante > 0:
+                n = self.rfile.readinto(visao[:min(restante, len(visao))])
+                if not n:
+                    self.close_connection = True
+                    return
+                restante -= n
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        except OSError:
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+class _ServidorFalso(ThreadingHTTPServer):
+    # Fila de conexões do tamanho da dos listeners: com a padrão (5) uma rajada de
+    # conexões perde SYNs e a retransmissão soma 1 s à medida
+    request_queue_size = 512
+    daemon_threads = True
+
+
+class Ambiente:
+    # Sobe os dublês no processo pai (o custo deles não entra na medida dos casos)
+    def __init__(self, listeners=8):
+        self.n_listeners = listeners
+        self.pasta = None
+        self._fechar = []
+
+    def __enter__(self):
+        self.pasta = tempfile.mkdtemp(prefix="elias-bench-")
+        binarios = os.path.join(self.pasta, "bin")
+        os.makedirs(binarios)
+        for nome, gerar in SAIDAS_FALSAS.items():
+            gravada = os.path.join(self.pasta, f"{nome}.txt")
+            with open(gravada, "w") as f:
+                f.write(gerar() + "\n")
+            script = os.path.join(binarios, nome)
+            with open(script, "w") as f:
+                f.write(f"#!/bin/sh\ncat '{gravada}'\n")
+            os.chmod(script, 0o755)
+
+        self.portas_tcp = []
+        for _ in range(self.n_listeners):
+            s = socket.socket()
+            s.bind(("127.0.0.1", 0))
+            s.listen(512)
+            self.portas_tcp.append(s.getsockname()[1])
+            threading.Thread(target=self._aceitar, args=(s,), daemon=True).start()
+            self._fechar.append(s.close)
+
+        import resolvedor
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        self.stub = resolvedor.ServidorStub({n: "192.0.2.10" for n in NOMES_DNS})
+        asyncio.run_coroutine_threadsafe(self.stub.iniciar(), self._loop).result(5)
+
+        self.http = _ServidorFalso(("127.0.0.1", 0), _HandlerFalso)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        return self
+
+    @staticmethod
+    def _aceitar(s):
+        while True:
+            try:
+                conexao, _ = s.accept()
+            except OSError:
+                return
+            conexao.close()
+
+    def variaveis(self):
+        env = dict(os.environ)
+        env["PATH"] = os.path.join(self.pasta, "bin") + os.pathsep + env.get("PATH", "")
+        env[VARIAVEL_AMBIENTE] = json.dumps({
+            "pasta": self.pasta,
+            "tcp": self.portas_tcp,
+            "dns_porta": self.stub.porta,
+            "http": f"http://127.0.0.1:{self.http.server_address[1]}",
+        })
+        return env
+
+    def __exit__(self, *exc):
+        self.http.shutdown()
+        self.http.server_close()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        for fechar in self._fechar:
+            fechar()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+
+# ---------- casos (rodam no processo filho) ----------
+
+def _caso_portas(amb):
+    import varredura
+    # Listeners abertos + faixa fechada em loopback (RST imediato)
+    portas = amb["tcp"] + list(range(1, 301))
+    r = varredura.varrer_portas(["127.0.0.1"], portas, timeout=1.0)
+    return {"portas": len(portas), "abertas": r["resumo"][varredura.ABERTA]}
+
+
+def _caso_dns(amb):
+    import resolvedor
+    r = resolvedor.executar_benchmark({"stub": "127.0.0.1"}, nomes=NOMES_DNS, repeticoes=3,
+                                      porta=amb["dns_porta"], timeout=1.0)
+    return {"consultas": len(NOMES_DNS) * 3, "p50_ms": r["resolvedores"][0].get("p50_ms")}
+
+
+def _caso_captive(amb):
+    import checkup
+    status, dados = asyncio.run(checkup.checar_captive(amb["http"] + "/generate_204", timeout=2.0))
+    return {"status": status, "estado": dados["estado"]}
+
+
+def _caso_ip_publico(amb):
+    import checkup
+    status, dados = asyncio.run(checkup.checar_ip_publico(amb["http"] + "/ip", timeout=2.0))
+    return {"status": status, "ip": dados.get("ip")}
+
+
+def _caso_vazao(amb):
+    import vazao
+    r = vazao.medir(amb["http"] + f"/{50 * 2**20}", fluxos=4, duracao=1.0, aquecimento=0.5, intervalo=0.25)
+    return {"vazao_mbps": round(r["vazao_mbps"], 1), "erros": r["erros"]}
+
+
+def _caso_bufferbloat(amb):
+    # Sondas ICMP e carga nos dois sentidos no mesmo loop, contra o servidor local
+    import carga
+    r = carga.testar(url_download=amb["http"] + f"/{50 * 2**20}", url_upload=amb["http"] + "/up",
+                     alvo="127.0.0.1", fluxos=4, duracao=1.0, ocioso=0.5, aquecimento=0.25, respiro=0.1)
+    return {"nota": r["nota"], "sondas": len(r["serie"]),
+            "erros": sum(len(f["erros"]) for f in r["fases"].values())}
+
+
+def _caso_ping_nativo(amb):
+    import sonda
+    st = sonda.pingar(["127.0.0.1"], contagem=50, intervalo=0.002, timeout=0.5)["127.0.0.1"]
+    return {"recebidos": st.recebidos, "metodo": st.metodo}
+
+
+def _caso_comando_ping(amb):
+    # Mesmo caminho do run_command_live: eventos + cauda, sem a tela
+    import comandos
+    import fluxo
+    interp = fluxo.InterpretadorPing("192.0.2.1")
+    fl = fluxo.Fluxo(interp)
+    _, codigo = comandos.executar_live(["ping", "-c", "20", "192.0.2.1"], fl, timeout=10, cauda=0)
+    return {"linhas": fl.linhas, "respostas": interp.stats.recebidos, "codigo": codigo}
+
+
+def _caso_comando_mtr(amb):
+    import comandos
+    saida, _, codigo = comandos.executar(["mtr", "--report", "--report-cycles", "10", "192.0.2.1"], 10)
+    return {"saltos": sum(1 for l in saida.splitlines() if "|--" in l), "codigo": codigo}
+
+
+def _caso_nmcli(amb):
+    import wifi
+    lev = wifi.Levantamento()
+    for _ in range(5):
+        redes, erro = wifi.varrer()
+        lev.registrar(redes)
+    return {"redes": len(lev.historicos), "erro": erro, "canais": len(lev.canais())}
+
+
+def _caso_save_log(amb):
+    import armazem
+    import elias
+    import registro
+    elias.LOG_DIR = os.path.join(amb["pasta"], f"logs-{os.getpid()}")
+    # Saída do rich vai para /dev/null: mede a gravação, não o terminal
+    elias.console._obter().file = open(os.devnull, "w")
+    for i in range(50):
+        r = registro.Resultado("bench", f"bench_{i}", alvo="192.0.2.1", texto="x" * 2000)
+        r.medir("latencia", i * 0.1, "ms", "Latência média", alerta=80, critico=150)
+        r.medir("perda", 0.0, "%", "Perda de pacotes", alerta=5, critico=20, casas=0)
+        elias.save_log(r)
+    return {"registros": armazem.abrir().contar()}
+
+
+def _caso_estatistica(amb):
+    import random
+    import estatistica
+    gerador = random.Random(42)
+    valores = [gerador.expovariate(1 / 20) for _ in range(100000)]
+    esboco = estatistica.Esboco()
+    esboco.adicionar_varios(valores)
+    r = estatistica.resumir([(v if i % 50 else None) for i, v in enumerate(valores[:20000])])
+    return {"p99_ms": round(esboco.quantil(0.99), 1), "jitter_ms": round(r["jitter_ms"], 2)}
+
+
+def _caso_http_fases(amb):
+    # 20 URLs no mesmo host em 2 rodadas: a 2ª sai toda do pool de conexões
+    import web
+    r = web.testar([amb["http"] + "/ip"] * 10 + [amb["http"] + "/generate_204"] * 10, repeticoes=2)
+    return {"respostas": sum(1 for s in r if s["status"]), "reusadas": sum(1 for s in r if s["reusada"])}
+
+
+def _caso_descoberta(amb):
+    import descoberta
+    r = descoberta.descobrir_rede("127.0.0.0/26", portas=(), vizinhos=False, timeout=0.5)
+    return {"hosts": r["total"], "metodos": r["metodos"]}
+
+
+def _caso_rastreio(amb):
+    import rastreio
+    r = rastreio.traceroute("127.0.0.1", nomes=False, timeout=0.5)
+    return {"alcancado": r["alcancado"], "saltos": len(r["hops"])}
+
+
+# nome -> (função, repetições padrão)
+CASOS = {
+    "portas": (_caso_portas, 3),
+    "dns": (_caso_dns, 3),
+    "captive": (_caso_captive, 10),
+    "ip_publico": (_caso_ip_publico, 10),
+    "http_fases": (_caso_http_fases, 5),
+    "vazao": (_caso_vazao, 1),
+    "bufferbloat": (_caso_bufferbloat, 1),
+    "ping_nativo": (_caso_ping_nativo, 3),
+    "comando_ping": (_caso_comando_ping, 10),
+    "comando_mtr": (_caso_comando_mtr, 10),
+    "nmcli": (_caso_nmcli, 5),
+    "save_log": (_caso_save_log, 1),
+    "estatistica": (_caso_estatistica, 3),
+    "descoberta": (_caso_descoberta, 3),
+    "rastreio": (_caso_rastreio, 3),
+}
+
+
+def _executar_caso(nome, repeticoes):
+    # Processo filho: a primeira execução aquece imports e caches e fica fora da medida
+    amb = json.loads(os.environ[VARIAVEL_AMBIENTE])
+    funcao = CASOS[nome][0]
+    extras = funcao(amb)
+    paredes, cpus = [], []
+    for _ in range(repeticoes):
+        p0, c0 = time.perf_counter(), time.process_time()
+        extras = funcao(amb)
+        paredes.append((time.perf_counter() - p0) * 1000)
+        cpus.append((time.process_time() - c0) * 1000)
+    print(MARCA_RESULTADO + json.dumps({"parede_ms": statistics.median(paredes),
+                                        "cpu_ms": statistics.median(cpus), "extras": extras}), flush=True)
+
+
+def medir_caso(nome, ambiente, repeticoes=None):
+    repeticoes = repeticoes or CASOS[nome][1]
+    processo = subprocess.Popen([sys.executable, os.path.abspath(__file__), "_caso", nome, str(repeticoes)],
+                                cwd=ambiente.pasta, env=ambiente.variaveis(),
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    saida = processo.stdout.read()
+    processo.stdout.close()
+    # wait4 devolve o uso de recursos só deste filho (pico de RSS em KiB no Linux)
+    _, status, uso = os.wait4(processo.pid, 0)
+    processo.returncode = os.waitstatus_to_exitcode(status)
+    linha = next((l for l in reversed(saida.splitlines()) if l.startswith(MARCA_RESULTADO)), None)
+    if processo.returncode != 0 or linha is None:
+        return {"erro": saida.strip().splitlines()[-1] if saida.strip() else f"código {processo.returncode}"}
+    resultado = json.loads(linha[len(MARCA_RESULTADO):])
+    resultado["rss_mb"] = uso.ru_maxrss / 1024
+    resultado["cpu_processo_ms"] = (uso.ru_utime + uso.ru_stime) * 1000
+    resultado["repeticoes"] = repeticoes
+    return resultado
+
+
+def suite(casos=None, repeticoes=None, ao_caso=None):
+    casos = casos or list(CASOS)
+    resultados = {}
+    with Ambiente() as ambiente:
+        for nome in casos:
+            resultados[nome] = medir_caso(nome, ambiente, repeticoes)
+            if ao_caso:
+                ao_caso(nome, resultados[nome])
+    return resultados
+
+
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    # [(caso, métrica, atual, base, limite)] das métricas que passaram do limite
+    regressoes = []
+    for nome, r in resultados.items():
+        ref = base.get(nome)
+        if not ref or "erro" in r or "erro" in ref:
+            continue
+        for metrica, folga in FOLGA.items():
+            limite = ref[metrica] * (1 + tolerancia) + folga
+            if r[metrica] > limite:
+                regressoes.append((nome, metrica, r[metrica], ref[metrica], limite))
+    return regressoes
+
+
+def _linha_caso(nome, r, base):
+    if "erro" in r:
+        return f"{nome:<13} ERRO: {r['erro']}"
+    ref = base.get(nome)
+
+    def _delta(metrica):
+        if not ref or "erro" in ref or not ref[metrica]:
+            return ""
+        return f" ({(r[metrica] / ref[metrica] - 1) * 100:+.0f}%)"
+
+    extras = " ".join(f"{k}={v}" for k, v in r["extras"].items())
+    return (f"{nome:<13} {r['parede_ms']:9.1f} ms{_delta('parede_ms'):<8} "
+            f"cpu {r['cpu_ms']:8.1f} ms{_delta('cpu_ms'):<8} "
+            f"rss {r['rss_mb']:6.1f} MB{_delta('rss_mb'):<7}  {extras}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="desempenho.py", description="Benchmarks de desempenho do elias")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_inicio = sub.add_parser("inicio", help="tempo de `import elias` com limite de regressão")
+    p_inicio.add_argument("--modulo", default="elias")
+    p_inicio.add_argument("--limite-ms", type=float, default=LIMITE_IMPORT_MS)
+    p_inicio.add_argument("--repeticoes", type=int, default=7)
+    p_suite = sub.add_parser("suite", help="diagnósticos contra dublês locais, com linha de base")
+    p_suite.add_argument("casos", nargs="*", metavar="caso", help=f"padrão: todos ({', '.join(CASOS)})")
+    p_suite.add_argument("--repeticoes", type=int, help="sobrepõe as repetições padrão de cada caso")
+    p_suite.add_argument("--base", default=ARQUIVO_BASE, help="arquivo JSON da linha de base")
+    p_suite.add_argument("--gravar-base", action="store_true", help="grava os resultados como nova base")
+    p_suite.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    p_suite.add_argument("--json", action="store_true")
+    p_caso = sub.add_parser("_caso")
+    p_caso.add_argument("nome", choices=list(CASOS))
+    p_caso.add_argument("repeticoes", type=int)
+    args = parser.parse_args(argv)
+
+    if args.comando == "_caso":
+        _executar_caso(args.nome, args.repeticoes)
+        return 0
+
+    if args.comando == "suite":
+        desconhecidos = [c for c in args.casos if c not in CASOS]
+        if desconhecidos:
+            parser.error(f"caso(s) desconhecido(s): {', '.join(desconhecidos)}")
+        base = {}
+        if os.path.exists(args.base):
+            with open(args.base, encoding="utf-8") as f:
+                base = json.load(f)
+        ao_caso = None if args.json else lambda nome, r: print(_linha_caso(nome, r, base), flush=True)
+        resultados = suite(args.casos, args.repeticoes, ao_caso)
+        if args.json:
+            print(json.dumps(resultados, ensure_ascii=False, indent=2))
+        if args.gravar_base:
+            base.update({n: r for n, r in resultados.items() if "erro" not in r})
+            with open(args.base, "w", encoding="utf-8") as f:
+                json.dump(base, f, ensure_ascii=False, indent=2)
+            print(f"Linha de base gravada em {args.base}")
+            return 0
+        falhas = [n for n, r in resultados.items() if "erro" in r]
+        regressoes = comparar(resultados, base, args.tolerancia)
+        for nome, metrica, atual, ref, limite in regressoes:
+            print(f"REGRESSÃO: {nome} {metrica} {atual:.1f} (base {ref:.1f}, limite {limite:.1f})")
+        if not base:
+            print("Sem linha de base; grave uma com --gravar-base")
+        return 1 if regressoes or falhas else 0
+
+    r = inicializacao(args.modulo, args.repeticoes)
+    print(f"import {r['modulo']}: mediana {r['mediana_ms']:.1f} ms "
+          f"(mín {r['minimo_ms']:.1f}, máx {r['maximo_ms']:.1f}, {r['repeticoes']} execuções, "
+          f"{r['modulos_carregados']} módulos carregados)")
+    for nome, ms in r["mais_caros"]:
+        print(f"  {ms:8.1f} ms  {nome}")
+    falhas = []
+    if r["mediana_ms"] > args.limite_ms:
+        falhas.append(f"mediana {r['mediana_ms']:.1f} ms acima do limite de {args.limite_ms:g} ms")
+    if r["rich_carregado"] and args.modulo == "elias":
+        falhas.append("import elias carregou o rich (deveria ser adiado até a primeira tela)")
+    for f in falhas:
+        print(f"REGRESSÃO: {f}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,70 +3,174 @@
 
 import os
 import sys
-import subprocess
 import json
-import time
-import datetime
 import socket
-import threading
-import re
+import importlib
 from datetime import datetime
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Prompt, Confirm
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeElapsedColumn
 
-console = Console()
-LOG_DIR = "log_rede"
-os.makedirs(LOG_DIR, exist_ok=True)
+import instrumentos
+
+
+class _Adiado:
+    # Importa o módulo (ou objeto) só no primeiro uso: `import elias`, o checkup e o
+    # monitor não pagam pelo rich nem pelos diagnósticos que não vão rodar.
+    def __init__(self, modulo, nome=None, instanciar=False):
+        self._modulo = modulo
+        self._nome = nome
+        self._instanciar = instanciar
+        self._alvo = None
+
+    def _obter(self):
+        if self._alvo is None:
+            alvo = importlib.import_module(self._modulo)
+            if self._nome:
+                alvo = getattr(alvo, self._nome)
+            self._alvo = alvo() if self._instanciar else alvo
+        return self._alvo
+
+    def __getattr__(self, atributo):
+        return getattr(self._obter(), atributo)
+
+    def __call__(self, *args, **kwargs):
+        return self._obter()(*args, **kwargs)
+
+
+class _ConsoleMedido(_Adiado):
+    # Cada console.print vira um trecho "render": o trace mostra quanto da sessão foi tela
+    def print(self, *args, **kwargs):
+        with instrumentos.Trecho("console.print", "render"):
+            return self._obter().print(*args, **kwargs)
+
+
+console = _ConsoleMedido("rich.console", "Console", instanciar=True)
+Table = _Adiado("rich.table", "Table")
+Prompt = _Adiado("rich.prompt", "Prompt")
+IntPrompt = _Adiado("rich.prompt", "IntPrompt")
+FloatPrompt = _Adiado("rich.prompt", "FloatPrompt")
+Confirm = _Adiado("rich.prompt", "Confirm")
+Panel = _Adiado("rich.panel", "Panel")
+Progress = _Adiado("rich.progress", "Progress")
+SpinnerColumn = _Adiado("rich.progress", "SpinnerColumn")
+BarColumn = _Adiado("rich.progress", "BarColumn")
+TextColumn = _Adiado("rich.progress", "TextColumn")
+TimeElapsedColumn = _Adiado("rich.progress", "TimeElapsedColumn")
+Live = _Adiado("rich.live", "Live")
+Group = _Adiado("rich.console", "Group")
+Text = _Adiado("rich.text", "Text")
+escape = _Adiado("rich.markup", "escape")
+
+armazem = _Adiado("armazem")
+banda = _Adiado("banda")
+carga = _Adiado("carga")
+comandos = _Adiado("comandos")
+descoberta = _Adiado("descoberta")
+fluxo = _Adiado("fluxo")
+estado_rede = _Adiado("estado_rede")
+pmtu = _Adiado("pmtu")
+prognostico = _Adiado("prognostico")
+rastreio = _Adiado("rastreio")
+registro = _Adiado("registro")
+resolvedor = _Adiado("resolvedor")
+sonda = _Adiado("sonda")
+varredura = _Adiado("varredura")
+vazao = _Adiado("vazao")
+web = _Adiado("web")
+wifi = _Adiado("wifi")
+
+LOG_DIR = "log_rede"  # criado pelo armazém no primeiro registro, não na importação
 
 # ========== UTILITÁRIOS ==========
 
-def run_command(cmd):
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        return result.stdout.strip(), result.stderr.strip()
-    except subprocess.SubprocessError as e:
-        return "", str(e)
-        return subprocess.check_output(cmd, shell=True, text=True).strip()
-    except subprocess.CalledProcessError as e:
-        return f"[Erro]\n{e.output}"
-
-def run_command_live(cmd):
-    try:
-        process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        output = ""
-        for line in process.stdout:
-            console.print(line.rstrip())
-            output += line
-        process.wait()
-        return output
-    except Exception as e:
-        return f"[Erro ao executar live]: {e}"
+def run_command(args, timeout=None):
+    # args em lista (sem shell); devolve (saida, erro)
+    out, err, _ = comandos.executar(args, timeout or comandos.TIMEOUT_PADRAO)
+    return out, err
+
+def _tela_fluxo(fl, titulo, tabela=None):
+    # Agregados do interpretador (se houver) + as últimas linhas da saída
+    partes = [tabela()] if tabela else []
+    partes.append(Text("\n".join(fl.ultimas()), style="dim"))
+    return Panel(Group(*partes), title=titulo, subtitle=f"{fl.linhas} linhas", style="cyan")
+
+def run_command_live(args, timeout=None, interpretador=None, titulo=None, tabela=None):
+    # Saída ao vivo em streaming (fluxo.py): cada linha vira evento no interpretador e
+    # vai inteira para log_rede/saidas/; na memória só a cauda, e a tela é redesenhada
+    # no máximo 4x por segundo. Devolve o Fluxo (texto_cauda(), caminho, linhas).
+    titulo = titulo or " ".join(str(a) for a in args)
+    caminho = os.path.join(LOG_DIR, "saidas",
+                           f"{os.path.basename(str(args[0]))}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
+    with Live(console=console._obter(), auto_refresh=False, transient=True) as live:
+        fl = fluxo.Fluxo(interpretador, caminho,
+                         ao_mudar=lambda fl: live.update(_tela_fluxo(fl, titulo, tabela), refresh=True))
+        aviso, _ = comandos.executar_live(args, fl, timeout or comandos.TIMEOUT_PADRAO, cauda=0)
+        fl.fechar(aviso.strip() or None)
+    return fl
+
+def _tabela_ping(st, titulo):
+    table = Table(title=titulo)
+    table.add_column("Enviados", style="cyan")
+    table.add_column("Recebidos", style="cyan")
+    table.add_column("Perda", style="red")
+    table.add_column("Mín/Méd/Máx (ms)", style="green")
+    table.add_column("p50/p90 (ms)", style="green")
+    table.add_column("Jitter (ms)", style="yellow")
+    table.add_column("MOS", style="magenta")
+    faixa = f"{st.minimo:.2f}/{st.media:.2f}/{st.maximo:.2f}" if st.recebidos else "-"
+    pct = f"{st.esboco.quantil(0.5):.2f}/{st.esboco.quantil(0.9):.2f}" if st.recebidos else "-"
+    mos = f"{st.mos:.2f}" if st.recebidos else "-"
+    table.add_row(str(st.enviados), str(st.recebidos), f"{st.perda_pct:.0f}%", faixa, pct,
+                  f"{st.jitter:.2f}", mos)
+    return table
+
+def ping_ao_vivo(alvo, titulo, contagem=10, intervalo=0.5):
+    # Ping nativo (sonda.py) com tabela atualizada a cada resposta; para cedo
+    # quando o resultado já está claro (alvo fora do ar ou RTT estável).
+    with Live(_tabela_ping(sonda.EstatisticasRTT(alvo), titulo), console=console._obter(),
+              refresh_per_second=8, transient=True) as live:
+        stats = sonda.pingar([alvo], contagem=contagem, intervalo=intervalo,
+                             parar_quando=sonda.resultado_claro,
+                             ao_atualizar=lambda st: live.update(_tabela_ping(st, titulo)))
+    return stats[alvo]
 
 def comando_existe(cmd):
-    return subprocess.call(f"type {cmd}", shell=True,
-                           stdout=subprocess.DEVNULL,
-                           stderr=subprocess.DEVNULL) == 0
-
-def save_log(title, content):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    txt_file = os.path.join(LOG_DIR, f"{title}_{timestamp}.txt")
-    json_file = os.path.join(LOG_DIR, f"{title}_{timestamp}.json")
-    with open(txt_file, "w", encoding="utf-8") as f:
-        f.write(content)
-    json_data = {"title": title, "timestamp": timestamp, "output": content}
-    with open(json_file, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, indent=2)
-    console.print(f"\n✅ Log salvo em:\n[green]- {txt_file}\n- {json_file}[/green]")
-
-def post_test_menu(result, titulo=None):
+    return comandos.existe(cmd)
+
+CORES_CLASSE = {"ok": "green", "alerta": "yellow", "critico": "red", "info": "white"}
+
+def painel_resultado(r, estilo="cyan", titulo=None):
+    # Tela montada a partir do registro: medidas coloridas pela classe, saída bruta escapada
+    linhas = []
+    for m in r.medidas:
+        cor = CORES_CLASSE[m.classe]
+        linhas.append(f"[bold]{m.rotulo}:[/bold] [{cor}]{m.formatar()}[/{cor}]")
+    if r.texto:
+        linhas.append(("\n" if linhas else "") + escape(r.texto))
+    if r.classificacao:
+        linhas.append(f"\n[bold magenta]Classificação:[/bold magenta] {r.classificacao}")
+    secoes = (("red", "Problemas identificados", [f"{registro.ICONES[c]} {escape(t)}" for c, t in r.achados]),
+              ("yellow", "Possíveis causas", r.causas), ("green", "Sugestões de solução", r.solucoes))
+    for cor, nome, itens in secoes:
+        if itens:
+            linhas.append(f"\n[bold {cor}]{nome}:[/bold {cor}]\n- " + "\n- ".join(itens))
+    return Panel("\n".join(linhas).strip(), title=titulo or r.titulo, style=estilo)
+
+def mostrar_resultado(r, estilo="cyan", titulo=None):
+    console.print(painel_resultado(r, estilo, titulo))
+    post_test_menu(r)
+
+def save_log(resultado):
+    # Grava o registro tipado no armazém SQLite (log_rede/elias.db)
+    db = armazem.abrir(os.path.join(LOG_DIR, armazem.ARQUIVO_PADRAO))
+    db.registrar_resultado(resultado)
+    db.flush()
+    console.print(f"\n✅ Log salvo em:\n[green]- {db.caminho}[/green]")
+
+def post_test_menu(resultado):
     while True:
         console.print("\n[bold green]1 - Salvar log   |   2 - Voltar ao menu[/bold green]")
         opc = input("Escolha: ").strip()
         if opc == '1':
-            save_log(titulo or "resultado", result)
+            save_log(resultado)
         elif opc == '2':
             return
         else:
@@ -74,205 +178,245 @@ def post_test_menu(result, titulo=None):
 
 # ========== FUNÇÕES BÁSICAS ==========
 
+def _medidas_ping(r, st, perda=(5, 20), jitter=(None, 20)):
+    # Estatísticas do ping nativo (sonda.py) -> medidas do registro
+    r.medir("latencia", st.media if st.recebidos else None, "ms", "Latência média", alerta=80, critico=150)
+    r.medir("jitter", st.jitter if st.recebidos else None, "ms", "Jitter estimado", *jitter)
+    r.medir("perda", st.perda_pct, "%", "Perda de pacotes", *perda, casas=0)
+    r.medir("rajada_perda", st.rajadas.maior, "pacotes", "Maior rajada de perda")
+    r.detalhes = st.resumo()
+
+def _ping_comando(args, alvo, timeout):
+    interp = fluxo.InterpretadorPing(alvo)
+    fl = run_command_live(args, timeout, interp, f"Ping {alvo}", lambda: _tabela_ping(interp.stats, None))
+    return fl, interp.stats
+
+def _resultado_ping_comando(tipo, titulo, alvo, fl, st, interface=None):
+    # Ping do sistema -> registro: as medidas vêm dos eventos já agregados, o texto é a cauda
+    r = registro.Resultado(tipo, titulo, alvo=alvo, interface=interface, texto=fl.texto_cauda())
+    if st.concluidos:
+        _medidas_ping(r, st)
+    r.detalhes["saida"] = fl.caminho
+    return r
+
 def diagnostico_interfaces():
-    output, _ = run_command("ip -o link show | awk -F': ' '{print $2}'")
-    interfaces = [i for i in output.splitlines() if not any(x in i for x in ["lo", "vir", "docker", "tun", "br-", "veth"])]
-    result = "\n".join(interfaces)
-    console.print(Panel(result, title="Interfaces Ativas", style="cyan"))
-    post_test_menu(result, "interfaces_ativas")
+    estado = estado_rede.obter(forcar=True)
+    linhas = []
+    interfaces = []
+    for nome in estado.nomes(fisicas=True):
+        i = estado.interfaces[nome]
+        enderecos = ", ".join(e for e in i["enderecos"] if not e.startswith("fe80")) or "sem IP"
+        linhas.append(f"{nome} ({i['estado']}) - {enderecos}")
+        interfaces.append({"nome": nome, "estado": i["estado"], "enderecos": list(i["enderecos"])})
+    r = registro.Resultado("interfaces_ativas", "Interfaces Ativas", texto="\n".join(linhas),
+                           detalhes={"interfaces": interfaces})
+    mostrar_resultado(r)
 
 def diagnostico_ip_rota():
-    result, _ = run_command("ip a") + "\n\n" + run_command("ip r")
-    console.print(Panel(result, title="IP e Rota", style="cyan"))
-    post_test_menu(result, "ip_rota")
+    estado = estado_rede.obter(forcar=True)
+    r = registro.Resultado("ip_rota", "IP e Rota", texto=estado.texto_enderecos() + "\n\n" + estado.texto_rotas())
+    mostrar_resultado(r)
 
 def get_gateway():
-    route, _ = run_command("ip r")
-    for line in route.splitlines():
-        if line.startswith("default"):
-            return line.split()[2]
-    return None
+    return estado_rede.obter().gateway()
 
 def diagnostico_ping_gateway():
     gateway = get_gateway()
     if not gateway:
-        result = "Gateway não encontrado."
-        console.print(Panel(result, title="Ping Gateway", style="red"))
-        post_test_menu(result, "ping_gateway")
+        r = registro.Resultado("ping_gateway", "Ping Gateway", texto="Gateway não encontrado.")
+        mostrar_resultado(r, "red")
         return
 
-    raw, _ = run_command(f"ping -c 10 {gateway}")
-    perda_match = re.search(r"(\d+)% packet loss", raw)
-    perda_pct = int(perda_match.group(1)) if perda_match else 0
-
-    lat_match = re.findall(r'time=(\d+\.\d+)', raw)
-    if lat_match:
-        tempos = [float(x) for x in lat_match]
-        media = sum(tempos) / len(tempos)
-        jitter = max(abs(tempos[i] - tempos[i-1]) for i in range(1, len(tempos)))
-    else:
-        media, jitter = 0, 0
+    st = ping_ao_vivo(gateway, f"Ping {gateway}")
+    r = registro.Resultado("ping_gateway", "Diagnóstico - Gateway", alvo=gateway,
+                           interface=estado_rede.obter().interface_para(gateway),
+                           texto=f"Pacotes: {st.recebidos}/{st.concluidos} ({st.metodo})")
+    _medidas_ping(r, st)
+    media, jitter = (st.media, st.jitter) if st.recebidos else (0, 0)
 
-    status = []
-    if perda_pct > 20:
-        status.append("🔴 Alta perda de pacotes")
-    elif perda_pct > 5:
-        status.append("🟡 Perda moderada")
+    if st.perda_pct > 20:
+        r.achar(registro.CRITICO, "Alta perda de pacotes")
+    elif st.perda_pct > 5:
+        r.achar(registro.ALERTA, "Perda moderada")
 
     if media > 150:
-        status.append("🔴 Latência alta")
+        r.achar(registro.CRITICO, "Latência alta")
     elif media > 80:
-        status.append("🟡 Latência acima do ideal")
+        r.achar(registro.ALERTA, "Latência acima do ideal")
 
     if jitter > 20:
-        status.append("🟡 Jitter elevado")
-
-    if not status:
-        classificacao = "✅ Conexão com o gateway estável"
-    else:
-        classificacao = "\n".join(status)
+        r.achar(registro.ALERTA, "Jitter elevado")
 
-    result = f"""\
-Gateway: {gateway}
-Latência média: {media:.2f} ms
-Jitter estimado: {jitter:.2f} ms
-Perda de pacotes: {perda_pct}%
-
-{classificacao}
-"""
-    console.print(Panel(result.strip(), title="Diagnóstico - Gateway", style="cyan"))
-    post_test_menu(result.strip(), "ping_gateway")
+    if not r.achados:
+        r.classificacao = "✅ Conexão com o gateway estável"
+    mostrar_resultado(r)
 
 def diagnostico_ping_custom():
     ip = input("Digite o IP ou domínio de destino (ex: 8.8.8.8): ").strip()
     count = input("Quantos pacotes deseja enviar? (ex: 10): ").strip()
     if not count.isdigit(): count = "10"
-    result = run_command_live(f"ping -c {count} {ip}")
-    console.print(Panel(result, title=f"Ping para {ip}", style="cyan"))
-    post_test_menu(result, f"ping_{ip.replace('.', '_')}")
+    fl, st = _ping_comando(["ping", "-c", count, ip], ip, int(count) * 2 + 10)
+    mostrar_resultado(_resultado_ping_comando("ping", f"Ping para {ip}", ip, fl, st))
 
 def diagnostico_dns():
-    dig, _ = run_command("dig google.com +short") if comando_existe("dig") else "Comando 'dig' não encontrado."
-    host, _ = run_command("host google.com") if comando_existe("host") else "Comando 'host' não encontrado."
-    result = f"dig google.com:\n{dig}\n\nhost google.com:\n{host}"
-    console.print(Panel(result, title="Testes de DNS", style="cyan"))
-    post_test_menu(result, "dns")
+    extra = input("DNS do provedor para comparar (opcional, ex: 200.200.200.200): ").strip()
+    servidores = resolvedor.servidores_padrao({f"Provedor ({extra})": extra} if extra else None)
+    with console.status(f"[cyan]Consultando {len(servidores)} resolvedores...[/cyan]"):
+        bench = resolvedor.executar_benchmark(servidores)
+
+    table = Table(title="Resolvedores DNS")
+    table.add_column("Resolvedor", style="cyan")
+    table.add_column("IP")
+    table.add_column("p50 (ms)", style="green")
+    table.add_column("p90 (ms)", style="green")
+    table.add_column("p99 (ms)", style="green")
+    table.add_column("Falhas", style="red")
+    table.add_column("NXDOMAIN", style="yellow")
+    fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+    for r in sorted(bench["resolvedores"], key=lambda r: (r["p90_ms"] is None, r["p90_ms"] or 0)):
+        table.add_row(r["nome"], r["servidor"], fmt(r["p50_ms"]), fmt(r["p90_ms"]), fmt(r["p99_ms"]),
+                      f"{r['falha_pct']:.0f}%", f"{r['nxdomain_pct']:.0f}%")
+    console.print(table)
+
+    # A tabela já mostra cada resolvedor; o registro guarda o benchmark inteiro em detalhes
+    resultado = registro.Resultado("dns", "Testes de DNS", detalhes=bench)
+    recomendado = next((r for r in bench["resolvedores"] if r["nome"] == bench["recomendado"]), None)
+    if recomendado:
+        resultado.medir("latencia", recomendado["p50_ms"], "ms", f"p50 de {recomendado['nome']}",
+                        alerta=50, critico=150, casas=1)
+        resultado.classificacao = f"✅ Recomendado: {bench['recomendado']}"
+    else:
+        resultado.achar(registro.CRITICO,
+                        "Nenhum resolvedor respondeu de forma confiável (verifique bloqueio da porta 53)")
+    mostrar_resultado(resultado)
 
 def diagnostico_portas():
-    host = input("Informe o IP ou host (ex: 8.8.8.8): ").strip()
-    portas_str = input("Informe as portas separadas por vírgula (ex: 80,443,22): ").strip()
+    hosts = varredura.parse_hosts(input("Informe o(s) IP(s) ou host(s) (ex: 8.8.8.8,192.168.1.1): "))
+    portas_str = input("Informe as portas ou faixas (ex: 80,443,22 ou 1-1024,8080): ").strip()
     try:
-        portas = [int(p.strip()) for p in portas_str.split(',')]
-    except:
+        portas = varredura.parse_portas(portas_str)
+    except ValueError:
         console.print("[red]Portas inválidas.[/red]")
         return
-    resultados = {}
-    for port in portas:
-        try:
-            with socket.create_connection((host, port), timeout=2):
-                resultados[port] = "Aberta"
-        except Exception:
-            resultados[port] = "Fechada"
-    result = f"Host: {host}\n" + "\n".join([f"Porta {p}: {s}" for p, s in resultados.items()])
-    console.print(Panel(result, title="Teste de Portas", style="cyan"))
-    post_test_menu(result, "portas_custom")
+    if not hosts:
+        console.print("[red]Nenhum host informado.[/red]")
+        return
+    banner = input("Capturar banner das portas abertas? (s/N): ").strip().lower() == "s"
+
+    total = len(hosts) * len(portas)
+    with Progress(SpinnerColumn(), TextColumn("{task.description}"), BarColumn(),
+                  TextColumn("{task.completed}/{task.total}"), TimeElapsedColumn(),
+                  console=console._obter(), transient=True) as progress:
+        tarefa = progress.add_task("Varrendo portas...", total=total)
+        scan = varredura.varrer_portas(hosts, portas, banner=banner,
+                                       ao_resultado=lambda _: progress.advance(tarefa))
+
+    nomes = {varredura.ABERTA: "Aberta", varredura.FECHADA: "Fechada", varredura.FILTRADA: "Filtrada"}
+    linhas = []
+    for host in hosts:
+        if host in scan["nao_resolvidos"]:
+            linhas.append(f"Host: {host}\n  Não foi possível resolver o nome.")
+            continue
+        linhas.append(f"Host: {host}")
+        do_host = [r for r in scan["resultados"] if r["host"] == host]
+        for estado in (varredura.ABERTA, varredura.FECHADA, varredura.FILTRADA):
+            grupo = [r for r in do_host if r["estado"] == estado]
+            # Em faixas grandes, listar só as abertas; fechadas/filtradas viram contagem
+            if estado != varredura.ABERTA and len(grupo) > 20:
+                linhas.append(f"  {nomes[estado]}s: {len(grupo)} portas")
+                continue
+            for r in grupo:
+                lat = f" ({r['latencia_ms']:.1f} ms)" if r["latencia_ms"] is not None else ""
+                ban = f" - {r['banner']}" if r["banner"] else ""
+                linhas.append(f"  Porta {r['porta']}: {nomes[estado]}{lat}{ban}")
+
+    resumo = scan["resumo"]
+    resultado = registro.Resultado("portas", "Teste de Portas", alvo=",".join(hosts), texto="\n".join(linhas),
+                                   detalhes={"resumo": resumo, "resultados": scan["resultados"],
+                                             "nao_resolvidos": scan["nao_resolvidos"]})
+    resultado.medir("abertas", resumo[varredura.ABERTA], "portas", "Abertas")
+    resultado.medir("fechadas", resumo[varredura.FECHADA], "portas", "Fechadas")
+    resultado.medir("filtradas", resumo[varredura.FILTRADA], "portas", "Filtradas")
+    resultado.medir("duracao", scan["duracao_s"], "s", "Tempo")
+    resultado.medir("taxa", scan["portas_por_segundo"], "portas/s", "Taxa", casas=0)
+    mostrar_resultado(resultado)
 
 def diagnostico_ip_publico():
-    result, _ = run_command("curl -s ifconfig.me")
-    console.print(Panel(result, title="IP Público", style="cyan"))
-    post_test_menu(result, "ip_publico")
+    s = web.testar([web.IP_PUBLICO])[0]
+    ip = s["corpo"].decode("latin-1").strip() if s["status"] == 200 else ""
+    r = registro.Resultado("ip_publico", "IP Público", alvo=web.IP_PUBLICO,
+                           texto=ip or s["erro"] or f"HTTP {s['status']}",
+                           detalhes={"ip": ip or None, "http": web.resumo(s)})
+    _medidas_fases(r, s)
+    if not ip:
+        r.achar(registro.ALERTA, "Não foi possível obter o IP público")
+    mostrar_resultado(r)
 
 def diagnostico_dhcp():
-    result, _ = run_command("journalctl -b --since '10 minutes ago' -g DHCP")
-    console.print(Panel(result, title="Logs de DHCP", style="cyan"))
-    post_test_menu(result, "dhcp")
+    saida, _ = run_command(["journalctl", "-b", "--since", "10 minutes ago", "-g", "DHCP"], timeout=20)
+    mostrar_resultado(registro.Resultado("dhcp", "Logs de DHCP", texto=saida))
 
 def diagnostico_latency_jitter():
     console.rule("[bold blue]Diagnóstico de Latência e Jitter[/bold blue]")
-    raw, err = run_command("ping -c 10 8.8.8.8")
-
-    if not raw:
-        result = f"O comando ping não retornou saída.\nErro:\n{err}"
-        console.print(Panel(result, title="Latência e Jitter", style="red"))
-        post_test_menu(result, "latencia_jitter")
-        return
-
-    times = re.findall(r'time=(\d+\.\d+)', raw)
-    if not times:
-        result = f"Não foi possível calcular latência/jitter.\n\nSaída bruta:\n{raw}"
-        console.print(Panel(result, title="Latência e Jitter", style="red"))
-        post_test_menu(result, "latencia_jitter")
+    st = ping_ao_vivo("8.8.8.8", "Ping 8.8.8.8")
+    r = registro.Resultado("latencia_jitter", "Latência e Jitter - Análise", alvo="8.8.8.8",
+                           interface=estado_rede.obter().interface_para("8.8.8.8"))
+
+    if st.erro or not st.recebidos:
+        r.titulo = "Latência e Jitter"
+        r.texto = f"Nenhuma resposta de 8.8.8.8 ({st.metodo}).\n{st.erro or ''}".strip()
+        if st.concluidos:
+            _medidas_ping(r, st, perda=(None, 10), jitter=(10, 30))
+        r.detalhes = st.resumo()
+        mostrar_resultado(r, "red")
         return
 
-    times = [float(t) for t in times]
-    media = sum(times) / len(times)
-    jitter = max(abs(times[i] - times[i-1]) for i in range(1, len(times)))
-    perda_match = re.search(r'(\d+)% packet loss', raw)
-    perda_pct = int(perda_match.group(1)) if perda_match else 0
-
-    status = []
-    causas = []
-    solucoes = []
+    _medidas_ping(r, st, perda=(None, 10), jitter=(10, 30))
+    r.medir("mos", st.mos, "", f"Qualidade para voz (MOS, R = {st.r_fator:.0f})",
+            alerta=3.6, critico=3.1, maior_pior=False)
+    media = st.media
+    jitter = st.jitter
+    perda_pct = st.perda_pct
 
     if perda_pct > 10:
-        status.append("🔴 Perda alta de pacotes")
-        causas.append("Sinal fraco, interferência ou instabilidade na rede")
-        solucoes.append("Verificar sinal Wi-Fi ou testar via cabo")
+        r.achar(registro.CRITICO, "Perda alta de pacotes",
+                "Sinal fraco, interferência ou instabilidade na rede",
+                "Verificar sinal Wi-Fi ou testar via cabo")
 
     if jitter > 30:
-        status.append("🔴 Jitter alto")
-        causas.append("Bufferbloat ou congestionamento")
-        solucoes.append("Ativar QoS ou testar sem outros dispositivos na rede")
+        r.achar(registro.CRITICO, "Jitter alto", "Bufferbloat ou congestionamento",
+                "Confirmar com Latência sob Carga (Funções Avançadas) e ativar QoS/SQM")
     elif jitter > 10:
-        status.append("🟡 Jitter moderado")
+        r.achar(registro.ALERTA, "Jitter moderado")
 
     if media > 150:
-        status.append("🔴 Latência muito alta")
-        causas.append("Conexão lenta ou rota internacional")
-        solucoes.append("Testar DNS, trocar horário ou checar provedor")
+        r.achar(registro.CRITICO, "Latência muito alta", "Conexão lenta ou rota internacional",
+                "Testar DNS, trocar horário ou checar provedor")
     elif media > 80:
-        status.append("🟡 Latência acima do ideal")
-
-    if not status:
-        classificacao = "✅ Rede excelente"
-    elif "🔴" not in "".join(status):
-        classificacao = "🟡 Rede boa, com oscilações"
-    elif status.count("🔴") <= 2:
-        classificacao = "🟠 Rede instável"
-    else:
-        classificacao = "🔴 Rede ruim"
-
-    result = f"""
-[bold cyan]Diagnóstico de Latência e Jitter[/bold cyan]
+        r.achar(registro.ALERTA, "Latência acima do ideal")
 
-[bold]Latência média:[/bold] {media:.2f} ms
-[bold]Jitter estimado:[/bold] {jitter:.2f} ms
-[bold]Perda de pacotes:[/bold] {perda_pct} %
+    r.classificacao = _classificacao(r, "✅ Rede excelente", "🟡 Rede boa, com oscilações")
+    mostrar_resultado(r)
 
-[bold magenta]Classificação:[/bold magenta] {classificacao}
-"""
-
-    if status:
-        result += "\n[bold red]Problemas identificados:[/bold red]\n- " + "\n- ".join(status)
-    if causas:
-        result += "\n\n[bold yellow]Possíveis causas:[/bold yellow]\n- " + "\n- ".join(causas)
-    if solucoes:
-        result += "\n\n[bold green]Sugestões de solução:[/bold green]\n- " + "\n- ".join(solucoes)
-
-    console.print(Panel(result.strip(), title="Latência e Jitter - Análise", style="cyan"))
-    post_test_menu(result.strip(), "latencia_jitter")
+def _classificacao(r, excelente, boa):
+    # Mesma escala para latência/jitter e speedtest: conta os achados críticos
+    criticos = sum(1 for c, _ in r.achados if c == registro.CRITICO)
+    if not r.achados:
+        return excelente
+    if not criticos:
+        return boa
+    return "🟠 Rede instável" if criticos <= 2 else "🔴 Rede ruim"
 
 # ========== FUNÇÕES AVANÇADAS ==========
 
 def diagnostico_speedtest():
     if not comando_existe("speedtest"):
-        result = "SpeedTest CLI não instalado.\nInstale com:\ncurl -s https://packagecloud.io/install/repositories/ookla/speedtest-cli/script.deb.sh | sudo bash\nsudo apt install speedtest"
-        console.print(Panel(result, title="SpeedTest - Erro", style="red"))
-        post_test_menu(result, "speedtest_nao_instalado")
+        texto = "SpeedTest CLI não instalado.\nInstale com:\ncurl -s https://packagecloud.io/install/repositories/ookla/speedtest-cli/script.deb.sh | sudo bash\nsudo apt install speedtest"
+        mostrar_resultado(registro.Resultado("speedtest", "SpeedTest - Erro", texto=texto), "red")
         return
 
     console.print("[cyan]Executando SpeedTest CLI oficial...[/cyan]")
-    output, _ = run_command("speedtest --accept-license --accept-gdpr --format=json")
+    output, _ = run_command(["speedtest", "--accept-license", "--accept-gdpr", "--format=json"], timeout=180)
 
     try:
         data = json.loads(output)
@@ -283,165 +427,277 @@ def diagnostico_speedtest():
         loss = data.get("packetLoss", 0)
         url = data.get("result", {}).get("url", "")
     except Exception as e:
-        console.print(Panel(f"[red]Erro ao interpretar resultado JSON:[/red] {e}", title="Erro SpeedTest"))
-        post_test_menu(output, "erro_speedtest_parse")
+        r = registro.Resultado("speedtest", "Erro SpeedTest", texto=output)
+        r.achar(registro.CRITICO, f"Erro ao interpretar resultado JSON: {e}")
+        mostrar_resultado(r, "red")
         return
 
-    # Diagnóstico
-    status = []
-    causas = []
-    solucoes = []
+    r = registro.Resultado("speedtest", "SpeedTest - Análise Automática", alvo=data["server"]["name"],
+                           texto=f"Servidor: {data['server']['name']} ({data['server']['location']})\n"
+                                 f"Operadora: {data['isp']}\nResultado: {url}", detalhes=data)
+    r.medir("latencia", ping, "ms", "Latência", alerta=50, critico=150)
+    r.medir("jitter", jitter, "ms", "Jitter", alerta=10, critico=30)
+    r.medir("vazao", download, "Mbps", "Download", critico=10, maior_pior=False)
+    r.medir("upload", upload, "Mbps", "Upload", critico=3, maior_pior=False)
+    r.medir("perda", loss, "%", "Perda de Pacotes", alerta=0, critico=2)
 
     # Classificação de qualidade
     if loss > 2:
-        status.append("🔴 Perda alta")
-        causas.append("Possível instabilidade física (Wi-Fi fraco, ruído, cabo danificado)")
-        solucoes.append("Trocar interface, testar com cabo, evitar obstáculos")
+        r.achar(registro.CRITICO, "Perda alta",
+                "Possível instabilidade física (Wi-Fi fraco, ruído, cabo danificado)",
+                "Trocar interface, testar com cabo, evitar obstáculos")
     elif loss > 0:
-        status.append("🟡 Perda moderada")
-        causas.append("Flutuações ocasionais, possível interferência")
-        solucoes.append("Reiniciar modem, testar com outro roteador")
+        r.achar(registro.ALERTA, "Perda moderada", "Flutuações ocasionais, possível interferência",
+                "Reiniciar modem, testar com outro roteador")
 
     if jitter > 30:
-        status.append("🔴 Jitter alto")
-        causas.append("Bufferbloat ou instabilidade durante tráfego")
-        solucoes.append("Ativar QoS, substituir roteador")
+        r.achar(registro.CRITICO, "Jitter alto", "Bufferbloat ou instabilidade durante tráfego",
+                "Confirmar com Latência sob Carga (Funções Avançadas); ativar QoS/SQM ou substituir roteador")
     elif jitter > 10:
-        status.append("🟡 Jitter moderado")
+        r.achar(registro.ALERTA, "Jitter moderado")
 
     if ping > 150:
-        status.append("🔴 Latência alta")
-        causas.append("Rota internacional ou rede congestionada")
-        solucoes.append("Testar em outro horário, trocar DNS")
+        r.achar(registro.CRITICO, "Latência alta", "Rota internacional ou rede congestionada",
+                "Testar em outro horário, trocar DNS")
     elif ping > 50:
-        status.append("🟡 Latência acima do ideal")
+        r.achar(registro.ALERTA, "Latência acima do ideal")
 
     if download < 10 or upload < 3:
-        status.append("🔴 Banda baixa")
-        causas.append("Plano limitado, tráfego alto, gargalo no provedor")
-        solucoes.append("Verificar contrato, uso compartilhado ou horários de pico")
-
-    if not status:
-        classificacao = "✅ Rede excelente"
-    elif "🔴" not in "".join(status):
-        classificacao = "🟡 Rede boa, com pontos a observar"
-    elif status.count("🔴") <= 2:
-        classificacao = "🟠 Rede instável"
-    else:
-        classificacao = "🔴 Rede ruim"
+        r.achar(registro.CRITICO, "Banda baixa", "Plano limitado, tráfego alto, gargalo no provedor",
+                "Verificar contrato, uso compartilhado ou horários de pico")
 
-    result = f"""
-[bold cyan]SpeedTest CLI - Diagnóstico[/bold cyan]
-
-[bold]Servidor:[/bold] {data['server']['name']} ({data['server']['location']})
-[bold]Operadora:[/bold] {data['isp']}
-
-[bold]Latência:[/bold] {ping:.2f} ms
-[bold]Jitter:[/bold] {jitter:.2f} ms
-[bold]Download:[/bold] {download:.2f} Mbps
-[bold]Upload:[/bold] {upload:.2f} Mbps
-[bold]Perda de Pacotes:[/bold] {loss}%
-[bold]Resultado:[/bold] {url}
-
-[bold magenta]Classificação:[/bold magenta] {classificacao}
-"""
-
-    if status:
-        result += "\n[bold red]Problemas identificados:[/bold red]\n- " + "\n- ".join(status)
-    if causas:
-        result += "\n\n[bold yellow]Possíveis causas:[/bold yellow]\n- " + "\n- ".join(causas)
-    if solucoes:
-        result += "\n\n[bold green]Sugestões de solução:[/bold green]\n- " + "\n- ".join(solucoes)
-
-    console.print(Panel(result.strip(), title="SpeedTest - Análise Automática", style="magenta"))
-    post_test_menu(result.strip(), "speedtest_diagnostico")
+    r.classificacao = _classificacao(r, "✅ Rede excelente", "🟡 Rede boa, com pontos a observar")
+    mostrar_resultado(r, "magenta")
 
 def diagnostico_rota_interface():
-    interfaces, _ = run_command("ip -o link show | awk -F': ' '{print $2}'").splitlines()
-    interfaces = [i for i in interfaces if not i.startswith("lo")]
+    interfaces = [i for i in estado_rede.obter().nomes() if not i.startswith("lo")]
     console.print("[bold cyan]Interfaces disponíveis:[/bold cyan]")
     for idx, iface in enumerate(interfaces):
         console.print(f"[{idx}] {iface}")
     escolha = input("Escolha a interface (número): ").strip()
     try:
         iface = interfaces[int(escolha)]
-        result = run_command_live(f"ping -I {iface} -c 5 8.8.8.8")
-    except:
-        result = "Erro ao selecionar interface."
-    console.print(Panel(result, title="Ping por Interface", style="magenta"))
-    post_test_menu(result, "ping_interface")
+    except (ValueError, IndexError):
+        mostrar_resultado(registro.Resultado("ping_interface", "Ping por Interface",
+                                             texto="Erro ao selecionar interface."), "red")
+        return
+    fl, st = _ping_comando(["ping", "-I", iface, "-c", "5", "8.8.8.8"], "8.8.8.8", 20)
+    mostrar_resultado(_resultado_ping_comando("ping_interface", "Ping por Interface", "8.8.8.8", fl, st, iface),
+                      "magenta")
+
+def _medidas_fases(r, s):
+    # Tempo por fase de uma sonda HTTP (web.py) -> medidas do registro
+    f = s["fases"]
+    r.medir("dns", f["dns_ms"], "ms", "DNS", alerta=100, critico=500, casas=1)
+    r.medir("conexao", f["conexao_ms"], "ms", "Conexão TCP", alerta=150, critico=500, casas=1)
+    if f["tls_ms"] is not None:
+        r.medir("tls", f["tls_ms"], "ms", "Handshake TLS", alerta=300, critico=1000, casas=1)
+    r.medir("ttfb", f["ttfb_ms"], "ms", "Resposta do servidor (TTFB)", alerta=500, critico=2000, casas=1)
+    r.medir("total", f["total_ms"], "ms", "Total", casas=1)
 
 def diagnostico_captive():
-    result, _ = run_command("curl -I http://clients3.google.com/generate_204")
-    if "204" in result:
-        status = "✅ Sem captive portal"
+    with console.status("[cyan]Consultando as URLs de detecção de captive portal...[/cyan]"):
+        c = web.captive()
+    respondeu = next((s for s in c["sondas"] if not s["erro"]), None)
+    r = registro.Resultado("captive_portal", "Captive Portal", alvo=(respondeu or c["sondas"][0])["url"],
+                           texto=web.formatar(c["sondas"]),
+                           detalhes={"estado": c["estado"], "portal": c["portal"],
+                                     "sondas": [web.resumo(s) for s in c["sondas"]]})
+    if respondeu:
+        _medidas_fases(r, respondeu)
+    if c["estado"] == web.LIVRE:
+        r.classificacao = "✅ Sem captive portal"
+    elif c["estado"] == web.PORTAL:
+        r.achar(registro.ALERTA, f"Captive portal: redirecionado para {c['portal']}",
+                "A rede exige login (hotel, aeroporto, provedor com bloqueio por inadimplência)",
+                "Abrir um navegador e autenticar no portal")
+    elif c["estado"] == web.INTERCEPTADO:
+        r.achar(registro.ALERTA, "Resposta das URLs de teste alterada no caminho",
+                "Portal sem redirecionamento ou proxy transparente", "Abrir um navegador e verificar a página")
     else:
-        status = "⚠️ Possível redirecionamento ou bloqueio"
-    final = f"{result}\\n\\nDiagnóstico: {status}"
-    console.print(Panel(final, title="Captive Portal", style="magenta"))
-    post_test_menu(final, "captive_portal")
+        fases = sorted({s["fase_erro"] for s in c["sondas"] if s["fase_erro"]})
+        r.achar(registro.CRITICO, f"Nenhuma URL de teste respondeu (falha em: {', '.join(fases) or '?'})",
+                "Sem acesso à internet, DNS fora ou HTTP bloqueado", "Verificar gateway e DNS")
+    mostrar_resultado(r, "magenta")
+
+def diagnostico_web():
+    console.rule("[bold blue]Tempo por Fase HTTP (DNS, TCP, TLS, servidor)[/bold blue]")
+    entrada = input("URLs separadas por vírgula (Enter para a lista padrão): ").strip()
+    urls = [u.strip() for u in entrada.split(",") if u.strip()] or web.URLS_PADRAO
+    urls = [u if "://" in u else f"https://{u}" for u in urls]
+    # 2ª rodada no mesmo pool: conexão já aberta, sobra só o tempo do servidor
+    with console.status(f"[cyan]Sondando {len(urls)} URL(s) em paralelo...[/cyan]"):
+        resultados = web.testar(urls, repeticoes=2)
+
+    table = Table(title="Tempo por fase (ms)")
+    table.add_column("URL", style="cyan")
+    table.add_column("Rodada")
+    table.add_column("HTTP")
+    for fase in web.FASES:
+        table.add_column(web.COLUNAS[fase], style="green")
+    table.add_column("Total", style="bold")
+    table.add_column("Mais lento", style="yellow")
+    fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+    for s in resultados:
+        fim = escape(s["erro"]) if s["erro"] else web.NOMES_FASES.get(s["gargalo"], "-")
+        if s["reusada"]:
+            fim += " (reaproveitada)"
+        table.add_row(s["url"], str(s["rodada"]), str(s["status"] or "-"),
+                      *(fmt(s["fases"][f]) for f in web.FASES), fmt(s["fases"]["total_ms"]), fim)
+    console.print(table)
+
+    frios = [s for s in resultados if s["rodada"] == 1]
+    r = registro.Resultado("web", "Tempo por Fase HTTP", alvo=",".join(urls),
+                           detalhes={"urls": [web.resumo(s) for s in resultados]})
+    for s in frios:
+        if s["erro"]:
+            r.achar(registro.ALERTA, f"{s['url']}: {s['erro']}")
+        else:
+            r.medir(f"total:{s['url']}", s["fases"]["total_ms"], "ms", f"Total até {s['url']}",
+                    alerta=1000, critico=3000, casas=0)
+    gargalos = [s["gargalo"] for s in frios if not s["erro"] and s["gargalo"]]
+    if gargalos:
+        pior = max(set(gargalos), key=gargalos.count)
+        media = sum(s["fases"][pior] for s in frios if not s["erro"] and s["gargalo"] == pior) / gargalos.count(pior)
+        texto = f"Fase mais lenta na maioria das URLs: {web.COLUNAS[pior]} ({media:.0f} ms em média)"
+        if pior == "dns_ms" and media > 100:
+            r.achar(registro.ALERTA, texto, "Resolvedor DNS lento ou distante",
+                    "Comparar resolvedores em Testes de DNS")
+        elif pior in ("conexao_ms", "tls_ms") and media > 300:
+            r.achar(registro.ALERTA, texto, "Latência alta até os servidores ou inspeção TLS no caminho",
+                    "Verificar latência/perda (Ping, MTR) e proxies/antivírus")
+        else:
+            r.texto = texto
+    if not r.achados:
+        r.classificacao = "✅ Navegação sem gargalo de rede"
+    mostrar_resultado(r)
 
 def diagnostico_dns_bloqueado():
-    resultado = ""
+    r = registro.Resultado("dns_block", "Bloqueio de DNS (porta 53)", alvo="8.8.8.8")
+    linhas = []
     for tipo in ["tcp", "udp"]:
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM if tipo == "tcp" else socket.SOCK_DGRAM)
             s.settimeout(2)
             s.connect(("8.8.8.8", 53))
-            resultado += f"Porta 53 {tipo.upper()}: Acessível\\n"
+            linhas.append(f"Porta 53 {tipo.upper()}: Acessível")
+            r.detalhes[tipo] = True
         except:
-            resultado += f"Porta 53 {tipo.upper()}: Bloqueada\\n"
+            linhas.append(f"Porta 53 {tipo.upper()}: Bloqueada")
+            r.detalhes[tipo] = False
+            r.achar(registro.ALERTA, f"Porta 53 {tipo.upper()} bloqueada")
         finally:
             s.close()
-    console.print(Panel(resultado, title="Bloqueio de DNS (porta 53)", style="magenta"))
-    post_test_menu(resultado, "dns_block")
+    r.texto = "\n".join(linhas)
+    mostrar_resultado(r, "magenta")
 
 def diagnostico_mtu():
-    tamanho = 1472
-    while tamanho > 1000:
-        resultado, _ = run_command(f"ping -c 1 -s {tamanho} -M do 8.8.8.8")
-        if "Frag needed" in resultado or "Message too long" in resultado or "100% packet loss" in resultado:
-            tamanho -= 10
+    destinos = varredura.parse_hosts(input("Destinos (ex: 8.8.8.8,1.1.1.1): ")) or ["8.8.8.8"]
+    with console.status("[cyan]Descobrindo MTU do caminho...[/cyan]"):
+        resultados = pmtu.descobrir_pmtu(destinos)
+
+    r = registro.Resultado("mtu", "Teste de MTU", alvo=",".join(destinos),
+                           detalhes={"destinos": list(resultados.values())})
+    linhas = []
+    for destino in destinos:
+        d = resultados[destino]
+        if d["status"] == "nao_resolvido":
+            r.achar(registro.ALERTA, f"{destino}: não foi possível resolver o nome")
+        elif d["status"] == "sem_permissao_icmp":
+            r.achar(registro.ALERTA, f"{destino}: sem permissão para ICMP (rode como root ou ajuste net.ipv4.ping_group_range)")
+        elif d["status"] == "inalcancavel":
+            r.achar(registro.CRITICO, f"{destino}: sem resposta nem com pacotes mínimos ({d['perdas']} perdas) - destino inalcançável")
         else:
-            break
-    final = f"MTU máximo sem fragmentação estimado: {tamanho + 28} bytes (incluindo cabeçalhos IP/ICMP)"
-    console.print(Panel(final, title="Teste de MTU", style="magenta"))
-    post_test_menu(final, "mtu")
+            origem = "cache" if d["cache"] else f"{d['sondas']} sondas"
+            r.medir(f"pmtu:{destino}", d["pmtu"], "B", f"MTU sem fragmentação até {destino} via {d['interface'] or '?'} ({origem})")
+            if d["mtu_roteador"]:
+                linhas.append(f"{destino}: roteador no caminho informou MTU {d['mtu_roteador']}")
+            if d["buraco_negro"]:
+                r.achar(registro.ALERTA, f"{destino}: pacotes grandes descartados sem aviso (ICMP filtrado / buraco negro de PMTU)")
+    r.texto = "\n".join(linhas + ["(MTU inclui cabeçalhos IP/ICMP)"])
+    mostrar_resultado(r, "magenta")
 
 def diagnostico_multiplos_gateways():
-    rotas, _ = run_command("ip r")
-    linhas = [l for l in rotas.splitlines() if l.startswith("default")]
-    resultado = "\\n".join(linhas)
-    status = "✅ Apenas um gateway padrão" if len(linhas) == 1 else "⚠️ Múltiplos gateways detectados"
-    final = f"{resultado}\\n\\nDiagnóstico: {status}"
-    console.print(Panel(final, title="Verificação de múltiplos gateways", style="magenta"))
-    post_test_menu(final, "multiplos_gateways")
+    gateways = estado_rede.obter(forcar=True).gateways_padrao()
+    linhas = [f"default via {r['gateway']} dev {r['interface']} metric {r['metrica']}" for r in gateways]
+    r = registro.Resultado("multiplos_gateways", "Verificação de múltiplos gateways",
+                           texto="\n".join(linhas) or "Nenhum gateway padrão IPv4", detalhes={"gateways": gateways})
+    r.medir("gateways", len(gateways), "", "Gateways padrão", alerta=1)
+    if len(linhas) == 1:
+        r.classificacao = "✅ Apenas um gateway padrão"
+    else:
+        r.achar(registro.ALERTA, "Múltiplos gateways detectados" if linhas else "Nenhum gateway padrão")
+    mostrar_resultado(r, "magenta")
 
 def diagnostico_traceroute():
     destino = input("Digite o destino (IP ou domínio): ").strip() or "8.8.8.8"
-    result = run_command_live(f"traceroute {destino}")
-    console.print(Panel(result, title=f"Traceroute para {destino}", style="cyan"))
-    post_test_menu(result, f"traceroute_{destino.replace('.', '_')}")
+    metodo = Prompt.ask("Tipo de sonda", choices=["udp", "icmp", "tcp"], default="udp")
+    try:
+        with console.status(f"[cyan]Rastreando {destino} (todos os saltos em paralelo)...[/cyan]"):
+            resultado = rastreio.traceroute(destino, metodo=metodo)
+    except (OSError, socket.gaierror) as e:
+        console.print(f"[red]Falha no traceroute: {e}[/red]")
+        return
+    r = registro.Resultado("traceroute", f"Traceroute para {destino}", alvo=destino,
+                           texto=rastreio.formatar(resultado), detalhes=resultado)
+    r.medir("saltos", len(resultado["hops"]), "", "Saltos")
+    r.medir("duracao", resultado["duracao_s"], "s", "Concluído em", casas=1)
+    if not resultado["alcancado"]:
+        r.achar(registro.ALERTA, "Destino não respondeu dentro do limite de saltos")
+    mostrar_resultado(r)
+
+def _resultado_mtr(destino, saltos, texto, saida=None):
+    r = registro.Resultado("mtr", f"MTR para {destino}", alvo=destino, texto=texto,
+                           detalhes={"saltos": saltos, "saida": saida})
+    if saltos:
+        ultimo = saltos[-1]
+        r.medir("saltos", len(saltos), "", "Saltos")
+        r.medir("latencia", ultimo["media_ms"], "ms", f"Latência média até {ultimo['host']}", alerta=80, critico=150)
+        r.medir("perda", ultimo["perda_pct"], "%", "Perda no destino", alerta=5, critico=20, casas=0)
+    return r
 
 def diagnostico_mtr():
     if not comando_existe("mtr"):
-        result = "Comando 'mtr' não encontrado. Instale com: sudo apt install mtr"
-    else:
-        destino = input("Destino (ex: 8.8.8.8): ").strip() or "8.8.8.8"
-        result = run_command_live(f"mtr --report --report-cycles 10 {destino}")
-    console.print(Panel(result, title=f"MTR para {destino}", style="cyan"))
-    post_test_menu(result, f"mtr_{destino.replace('.', '_')}")
-
-def netdiscover_custom():
-    console.rule("[bold blue]Netdiscover Customizado[/bold blue]")
-    # Listar interfaces de rede disponíveis (não loopback)
-    interfaces = []
-    try:
-        res = subprocess.run("ip -o link show | awk -F': ' '{print $2}'", shell=True, capture_output=True, text=True)
-        interfaces = [i for i in res.stdout.splitlines() if i != 'lo']
-    except Exception as e:
-        console.print(f"[red]Erro ao listar interfaces: {e}[/red]")
+        texto = "Comando 'mtr' não encontrado. Instale com: sudo apt install mtr"
+        mostrar_resultado(registro.Resultado("mtr", "MTR - Erro", texto=texto), "red")
+        return
+    destinos = varredura.parse_hosts(input("Destinos (ex: 8.8.8.8,1.1.1.1): ")) or ["8.8.8.8"]
+    if len(destinos) == 1:
+        destino = destinos[0]
+        interp = fluxo.InterpretadorMtr(destino)
+        fl = run_command_live(["mtr", "--report", "--report-cycles", "10", destino], 90, interp, f"MTR {destino}")
+        mostrar_resultado(_resultado_mtr(destino, interp.lista(), fl.texto_cauda(), fl.caminho))
         return
+    # Vários destinos: cada mtr leva ~10 s esperando a rede, então rodam todos ao mesmo tempo
+    with console.status(f"[cyan]MTR para {len(destinos)} destinos em paralelo...[/cyan]"):
+        saidas = comandos.executar_em_paralelo(
+            {d: ["mtr", "--report", "--report-cycles", "10", d] for d in destinos}, timeout=90)
+    for destino in destinos:
+        saida, erro, _ = saidas[destino]
+        interp = fluxo.InterpretadorMtr(destino)
+        for linha in saida.splitlines():
+            interp.interpretar(linha)
+        mostrar_resultado(_resultado_mtr(destino, interp.lista(), "\n".join(p for p in (saida.strip(), erro.strip()) if p)))
+
+def _tabela_hosts(hosts, titulo):
+    table = Table(title=titulo)
+    table.add_column("IP", style="cyan")
+    table.add_column("MAC", style="green")
+    table.add_column("Fabricante", style="magenta")
+    table.add_column("Método", style="yellow")
+    table.add_column("RTT (ms)", style="yellow", justify="right")
+    for h in sorted(hosts, key=lambda h: tuple(int(p) for p in h["ip"].split("."))):
+        rtt = f"{h['rtt_ms']:.1f}" if h["rtt_ms"] is not None else "-"
+        mac = h["mac"] or "-"
+        if h["conflito"]:
+            mac += " ⚠️ conflito: " + ", ".join(h["conflito"])
+        table.add_row(h["ip"], mac, h["fabricante"] or "-", h["metodo"], rtt)
+    return table
+
+def descoberta_hosts():
+    console.rule("[bold blue]Descoberta de Hosts na Rede[/bold blue]")
+    # Listar interfaces de rede disponíveis (não loopback)
+    interfaces = [i for i in estado_rede.obter().nomes() if i != 'lo']
 
     if not interfaces:
         console.print("[red]Nenhuma interface de rede disponível encontrada.[/red]")
@@ -454,46 +710,38 @@ def netdiscover_custom():
     choice = Prompt.ask("Escolha o número da interface para escanear", choices=[str(i) for i in range(1, len(interfaces)+1)])
     iface = interfaces[int(choice)-1]
 
-    use_range = Confirm.ask("Quer informar um range IP customizado para o escaneamento?")
-    if use_range:
-        ip_range = Prompt.ask("Informe o range IP (exemplo: 192.168.1.0/24)")
-    else:
-        ip_range = None
-
-    console.print(f"Executando netdiscover na interface [green]{iface}[/green] com range: [cyan]{ip_range or 'padrão'}[/cyan]")
-
-    # Montar comando netdiscover
-    # Caso não tenha range, roda netdiscover em modo passivo na interface (ex: sudo netdiscover -i eth0 -p)
-    # Se range informado, usa -r <range>
-    if ip_range:
-        cmd = f"sudo netdiscover -i {iface} -r {ip_range} -P -N"
-    else:
-        cmd = f"sudo netdiscover -i {iface} -P -N"
+    padrao = descoberta.rede_padrao(iface)
+    ip_range = Prompt.ask("Range IP a escanear", default=str(padrao) if padrao else None)
+    if not ip_range:
+        console.print("[red]A interface não tem IPv4; informe um range (ex: 192.168.1.0/24).[/red]")
+        return
 
-    # Executar netdiscover e capturar saída
-    console.print("[yellow]Aguardando resultados... (Ctrl+C para parar)[/yellow]")
+    console.print(f"Escaneando [cyan]{ip_range}[/cyan] pela interface [green]{iface}[/green] (ARP no segmento local, ICMP/TCP fora dele)")
+    encontrados = []
+    titulo = f"Hosts em {ip_range}"
     try:
-        process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        start_time = time.time()
-        discoveries = []
-        while True:
-            line = process.stdout.readline()
-            if not line:
-                break
-            # Filtrar linhas relevantes que contenham IP e MAC
-            if any(c.isdigit() for c in line) and ":" in line:
-                console.print(line.strip())
-                discoveries.append(line.strip())
-            # Limitar tempo para 30 segundos (opcional)
-            if time.time() - start_time > 30:
-                process.terminate()
-                break
-        log_data['netdiscover'] = discoveries
-    except KeyboardInterrupt:
-        process.terminate()
-        console.print("\n[red]Interrompido pelo usuário.[/red]")
-    except Exception as e:
-        console.print(f"[red]Erro durante netdiscover: {e}[/red]")
+        with Live(_tabela_hosts(encontrados, titulo), console=console._obter(),
+                  refresh_per_second=8, transient=True) as live:
+            def ao_host(host):
+                encontrados.append(host)
+                live.update(_tabela_hosts(encontrados, titulo))
+            resultado = descoberta.descobrir_rede(ip_range, interface=iface, ao_host=ao_host)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        return
+
+    console.print(_tabela_hosts(resultado["hosts"], titulo))
+    console.print(f"[bold]{resultado['total']} host(s)[/bold] em {resultado['duracao_s']:.2f} s "
+                  f"({', '.join(resultado['metodos']) or 'só tabela de vizinhos'})")
+    r = registro.Resultado("descoberta", titulo, alvo=resultado["rede"], interface=iface,
+                           detalhes={"metodos": resultado["metodos"], "sondas": resultado["sondas"],
+                                     "hosts": resultado["hosts"]})
+    r.medir("hosts", resultado["total"], "", "Hosts encontrados")
+    r.medir("duracao", resultado["duracao_s"], "s", "Tempo")
+    conflitos = [h["ip"] for h in resultado["hosts"] if h["conflito"]]
+    if conflitos:
+        r.achar(registro.CRITICO, f"Conflito de IP (mais de um MAC): {', '.join(conflitos)}")
+    post_test_menu(r)
 
 # Essa função não ativa conexão automática nem salva configuração persistente no sistema
 # Apenas configura IP na interface via comando ip addr add
@@ -501,12 +749,7 @@ def netdiscover_custom():
 def set_static_ip():
     console.rule("[bold blue]Configurar IP Estático na Interface Ethernet[/bold blue]")
     # Listar interfaces Ethernet disponíveis (exemplo: eth0, enp3s0...)
-    try:
-        res = subprocess.run("ip -o link show | awk -F': ' '{print $2}'", shell=True, capture_output=True, text=True)
-        interfaces = [i for i in res.stdout.splitlines() if i.startswith('eth') or i.startswith('enp')]
-    except Exception as e:
-        console.print(f"[red]Erro ao listar interfaces Ethernet: {e}[/red]")
-        return
+    interfaces = [i for i in estado_rede.obter().nomes() if i.startswith('eth') or i.startswith('enp')]
 
     if not interfaces:
         console.print("[red]Nenhuma interface Ethernet detectada.[/red]")
@@ -525,21 +768,22 @@ def set_static_ip():
 
     # Comandos para limpar IP atual e aplicar o novo
     # Remover IP antigo (caso exista)
-    rm_cmd = f"sudo ip addr flush dev {iface}"
-    add_cmd = f"sudo ip addr add {ip_addr}/{netmask} dev {iface}"
-    gw_cmd = f"sudo ip route add default via {gateway} dev {iface}"
+    rm_cmd = comandos.com_sudo(["ip", "addr", "flush", "dev", iface])
+    add_cmd = comandos.com_sudo(["ip", "addr", "add", f"{ip_addr}/{netmask}", "dev", iface])
+    gw_cmd = comandos.com_sudo(["ip", "route", "add", "default", "via", gateway, "dev", iface])
 
     console.print("[yellow]Aplicando configurações...[/yellow]")
-    out, err, _ = run_command(rm_cmd)
+    out, err = run_command(rm_cmd, timeout=15)
     if err:
         console.print(f"[red]Erro ao limpar IP: {err}[/red]")
-    out, err, _ = run_command(add_cmd)
+    out, err = run_command(add_cmd, timeout=15)
     if err:
         console.print(f"[red]Erro ao configurar IP: {err}[/red]")
-    out, err, _ = run_command(gw_cmd)
+    out, err = run_command(gw_cmd, timeout=15)
     if err and "File exists" not in err:
         console.print(f"[red]Erro ao configurar gateway: {err}[/red]")
 
+    estado_rede.invalidar()
     console.print(f"[green]IP estático configurado em {iface}: {ip_addr}/{netmask}, gateway {gateway}[/green]")
 
     # Salvar configuração localmente em arquivo json (lista IPs estáticos configurados)
@@ -562,29 +806,39 @@ def set_static_ip():
         json.dump(saved_configs, f, indent=4)
 
     console.print(f"[cyan]Configuração salva localmente em {file_path}[/cyan]")
-    log_data['static_ip'] = saved_configs
 
 def test_download_speed():
     console.rule("[bold blue]Teste de Download - Análise de Velocidade[/bold blue]")
 
-    urls = [("Hetzner 100MB", "https://nbg1-speed.hetzner.com/100MB.bin")]
+    alvos = vazao.ALVOS_PADRAO + [("Outra URL", None), ("Servidor local (teste offline)", None)]
     console.print("Escolha o arquivo para teste de download:")
-    for idx, (name, url) in enumerate(urls, 1):
-        console.print(f"{idx}. {name} - {url}")
-    choice = Prompt.ask("Número da opção", choices=[str(i) for i in range(1, len(urls)+1)])
-    name, url = urls[int(choice)-1]
+    for idx, (name, url) in enumerate(alvos, 1):
+        console.print(f"{idx}. {name}" + (f" - {url}" if url else ""))
+    choice = int(Prompt.ask("Número da opção", choices=[str(i) for i in range(1, len(alvos)+1)]))
+    name, url = alvos[choice-1]
+    local = None
+    if choice == len(alvos):
+        local = vazao.ServidorLocal().iniciar()
+        url = local.url
+    elif url is None:
+        url = input("URL (http/https): ").strip()
+    fluxos = IntPrompt.ask("Conexões em paralelo", default=4)
+    duracao = FloatPrompt.ask("Duração da medição (s)", default=10.0)
+
+    def ao_intervalo(t, mbps, aquecendo):
+        extra = " [dim](aquecimento, fora da média)[/dim]" if aquecendo else ""
+        console.print(f"  {t:5.1f} s  {mbps:9.2f} Mbps{extra}")
 
     try:
-        start = time.time()
-        out, _ = run_command(f"curl -o /dev/null -s -w '%{{size_download}};%{{time_total}}' {url}")
-        bytes_downloaded, time_taken = out.split(";")
-        bytes_downloaded = int(bytes_downloaded)
-        time_taken = float(time_taken)
-        mbps = (bytes_downloaded * 8) / (time_taken * 1_000_000)
-    except Exception as e:
-        result = f"Erro no download: {e}"
-        console.print(Panel(result, title="Erro no Teste de Download", style="red"))
-        post_test_menu(result, "teste_download")
+        r = vazao.medir([url], fluxos=fluxos, duracao=duracao, ao_intervalo=ao_intervalo)
+    finally:
+        if local:
+            local.parar()
+    mbps = r["vazao_mbps"]
+    if not r["bytes_medidos"]:
+        resultado = registro.Resultado("teste_download", "Erro no Teste de Download", alvo=url, detalhes=r)
+        resultado.achar(registro.CRITICO, f"Erro no download: {', '.join(r['erros']) or 'nenhum dado recebido'}")
+        mostrar_resultado(resultado, "red")
         return
 
     if mbps > 50:
@@ -596,129 +850,300 @@ def test_download_speed():
     else:
         status = "🔴 Ruim"
 
-    result = f"""\
-[bold cyan]Resultado do Teste de Download[/bold cyan]
-
-Arquivo: {name}
-URL: {url}
+    conexoes = sum(f["conexoes"] for f in r["por_fluxo"])
+    resultado = registro.Resultado("teste_download", "Análise de Download", alvo=url, detalhes=r,
+                                   texto=f"Arquivo: {name}\nURL: {url}\n"
+                                         f"Conexões: {fluxos} em paralelo ({conexoes} abertas no total)")
+    resultado.medir("duracao", r["duracao_s"], "s", f"Tempo medido (após {r['aquecimento_s']:.0f} s de aquecimento)")
+    resultado.medir("bytes", r["bytes_medidos"], "B", "Bytes baixados")
+    resultado.medir("vazao", mbps, "Mbps", "Velocidade média", alerta=20, critico=5, maior_pior=False)
+    resultado.medir("pico", r["pico_mbps"] or 0.0, "Mbps", "Pico em 1 s")
+    if r["erros"]:
+        resultado.achar(registro.ALERTA, f"Falhas em algumas conexões: {', '.join(r['erros'])}")
+    resultado.classificacao = status
+    mostrar_resultado(resultado)
+
+
+class _TabelaWifi:
+    # Uma linha por BSSID, guardada já renderizada; cada varredura só refaz as linhas
+    # que aparecem em `mudancas` e a tabela é montada a partir delas na hora de desenhar
+    COLUNAS = (("SSID", {"style": "cyan", "no_wrap": True}),
+               ("BSSID", {"style": "magenta", "min_width": 17, "no_wrap": True}),
+               ("Sinal (%)", {"style": "green", "justify": "right"}),
+               ("Mín/Máx", {"style": "green", "justify": "right"}),
+               ("Canal", {"style": "yellow", "justify": "right"}),
+               ("Segurança", {"style": "red"}))
+
+    def __init__(self, lev, titulo):
+        self.lev = lev
+        self.titulo = titulo
+        self.linhas = {}
+
+    def _linha(self, h):
+        sinal = "[dim]sumiu[/dim]" if self.lev.sumido(h.bssid) else str(h.atual)
+        ssid = Text.from_markup(f"[bold]{escape(h.ssid)}[/bold] *") if h.em_uso else Text(h.ssid)
+        return (ssid, Text(h.bssid), Text.from_markup(sinal), Text(f"{h.minimo}/{h.maximo}"),
+                Text(str(h.canal or "-")), Text(h.seguranca))
+
+    def aplicar(self, mudancas):
+        for bssid in mudancas["novos"] + mudancas["alterados"] + mudancas["sumidos"]:
+            self.linhas[bssid] = self._linha(self.lev.historicos[bssid])
+        return any(mudancas.values())
+
+    def __rich__(self):
+        table = Table(title=self.titulo)
+        for nome, opcoes in self.COLUNAS:
+            table.add_column(nome, **opcoes)
+        for linha in self.linhas.values():
+            table.add_row(*linha)
+        return Group(table, Text.from_markup(_rodape_wifi(self.lev, self.lev.local)))
+
+
+def _rodape_wifi(lev, local):
+    recomendado = lev.recomendacao()
+    canais = " | ".join(f"{faixa} GHz: canal {canal}" for faixa, canal in sorted(recomendado.items()))
+    onde = f" | Cômodo: [cyan]{local}[/cyan]" if local else ""
+    return (f"Varreduras: {lev.varreduras}{onde} | Menos congestionado: {canais or '-'}\n"
+            "[yellow]Ctrl+C para parar / trocar de cômodo[/yellow]")
 
-Tempo total: {time_taken:.2f} s
-Bytes baixados: {bytes_downloaded} bytes
-Velocidade média: {mbps:.2f} Mbps
-
-Classificação da conexão: {status}
-"""
-    console.print(Panel(result.strip(), title="Análise de Download", style="cyan"))
-    post_test_menu(result.strip(), "teste_download")
 def wifi_site_survey():
     console.rule("[bold blue]Site Survey Wi-Fi - Redes Visíveis[/bold blue]")
 
-    if subprocess.run("which nmcli", shell=True, stdout=subprocess.DEVNULL).returncode != 0:
-        result = "Erro: 'nmcli' não encontrado. Instale o NetworkManager para usar esta função."
-        console.print(Panel(result, title="Erro Wi-Fi", style="red"))
-        post_test_menu(result, "wifi_survey")
+    redes, erro = wifi.varrer()
+    if erro:
+        mostrar_resultado(registro.Resultado("wifi_survey", "Erro Wi-Fi", texto=erro), "red")
         return
-
-    out, _ = run_command("nmcli -f SSID,BSSID,SIGNAL,SECURITY,CHAN device wifi list")
-    lines = out.splitlines()
-    if len(lines) < 2:
-        result = "Nenhuma rede Wi-Fi encontrada."
-        console.print(Panel(result, title="Site Survey", style="yellow"))
-        post_test_menu(result, "wifi_survey")
+    if not redes:
+        mostrar_resultado(registro.Resultado("wifi_survey", "Site Survey", texto="Nenhuma rede Wi-Fi encontrada."),
+                          "yellow")
         return
 
-    table = Table(title="Redes Wi-Fi detectadas")
-    table.add_column("SSID", style="cyan", no_wrap=True)
-    table.add_column("BSSID", style="magenta")
-    table.add_column("Sinal (%)", style="green")
-    table.add_column("Segurança", style="red")
-    table.add_column("Canal", style="yellow")
-
-    output_str = ""  # para log
-    for line in lines[1:]:
-        parts = line.strip().split(None, 4)
-        if len(parts) == 5:
-            ssid, bssid, signal, security, chan = parts
-        else:
-            ssid, bssid, signal, security, chan = (parts + [""] * (5 - len(parts)))
-        table.add_row(ssid, bssid, signal, security, chan)
-        output_str += f"{ssid} | {bssid} | {signal} | {security} | {chan}\n"
+    intervalo = FloatPrompt.ask("Intervalo entre varreduras (s)", default=5.0)
+    lev = wifi.Levantamento(db=armazem.abrir(os.path.join(LOG_DIR, armazem.ARQUIVO_PADRAO)))
+    lev.local = Prompt.ask("Cômodo/ponto atual para o mapa de calor (Enter para pular)", default="") or None
+    tela = _TabelaWifi(lev, "Redes Wi-Fi detectadas")
+    tela.aplicar(lev.registrar(redes))
 
-    console.print(table)
-    post_test_menu(output_str.strip(), "wifi_survey")
+    while True:
+        with Live(tela, console=console._obter(), auto_refresh=False) as live:
+            def ao_varrer(mudancas):
+                tela.aplicar(mudancas)
+                live.refresh()  # o rodapé (varreduras, canal recomendado) muda a cada varredura
+            try:
+                wifi.acompanhar(lev, intervalo, ao_varrer=ao_varrer, espera_inicial=intervalo)
+            except KeyboardInterrupt:
+                pass
+        proximo = Prompt.ask("\nPróximo cômodo (Enter para encerrar)", default="")
+        if not proximo:
+            break
+        lev.local = proximo
+
+    console.print(Panel(wifi.formatar_canais(lev), title="Congestionamento por canal", style="cyan"))
+    if lev.por_local:
+        console.print(Panel(wifi.formatar_mapa(lev), title="Mapa de calor (sinal médio por cômodo)", style="cyan"))
+    resumo = lev.resumo()
+    r = registro.Resultado("wifi_survey", "Site Survey", texto=wifi.formatar(lev),
+                           detalhes={"varreduras": resumo["varreduras"], "redes": resumo["redes"],
+                                     "canais": resumo["canais"], "recomendado": resumo["recomendado"],
+                                     "mapa_calor": resumo["mapa_calor"]})
+    r.medir("redes", len(resumo["redes"]), "", "Redes vistas")
+    r.medir("varreduras", resumo["varreduras"], "", "Varreduras")
+    post_test_menu(r)
 
 def netcat_test():
     console.rule("[bold blue]Teste de Conectividade com Netcat[/bold blue]")
 
-    if subprocess.run("which nc", shell=True, stdout=subprocess.DEVNULL).returncode != 0:
-        result = "Comando 'nc' (netcat) não encontrado. Instale com: sudo apt install netcat"
-        console.print(Panel(result, title="Netcat - Erro", style="red"))
-        post_test_menu(result, "netcat_teste")
+    if not comando_existe("nc"):
+        texto = "Comando 'nc' (netcat) não encontrado. Instale com: sudo apt install netcat"
+        mostrar_resultado(registro.Resultado("netcat", "Netcat - Erro", texto=texto), "red")
         return
 
     host = Prompt.ask("Digite o IP ou domínio de destino (ex: 8.8.8.8)")
     port = Prompt.ask("Digite a porta a ser testada (ex: 53)")
     proto = Prompt.ask("Tipo de conexão", choices=["tcp", "udp"], default="tcp")
 
-    cmd = f"nc -zv -w 3 {'-u' if proto == 'udp' else ''} {host} {port}"
-    result, _ = run_command(cmd)
+    cmd = ["nc", "-zv", "-w", "3"] + (["-u"] if proto == "udp" else []) + [host, port]
+    # nc escreve o resultado do -v na saída de erro
+    out, err, codigo = comandos.executar(cmd, timeout=10)
+    saida = "\n".join(p for p in (out, err) if p)
 
-    painel = f"Host: {host}\nPorta: {port} ({proto.upper()})\n\nResultado:\n{result}"
-    console.print(Panel(painel, title="Resultado - Netcat", style="cyan"))
-    post_test_menu(painel, "netcat_teste")
+    r = registro.Resultado("netcat", "Resultado - Netcat", alvo=f"{host}:{port}",
+                           texto=f"Host: {host}\nPorta: {port} ({proto.upper()})\n\nResultado:\n{saida}",
+                           detalhes={"host": host, "porta": port, "protocolo": proto, "codigo": codigo})
+    if codigo == 0:
+        r.classificacao = "✅ Porta acessível"
+    else:
+        r.achar(registro.ALERTA, "Sem conexão na porta")
+    mostrar_resultado(r)
 
 def whois_lookup():
     console.rule("[bold blue]Consulta WHOIS - IP ou Domínio[/bold blue]")
 
-    if subprocess.run("which whois", shell=True, stdout=subprocess.DEVNULL).returncode != 0:
-        result = "Comando 'whois' não encontrado. Instale com: sudo apt install whois"
-        console.print(Panel(result, title="Erro WHOIS", style="red"))
-        post_test_menu(result, "whois")
+    if not comando_existe("whois"):
+        texto = "Comando 'whois' não encontrado. Instale com: sudo apt install whois"
+        mostrar_resultado(registro.Resultado("whois", "Erro WHOIS", texto=texto), "red")
         return
 
-    alvo = Prompt.ask("Digite o IP ou domínio para consulta WHOIS (ex: 8.8.8.8 ou google.com)")
-    result, _ = run_command(f"whois {alvo}")
+    alvos = varredura.parse_hosts(Prompt.ask("IP(s) ou domínio(s) para consulta WHOIS (ex: 8.8.8.8, google.com)"))
+    if not alvos:
+        mostrar_resultado(registro.Resultado("whois", "Erro WHOIS", texto="Nenhum alvo informado."), "red")
+        return
+    # Cada consulta espera o servidor WHOIS; várias rodam ao mesmo tempo
+    saidas = comandos.executar_em_paralelo({alvo: ["whois", alvo] for alvo in alvos}, timeout=20)
+    for alvo in alvos:
+        saida, erro, _ = saidas[alvo]
+        mostrar_resultado(registro.Resultado("whois", f"Resultado WHOIS para {alvo}", alvo=alvo,
+                                             texto=saida or erro))
+
+def teste_banda_lan():
+    console.rule("[bold blue]Teste de Banda na LAN (servidor/cliente)[/bold blue]")
+    modo = Prompt.ask("Este computador será", choices=["cliente", "servidor"], default="cliente")
+    porta = IntPrompt.ask("Porta", default=banda.PORTA_PADRAO)
+
+    if modo == "servidor":
+        srv = banda.Servidor(porta=porta, ao_evento=lambda t: console.print(f"[cyan]{t}[/cyan]"))
+        console.print(Panel(estado_rede.obter().texto_enderecos(),
+                            title=f"Servidor escutando na porta {srv.porta} - Ctrl+C para parar", style="green"))
+        try:
+            srv.servir()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.parar()
+        return
 
-    console.print(Panel(result, title=f"Resultado WHOIS para {alvo}", style="cyan"))
-    post_test_menu(result, f"whois_{alvo.replace('.', '_')}")
+    servidor = Prompt.ask("Endereço do servidor")
+    protocolo = Prompt.ask("Protocolo", choices=["tcp", "udp"], default="tcp")
+    sentido = Prompt.ask("Sentido", choices=["upload", "download", "bidir"], default="bidir")
+    fluxos = IntPrompt.ask("Fluxos em paralelo", default=4) if protocolo == "tcp" else 1
+    taxa = FloatPrompt.ask("Taxa alvo UDP (Mbps)", default=100.0) if protocolo == "udp" else 0.0
+    duracao = FloatPrompt.ask("Duração (s)", default=10.0)
+    try:
+        with console.status(f"[cyan]Medindo {protocolo.upper()} {sentido} com {servidor}...[/cyan]"):
+            r = banda.testar(servidor, porta, protocolo, sentido, fluxos, duracao, taxa)
+    except (OSError, ValueError) as e:
+        resultado = registro.Resultado("banda_lan", "Erro no Teste de Banda", alvo=servidor)
+        resultado.achar(registro.CRITICO, f"Não foi possível testar com {servidor}:{porta}: {e}")
+        mostrar_resultado(resultado, "red")
+        return
+    resultado = registro.Resultado("banda_lan", "Teste de Banda na LAN", alvo=servidor,
+                                   texto=banda.formatar(r), detalhes=r)
+    resultado.medir("vazao", r["vazao_mbps"], "Mbps", "Pior sentido")
+    mostrar_resultado(resultado)
+
+def diagnostico_bufferbloat():
+    console.rule("[bold blue]Latência sob Carga (Bufferbloat)[/bold blue]")
+    modo = Prompt.ask("Carga contra", choices=["internet", "local", "url"], default="internet")
+    local = None
+    alvo = carga.ALVO_PADRAO
+    url_download, url_upload = carga.URL_DOWNLOAD, carga.URL_UPLOAD
+    if modo == "local":
+        local = vazao.ServidorLocal().iniciar()
+        url_download, url_upload, alvo = local.url, f"http://{local.host}:{local.porta}/", local.host
+    elif modo == "url":
+        url_download = input("URL para download (Enter pula): ").strip() or None
+        url_upload = input("URL que aceita POST para upload (Enter pula): ").strip() or None
+    alvo = Prompt.ask("Destino das sondas de latência", default=alvo)
+    fluxos = IntPrompt.ask("Conexões em paralelo por sentido", default=8)
+    duracao = FloatPrompt.ask("Duração de cada sentido (s)", default=10.0)
+
+    def ao_intervalo(fase, t, mbps, st):
+        rtt = st.esboco.quantil(0.5)
+        vazao_txt = f"  {mbps:9.2f} Mbps" if mbps is not None else ""
+        console.print(f"  {fase:<9} {t:5.1f} s  RTT {rtt or 0:7.1f} ms{vazao_txt}")
+
+    try:
+        r = carga.testar(url_download=url_download, url_upload=url_upload, alvo=alvo, fluxos=fluxos,
+                         duracao=duracao, ao_intervalo=ao_intervalo)
+    except ValueError as e:
+        resultado = registro.Resultado("bufferbloat", "Erro na Latência sob Carga", alvo=alvo)
+        resultado.achar(registro.CRITICO, str(e))
+        mostrar_resultado(resultado, "red")
+        return
+    finally:
+        if local:
+            local.parar()
+
+    fases = r["fases"]
+    resultado = registro.Resultado("bufferbloat", "Latência sob Carga", alvo=alvo,
+                                   texto=carga.formatar(r), detalhes=r)
+    resultado.medir("latencia", fases[carga.OCIOSO]["p50_ms"], "ms", "Latência ociosa (mediana)",
+                    alerta=80, critico=150)
+    for nome in (carga.DOWNLOAD, carga.UPLOAD):
+        if nome not in fases:
+            continue
+        f = fases[nome]
+        resultado.medir(f"acrescimo_{nome}", r["acrescimo_ms"][nome], "ms", f"Latência a mais no {nome}",
+                        alerta=30, critico=200, casas=1)
+        resultado.medir("vazao" if nome == carga.DOWNLOAD else "upload", f["vazao_mbps"], "Mbps",
+                        f"Vazão no {nome}")
+        resultado.medir(f"perda_{nome}", f["perda_pct"], "%", f"Perda de sondas no {nome}",
+                        alerta=1, critico=5, casas=1)
+        letra = r["notas"][nome]
+        if f["erros"]:
+            resultado.achar(registro.ALERTA, f"Falhas na carga de {nome}: {', '.join(f['erros'])}")
+        if letra in ("C", "D", "F"):
+            resultado.achar(registro.CRITICO, f"Bufferbloat no {nome} (nota {letra})",
+                            "Fila grande no roteador/modem: pacotes esperam atrás da transferência",
+                            "Ativar SQM (fq_codel/cake) limitando a banda a ~90% do contratado")
+        elif letra == "B":
+            resultado.achar(registro.ALERTA, f"Latência sobe sob carga no {nome} (nota B)")
+    if r["nota"] is None:
+        resultado.achar(registro.ALERTA, "Sem nota: as sondas não tiveram resposta ou a carga não saiu")
+    else:
+        perda = f", {r['pior_perda_pct']:.0f}% de perda" if r["pior_perda_pct"] else ""
+        resultado.classificacao = f"Nota {r['nota']} (+{r['pior_acrescimo_ms']:.0f} ms sob carga{perda})"
+    # A série amostra a amostra é longa demais para o registro
+    r.pop("serie")
+    mostrar_resultado(resultado)
 
 
 # ========== MENUS ==========
 
+OPCOES_BASICAS = {
+    "1": ("Interfaces Ativas", diagnostico_interfaces),
+    "2": ("IP e Rota", diagnostico_ip_rota),
+    "3": ("Ping Gateway", diagnostico_ping_gateway),
+    "4": ("Ping Customizado", diagnostico_ping_custom),
+    "5": ("Testes DNS", diagnostico_dns),
+    "6": ("Teste de Portas", diagnostico_portas),
+    "7": ("IP Público", diagnostico_ip_publico),
+    "8": ("Logs DHCP", diagnostico_dhcp),
+    "9": ("Latência e Jitter", diagnostico_latency_jitter),
+    "0": ("Voltar", None)
+}
+
+OPCOES_AVANCADAS = {
+    "1": ("SpeedTest CLI", diagnostico_speedtest),
+    "2": ("Rota por Interface", diagnostico_rota_interface),
+    "3": ("Captive Portal", diagnostico_captive),
+    "4": ("Bloqueio DNS (porta 53)", diagnostico_dns_bloqueado),
+    "5": ("MTU Máximo", diagnostico_mtu),
+    "6": ("Múltiplos Gateways", diagnostico_multiplos_gateways),
+    "7": ("Traceroute", diagnostico_traceroute),
+    "8": ("MTR", diagnostico_mtr),
+    "9": ("Descoberta de hosts", descoberta_hosts),
+    "10": ("Mudar IP local", set_static_ip),
+    "11": ("Teste de Download", test_download_speed),
+    "12": ("Site Survey", wifi_site_survey),
+    "13": ("Netcat", netcat_test),
+    "14": ("How Is?", whois_lookup),
+    "15": ("Banda na LAN (servidor/cliente)", teste_banda_lan),
+    "16": ("Tempo por fase HTTP", diagnostico_web),
+    "17": ("Latência sob carga (bufferbloat)", diagnostico_bufferbloat),
+    "0": ("Voltar", None)
+}
+
 def submenu_basico():
-    opcoes = {
-        "1": ("Interfaces Ativas", diagnostico_interfaces),
-        "2": ("IP e Rota", diagnostico_ip_rota),
-        "3": ("Ping Gateway", diagnostico_ping_gateway),
-        "4": ("Ping Customizado", diagnostico_ping_custom),
-        "5": ("Testes DNS", diagnostico_dns),
-        "6": ("Teste de Portas", diagnostico_portas),
-        "7": ("IP Público", diagnostico_ip_publico),
-        "8": ("Logs DHCP", diagnostico_dhcp),
-        "9": ("Latência e Jitter", diagnostico_latency_jitter),
-        "0": ("Voltar", None)
-    }
-    menu_sub("Funções Básicas", opcoes)
+    menu_sub("Funções Básicas", OPCOES_BASICAS)
 
 def submenu_avancado():
-    opcoes = {
-        "1": ("SpeedTest CLI", diagnostico_speedtest),
-        "2": ("Rota por Interface", diagnostico_rota_interface),
-        "3": ("Captive Portal", diagnostico_captive),
-        "4": ("Bloqueio DNS (porta 53)", diagnostico_dns_bloqueado),
-        "5": ("MTU Máximo", diagnostico_mtu),
-        "6": ("Múltiplos Gateways", diagnostico_multiplos_gateways),
-        "7": ("Traceroute", diagnostico_traceroute),
-        "8": ("MTR", diagnostico_mtr),
-        "9": ("Netdiscover", netdiscover_custom),
-        "10": ("Mudar IP local", set_static_ip),
-        "11": ("Teste de Download", test_download_speed),
-        "12": ("Site Survey", wifi_site_survey),
-        "13": ("Netcat", netcat_test),
-        "14": ("How Is?", whois_lookup),
-        "0": ("Voltar", None)
-    }
-    menu_sub("Funções Avançadas", opcoes)
+    menu_sub("Funções Avançadas", OPCOES_AVANCADAS)
+
+def executar_diagnostico(titulo, func):
+    # Todo diagnóstico escolhido no menu roda dentro de um trecho cronometrado
+    with instrumentos.Trecho(titulo, "diagnostico", funcao=func.__name__):
+        return func()
 
 def menu_sub(titulo, opcoes):
     while True:
@@ -733,58 +1158,50 @@ def menu_sub(titulo, opcoes):
         if escolha == "0":
             break
         elif escolha in opcoes:
-            func = opcoes[escolha][1]
+            titulo_opcao, func = opcoes[escolha]
             if func:
-                func()
+                executar_diagnostico(titulo_opcao, func)
         else:
             console.print("[red]Opção inválida.[/red]")
 
 
 def analise_prognostico():
     console.rule("[bold blue]Análise Inteligente de Diagnósticos[/bold blue]")
-    if not os.path.exists(LOG_DIR):
+    db = armazem.abrir(os.path.join(LOG_DIR, armazem.ARQUIVO_PADRAO))
+    prog = prognostico.Prognostico(db)
+    with console.status("[cyan]Processando resultados novos...[/cyan]"):
+        novos = prog.atualizar()
+    if not prog.tendencias:
         console.print("[red]Nenhum log encontrado para análise.[/red]")
         return
 
-    arquivos = sorted([f for f in os.listdir(LOG_DIR) if f.endswith(".json")], reverse=True)
-    if not arquivos:
-        console.print("[red]Nenhum log JSON disponível.[/red]")
-        return
-
-    table = Table(title="Selecione um log para análise")
-    table.add_column("Nº", style="cyan")
-    table.add_column("Arquivo", style="green")
-    for i, arq in enumerate(arquivos[:10]):
-        table.add_row(str(i+1), arq)
+    table = Table(title=f"Tendências por teste e alvo ({novos} resultados novos)")
+    table.add_column("Teste", style="cyan")
+    table.add_column("Alvo", style="green")
+    table.add_column("Amostras")
+    table.add_column("Latência EWMA (ms)")
+    table.add_column("Perda EWMA / média (%)")
+    table.add_column("Vazão p10/p50/p90 (Mbps)")
+    table.add_column("Última mudança", style="yellow")
+    fmt = lambda v: f"{v:.1f}" if v is not None else "-"
+    for t in sorted(prog.tendencias.values(), key=lambda t: (t.tipo, t.alvo)):
+        pct = t.vazao_percentis()
+        mudanca = "-"
+        if t.mudancas:
+            ts, sentido, antes, depois = t.mudancas[-1]
+            mudanca = f"{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M} {sentido} {antes:.0f}→{depois:.0f} ms"
+        table.add_row(t.tipo, t.alvo or "-", str(t.n), fmt(t.lat_ewma),
+                      f"{fmt(t.perda_ewma)} / {fmt(t.perda_media)}",
+                      "/".join(fmt(pct[p]) for p in (10, 50, 90)), mudanca)
     console.print(table)
 
-    escolha = Prompt.ask("Número do arquivo", choices=[str(i+1) for i in range(len(arquivos[:10]))])
-    escolhido = arquivos[int(escolha)-1]
-    with open(os.path.join(LOG_DIR, escolhido), encoding="utf-8") as f:
-        dados = json.load(f)
-
-    output = dados.get("output", "")
-    diagnostico = []
-
-    perda_match = re.search(r"(\\d+)% packet loss", output)
-    if perda_match and int(perda_match.group(1)) > 10:
-        diagnostico.append("🔴 Alta perda de pacotes")
-
-    latencia_match = re.search(r"Latência média: (\d+\.\d+)", output)
-    if latencia_match and float(latencia_match.group(1)) > 150:
-        diagnostico.append("🔴 Latência excessiva (>150ms)")
-
-    vel_match = re.search(r"Velocidade média: (\d+\.\d+)", output)
-    if vel_match and float(vel_match.group(1)) < 10:
-        diagnostico.append("🟠 Velocidade baixa (<10Mbps)")
-
-    if not diagnostico:
-        resumo = "✅ Nenhum problema crítico identificado."
-    else:
-        resumo = "\n".join(diagnostico)
-
-    console.print(Panel(resumo, title="Prognóstico da Rede", style="magenta"))
-    post_test_menu(resumo, "prognostico")
+    r = registro.Resultado("prognostico", "Prognóstico da Rede",
+                           detalhes={"tendencias": len(prog.tendencias), "novos": novos})
+    for classe, texto in prog.diagnosticar():
+        r.achar(classe, texto)
+    if not r.achados:
+        r.classificacao = "✅ Nenhum problema crítico identificado."
+    mostrar_resultado(r, "magenta")
 
 def menu():
     while True:
@@ -803,12 +1220,60 @@ def menu():
         elif escolha == "2":
             submenu_avancado()
         elif escolha == "3":
-            analise_prognostico()
+            executar_diagnostico("Análise de Prognóstico", analise_prognostico)
         elif escolha == "0":
             console.print("[bold red]Saindo...[/bold red]")
             break
         else:
             console.print("[red]Opção inválida.[/red]")
 
-if __name__ == "__main__":
+def _diagnosticos_menu():
+    # {nome da função: (título, função)} de tudo que o menu oferece
+    itens = list(OPCOES_BASICAS.values()) + list(OPCOES_AVANCADAS.values())
+    itens.append(("Análise de Prognóstico", analise_prognostico))
+    return {func.__name__: (titulo, func) for titulo, func in itens if func}
+
+def perfilar_diagnostico(nome):
+    # --profile: roda um único diagnóstico sob cProfile e grava o .pstats em LOG_DIR
+    diagnosticos = _diagnosticos_menu()
+    if nome not in diagnosticos:
+        print("Diagnósticos disponíveis para --profile:")
+        for chave, (titulo, _) in sorted(diagnosticos.items()):
+            print(f"  {chave:<32} {titulo}")
+        return 2
+    titulo, func = diagnosticos[nome]
+    os.makedirs(LOG_DIR, exist_ok=True)
+    arquivo = os.path.join(LOG_DIR, f"perfil_{nome}_{datetime.now():%Y-%m-%d_%H-%M-%S}.pstats")
+    _, relatorio = instrumentos.perfilar(executar_diagnostico, titulo, func, arquivo=arquivo)
+    console.print(relatorio, markup=False, highlight=False, soft_wrap=True)
+    console.print(f"[green]Perfil completo salvo em {arquivo}[/green] (abrir com python -m pstats)")
+    return 0
+
+def main(argv=None):
+    # --trace-sessao (em qualquer modo) exporta trechos e contadores da sessão ao sair;
+    # nome próprio para não colidir com o --trace PASTA do checkup
+    argv = sys.argv[1:] if argv is None else argv
+    trace = "--trace-sessao" in argv
+    argv = [a for a in argv if a != "--trace-sessao"]
+    try:
+        return _main(argv)
+    finally:
+        if trace:
+            print(instrumentos.resumo(), file=sys.stderr)
+            for caminho in instrumentos.exportar(os.path.join(LOG_DIR, "traces")).values():
+                print(f"Trace: {caminho}", file=sys.stderr)
+
+def _main(argv):
+    # Modos sem interface primeiro: só carregam o módulo que vão usar
+    modos = {"--checkup": "checkup", "--monitor": "monitor", "--banda": "banda",
+             "--descoberta": "descoberta", "--wifi": "wifi", "--frota": "frota",
+             "--carga": "carga"}
+    if argv and argv[0] in modos:
+        return importlib.import_module(modos[argv[0]]).main(argv[1:])
+    if argv and argv[0] == "--profile":
+        return perfilar_diagnostico(argv[1] if len(argv) > 1 else None)
     menu()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
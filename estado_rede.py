@@ -0,0 +1,390 @@
+# Retrato do estado da rede (interfaces, endereços, rotas, gateways) sem subprocess
+# Lê direto do rtnetlink; se o netlink não estiver disponível, usa /sys/class/net e /proc/net.
+# O retrato fica em cache na sessão e é refeito sob demanda ou quando o netlink
+# avisa que algo mudou (link, endereço ou rota).
+#
+# Benchmark contra a cadeia antiga de `ip ... | awk`: python estado_rede.py --benchmark
+
+import ipaddress
+import os
+import socket
+import struct
+import sys
+import time
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_OPERSTATE = 16
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_TABLE = 15
+RT_TABLE_MAIN = 254
+RTN_UNICAST = 1
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+RTMGRP_IPV6_ROUTE = 0x400
+
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+OPERSTATE = {0: "UNKNOWN", 1: "NOTPRESENT", 2: "DOWN", 3: "LOWERLAYERDOWN",
+             4: "TESTING", 5: "DORMANT", 6: "UP"}
+PROTO_ROTA = {2: "kernel", 3: "boot", 4: "static", 16: "dhcp", 18: "dhcp", 9: "ra"}
+
+# Prefixos de interfaces virtuais que a tela de "Interfaces Ativas" esconde
+VIRTUAIS = ("lo", "vir", "docker", "tun", "br-", "veth")
+
+
+class EstadoRede:
+    def __init__(self, interfaces, rotas, origem):
+        self.interfaces = interfaces  # nome -> {indice, mac, mtu, estado, flags, enderecos}
+        self.rotas = rotas            # [{familia, destino, gateway, interface, metrica, ...}]
+        self.origem = origem          # "netlink" ou "procfs"
+        self.timestamp = time.time()
+
+    def nomes(self, fisicas=False):
+        nomes = sorted(self.interfaces, key=lambda n: self.interfaces[n]["indice"])
+        if fisicas:
+            nomes = [n for n in nomes if not any(v in n for v in VIRTUAIS)]
+        return nomes
+
+    def gateways_padrao(self, familia=socket.AF_INET):
+        padrao = [r for r in self.rotas if r["familia"] == familia and r["prefixo"] == 0 and r["gateway"]]
+        return sorted(padrao, key=lambda r: r["metrica"])
+
+    def gateway(self):
+        gws = self.gateways_padrao()
+        return gws[0]["gateway"] if gws else None
+
+    def rota_para(self, endereco):
+        ip = ipaddress.ip_address(endereco)
+        familia = socket.AF_INET if ip.version == 4 else socket.AF_INET6
+        melhor = None
+        for r in self.rotas:
+            if r["familia"] != familia or ip not in ipaddress.ip_network(f"{r['destino']}/{r['prefixo']}", strict=False):
+                continue
+            if melhor is None or (r["prefixo"], -r["metrica"]) > (melhor["prefixo"], -melhor["metrica"]):
+                melhor = r
+        return melhor
+
+    def interface_para(self, endereco):
+        if endereco.startswith("127.") or endereco == "::1":
+            return "lo"
+        rota = self.rota_para(endereco)
+        return rota["interface"] if rota else None
+
+    def como_dict(self):
+        return {"origem": self.origem, "timestamp": self.timestamp,
+                "interfaces": self.interfaces,
+                "rotas": [dict(r, familia=4 if r["familia"] == socket.AF_INET else 6) for r in self.rotas]}
+
+    # Saída no estilo `ip a` / `ip r`, para as telas e logs
+    def texto_enderecos(self):
+        linhas = []
+        for nome in self.nomes():
+            i = self.interfaces[nome]
+            linhas.append(f"{i['indice']}: {nome}: state {i['estado']} mtu {i['mtu']}")
+            if i["mac"]:
+                linhas.append(f"    link/ether {i['mac']}")
+            for end in i["enderecos"]:
+                linhas.append(f"    {'inet6' if ':' in end else 'inet'} {end}")
+        return "\n".join(linhas)
+
+    def texto_rotas(self):
+        linhas = []
+        for r in self.rotas:
+            destino = "default" if r["prefixo"] == 0 else f"{r['destino']}/{r['prefixo']}"
+            partes = [destino]
+            if r["gateway"]:
+                partes.append(f"via {r['gateway']}")
+            if r["interface"]:
+                partes.append(f"dev {r['interface']}")
+            if r["protocolo"]:
+                partes.append(f"proto {r['protocolo']}")
+            if r["origem"]:
+                partes.append(f"src {r['origem']}")
+            if r["metrica"]:
+                partes.append(f"metric {r['metrica']}")
+            linhas.append(" ".join(partes))
+        return "\n".join(linhas)
+
+
+# ---------- rtnetlink ----------
+
+def _atributos(dados, inicio):
+    attrs = {}
+    pos = inicio
+    while pos + 4 <= len(dados):
+        tam, tipo = struct.unpack_from("=HH", dados, pos)
+        if tam < 4:
+            break
+        attrs[tipo & 0x3FFF] = dados[pos + 4:pos + tam]
+        pos += (tam + 3) & ~3
+    return attrs
+
+
+def _dump(sock, tipo, corpo, seq):
+    cabecalho = struct.pack("=LHHLL", 16 + len(corpo), tipo, NLM_F_REQUEST | NLM_F_DUMP, seq, 0)
+    sock.send(cabecalho + corpo)
+    mensagens = []
+    while True:
+        dados = sock.recv(65536)
+        pos = 0
+        while pos + 16 <= len(dados):
+            tam, tipo_msg, _, _, _ = struct.unpack_from("=LHHLL", dados, pos)
+            if tipo_msg == NLMSG_DONE:
+                return mensagens
+            if tipo_msg == NLMSG_ERROR:
+                erro = -struct.unpack_from("=i", dados, pos + 16)[0]
+                if erro:
+                    raise OSError(erro, os.strerror(erro))
+                return mensagens
+            mensagens.append((tipo_msg, dados[pos + 16:pos + tam]))
+            pos += (tam + 3) & ~3
+
+
+def _ip(familia, bruto):
+    return socket.inet_ntop(familia, bruto)
+
+
+def _capturar_netlink():
+    interfaces = {}
+    por_indice = {}
+    rotas = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as s:
+        s.bind((0, 0))
+        for tipo, msg in _dump(s, RTM_GETLINK, struct.pack("=BxHiII", socket.AF_UNSPEC, 0, 0, 0, 0), 1):
+            if tipo != RTM_NEWLINK:
+                continue
+            _, _, indice, flags, _ = struct.unpack_from("=BxHiII", msg)
+            a = _atributos(msg, 16)
+            nome = a.get(IFLA_IFNAME, b"").rstrip(b"\0").decode()
+            mac = a.get(IFLA_ADDRESS, b"")
+            interfaces[nome] = {
+                "indice": indice,
+                "mac": ":".join(f"{b:02x}" for b in mac) if len(mac) == 6 and any(mac) else None,
+                "mtu": struct.unpack("=I", a[IFLA_MTU])[0] if IFLA_MTU in a else None,
+                "estado": OPERSTATE.get(a.get(IFLA_OPERSTATE, b"\0")[0], "UNKNOWN"),
+                "ativa": bool(flags & IFF_UP),
+                "loopback": bool(flags & IFF_LOOPBACK),
+                "enderecos": [],
+            }
+            por_indice[indice] = nome
+
+        for tipo, msg in _dump(s, RTM_GETADDR, struct.pack("=BBBBI", socket.AF_UNSPEC, 0, 0, 0, 0), 2):
+            if tipo != RTM_NEWADDR:
+                continue
+            familia, prefixo, _, _, indice = struct.unpack_from("=BBBBI", msg)
+            a = _atributos(msg, 8)
+            bruto = a.get(IFA_LOCAL) or a.get(IFA_ADDRESS)
+            if bruto and indice in por_indice:
+                interfaces[por_indice[indice]]["enderecos"].append(f"{_ip(familia, bruto)}/{prefixo}")
+
+        corpo = struct.pack("=BBBBBBBBI", socket.AF_UNSPEC, 0, 0, 0, 0, 0, 0, 0, 0)
+        for tipo, msg in _dump(s, RTM_GETROUTE, corpo, 3):
+            if tipo != RTM_NEWROUTE:
+                continue
+            familia, prefixo, _, _, tabela, proto, _, tipo_rota, _ = struct.unpack_from("=BBBBBBBBI", msg)
+            a = _atributos(msg, 12)
+            tabela = struct.unpack("=I", a[RTA_TABLE])[0] if RTA_TABLE in a else tabela
+            if tabela != RT_TABLE_MAIN or tipo_rota != RTN_UNICAST:
+                continue
+            zero = "0.0.0.0" if familia == socket.AF_INET else "::"
+            oif = struct.unpack("=I", a[RTA_OIF])[0] if RTA_OIF in a else None
+            rotas.append({
+                "familia": familia,
+                "destino": _ip(familia, a[RTA_DST]) if RTA_DST in a else zero,
+                "prefixo": prefixo,
+                "gateway": _ip(familia, a[RTA_GATEWAY]) if RTA_GATEWAY in a else None,
+                "interface": por_indice.get(oif),
+                "metrica": struct.unpack("=I", a[RTA_PRIORITY])[0] if RTA_PRIORITY in a else 0,
+                "origem": _ip(familia, a[RTA_PREFSRC]) if RTA_PREFSRC in a else None,
+                "protocolo": PROTO_ROTA.get(proto),
+            })
+    return EstadoRede(interfaces, rotas, "netlink")
+
+
+# ---------- fallback /sys + /proc ----------
+
+def _ler(caminho, padrao=None):
+    try:
+        with open(caminho) as f:
+            return f.read().strip()
+    except OSError:
+        return padrao
+
+
+def _enderecos_ipv4(nome):
+    import fcntl
+    SIOCGIFADDR, SIOCGIFNETMASK = 0x8915, 0x891B
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        req = struct.pack("256s", nome.encode()[:15])
+        try:
+            ip = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+            mascara = socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFNETMASK, req)[20:24])
+        except OSError:
+            return []
+    return [f"{ip}/{ipaddress.IPv4Network(f'0.0.0.0/{mascara}').prefixlen}"]
+
+
+def _capturar_procfs():
+    interfaces = {}
+    for nome in sorted(os.listdir("/sys/class/net")):
+        base = f"/sys/class/net/{nome}"
+        flags = int(_ler(f"{base}/flags", "0"), 16)
+        mac = _ler(f"{base}/address")
+        interfaces[nome] = {
+            "indice": int(_ler(f"{base}/ifindex", "0")),
+            "mac": mac if mac and mac != "00:00:00:00:00:00" else None,
+            "mtu": int(_ler(f"{base}/mtu", "0")) or None,
+            "estado": (_ler(f"{base}/operstate", "unknown") or "unknown").upper(),
+            "ativa": bool(flags & IFF_UP),
+            "loopback": bool(flags & IFF_LOOPBACK),
+            "enderecos": _enderecos_ipv4(nome),
+        }
+    for linha in (_ler("/proc/net/if_inet6", "") or "").splitlines():
+        campos = linha.split()
+        if len(campos) == 6 and campos[5] in interfaces:
+            ip = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(campos[0]))
+            interfaces[campos[5]]["enderecos"].append(f"{ip}/{int(campos[2], 16)}")
+
+    rotas = []
+    for linha in (_ler("/proc/net/route", "") or "").splitlines()[1:]:
+        c = linha.split()
+        mascara = int(c[7], 16)
+        gateway = int(c[2], 16)
+        rotas.append({
+            "familia": socket.AF_INET,
+            "destino": socket.inet_ntoa(struct.pack("<I", int(c[1], 16))),
+            "prefixo": bin(mascara).count("1"),
+            "gateway": socket.inet_ntoa(struct.pack("<I", gateway)) if gateway else None,
+            "interface": c[0],
+            "metrica": int(c[6]),
+            "origem": None,
+            "protocolo": None,
+        })
+    proprios = {e.split("/")[0] for i in interfaces.values() for e in i["enderecos"]}
+    for linha in (_ler("/proc/net/ipv6_route", "") or "").splitlines():
+        c = linha.split()
+        if len(c) < 10 or c[9] == "lo":
+            continue
+        destino = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(c[0]))
+        # O arquivo mistura a tabela local (endereços próprios, multicast) com a main
+        if destino in proprios or ipaddress.IPv6Address(destino).is_multicast:
+            continue
+        gateway = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(c[4]))
+        rotas.append({
+            "familia": socket.AF_INET6,
+            "destino": destino,
+            "prefixo": int(c[1], 16),
+            "gateway": None if gateway == "::" else gateway,
+            "interface": c[9],
+            "metrica": int(c[5], 16),
+            "origem": None,
+            "protocolo": None,
+        })
+    return EstadoRede(interfaces, rotas, "procfs")
+
+
+def capturar():
+    try:
+        return _capturar_netlink()
+    except (OSError, AttributeError, KeyError, struct.error):
+        return _capturar_procfs()
+
+
+# ---------- cache da sessão ----------
+
+_estado = None
+_monitor = None
+
+
+def _abrir_monitor():
+    global _monitor
+    try:
+        _monitor = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        _monitor.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE |
+                       RTMGRP_IPV6_IFADDR | RTMGRP_IPV6_ROUTE))
+        _monitor.setblocking(False)
+    except (OSError, AttributeError):
+        _monitor = False
+
+
+def _houve_mudanca():
+    # Esvazia as notificações pendentes do netlink; qualquer uma invalida o cache
+    if not _monitor:
+        return False
+    mudou = False
+    while True:
+        try:
+            mudou = bool(_monitor.recv(65536)) or mudou
+        except BlockingIOError:
+            return mudou
+        except OSError:
+            return True  # ENOBUFS: perdemos eventos, melhor recapturar
+
+
+def obter(forcar=False):
+    global _estado
+    if _monitor is None:
+        _abrir_monitor()
+    if _houve_mudanca() or forcar or _estado is None:
+        _estado = capturar()
+    return _estado
+
+
+def invalidar():
+    global _estado
+    _estado = None
+
+
+def benchmark(repeticoes=20):
+    import subprocess
+    cadeia = ["ip -o link show | awk -F': ' '{print $2}'", "ip a", "ip r"]
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for cmd in cadeia:
+            subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    t_sub = (time.perf_counter() - inicio) / repeticoes
+
+    tempos = {}
+    for nome, func in (("netlink", _capturar_netlink), ("procfs", _capturar_procfs)):
+        try:
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                func()
+            tempos[nome] = (time.perf_counter() - inicio) / repeticoes
+        except OSError:
+            tempos[nome] = None
+    return {"subprocess_ms": t_sub * 1000,
+            **{f"{k}_ms": (v * 1000 if v is not None else None) for k, v in tempos.items()}}
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        for chave, valor in benchmark().items():
+            print(f"{chave:>15}: {valor:.3f}" if valor is not None else f"{chave:>15}: indisponível")
+    else:
+        est = obter()
+        print(est.texto_enderecos())
+        print()
+        print(est.texto_rotas())
@@ -0,0 +1,275 @@
+# Estatísticas de latência compartilhadas por todos os diagnósticos
+# Amostras ficam em arrays de double (NaN = perda); percentis, jitter da RFC 3550,
+# R-factor/MOS (modelo E simplificado) e rajadas de perda saem de uma passada só.
+# Esboco é um histograma logarítmico mesclável: memória constante em sessões longas.
+
+import array
+import math
+
+NAN = math.nan
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return _percentil_ordenado(ordenados, p)
+
+
+def _percentil_ordenado(ordenados, p):
+    pos = (len(ordenados) - 1) * p / 100
+    baixo = int(pos)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (pos - baixo)
+
+
+def percentis(valores, ps=(50, 90, 99)):
+    # Uma ordenação para todos os percentis
+    if not valores:
+        return {p: None for p in ps}
+    ordenados = sorted(valores)
+    return {p: _percentil_ordenado(ordenados, p) for p in ps}
+
+
+def jitter_rfc3550(rtts):
+    # Jitter entre chegadas (RFC 3550, seção 6.4.1) sobre os RTTs na ordem de chegada
+    j = 0.0
+    anterior = None
+    for rtt in rtts:
+        if anterior is not None:
+            j += (abs(rtt - anterior) - j) / 16
+        anterior = rtt
+    return j
+
+
+def r_fator(latencia_ms, jitter_ms=0.0, perda_pct=0.0):
+    # Modelo E simplificado (ITU-T G.107, aproximação de Cole & Rosenbluth)
+    efetiva = latencia_ms + 2 * jitter_ms + 10.0
+    if efetiva < 160:
+        r = 93.2 - efetiva / 40
+    else:
+        r = 93.2 - (efetiva - 120) / 10
+    return max(0.0, min(100.0, r - 2.5 * perda_pct))
+
+
+def mos(r):
+    if r <= 0:
+        return 1.0
+    if r >= 100:
+        return 4.5
+    return 1 + 0.035 * r + 7e-6 * r * (r - 60) * (100 - r)
+
+
+def rajadas_perda(perdas):
+    # perdas: sequência de bool (True = perdido); devolve {rajadas, maior, media}
+    r = Rajadas()
+    for perdido in perdas:
+        r.registrar(perdido)
+    return r.resumo()
+
+
+class Jitter:
+    # Versão incremental de jitter_rfc3550
+    __slots__ = ("valor", "anterior")
+
+    def __init__(self):
+        self.valor = 0.0
+        self.anterior = None
+
+    def adicionar(self, rtt):
+        if self.anterior is not None:
+            self.valor += (abs(rtt - self.anterior) - self.valor) / 16
+        self.anterior = rtt
+        return self.valor
+
+
+class Rajadas:
+    # Sequências de perdas consecutivas, contadas sem guardar a série
+    __slots__ = ("rajadas", "maior", "perdidos", "atual")
+
+    def __init__(self):
+        self.rajadas = 0
+        self.maior = 0
+        self.perdidos = 0
+        self.atual = 0
+
+    def registrar(self, perdido):
+        if perdido:
+            if self.atual == 0:
+                self.rajadas += 1
+            self.atual += 1
+            self.perdidos += 1
+            self.maior = max(self.maior, self.atual)
+        else:
+            self.atual = 0
+
+    def resumo(self):
+        return {"rajadas": self.rajadas, "maior": self.maior,
+                "media": self.perdidos / self.rajadas if self.rajadas else 0.0}
+
+
+class Amostras:
+    # RTTs em array de double, na ordem de chegada; None/NaN = perda.
+    # Com `limite`, vira anel de tamanho fixo (mantém só as mais recentes).
+    def __init__(self, limite=None):
+        self.limite = limite
+        self.valores = array.array("d", bytes(8 * limite)) if limite else array.array("d")
+        self.ts = array.array("d", bytes(8 * limite)) if limite else array.array("d")
+        self.pos = 0
+        self.total = 0
+
+    def adicionar(self, rtt, ts=0.0):
+        valor = NAN if rtt is None else rtt
+        if self.limite:
+            self.valores[self.pos] = valor
+            self.ts[self.pos] = ts
+            self.pos = (self.pos + 1) % self.limite
+        else:
+            self.valores.append(valor)
+            self.ts.append(ts)
+        self.total += 1
+
+    def __len__(self):
+        return min(self.total, self.limite) if self.limite else self.total
+
+    def _ordem(self):
+        n = len(self)
+        if not self.limite or self.total <= self.limite:
+            return range(n)
+        return [(self.pos + i) % self.limite for i in range(n)]
+
+    def serie(self, desde=None):
+        # Valores da mais antiga para a mais nova (com ts >= desde, se informado)
+        v, ts = self.valores, self.ts
+        if desde is None:
+            return [v[i] for i in self._ordem()]
+        return [v[i] for i in self._ordem() if ts[i] >= desde]
+
+    def resumo(self, desde=None):
+        return resumir(self.serie(desde))
+
+
+def resumir(serie):
+    # serie: RTTs na ordem de chegada com NaN (ou None) nas perdas
+    serie = [NAN if v is None else v for v in serie]
+    rtts = [v for v in serie if v == v]  # NaN != NaN
+    n = len(serie)
+    perda = 100.0 * (n - len(rtts)) / n if n else 0.0
+    pct = percentis(rtts)
+    media = math.fsum(rtts) / len(rtts) if rtts else None
+    jitter = jitter_rfc3550(rtts)
+    r = r_fator(media, jitter, perda) if media is not None else 0.0
+    return {
+        "amostras": n, "perdidos": n - len(rtts), "perda_pct": perda,
+        "rtt_min_ms": min(rtts) if rtts else None, "rtt_media_ms": media,
+        "rtt_max_ms": max(rtts) if rtts else None,
+        "p50_ms": pct[50], "p90_ms": pct[90], "p99_ms": pct[99],
+        "jitter_ms": jitter, "r_fator": r, "mos": mos(r) if rtts else None,
+        "rajadas_perda": rajadas_perda(v != v for v in serie),
+    }
+
+
+class Esboco:
+    # Histograma com baldes logarítmicos (estilo DDSketch): erro relativo <= precisao
+    # em qualquer quantil, número de baldes limitado pela faixa de valores, e dois
+    # esboços se mesclam somando os baldes.
+    MINIMO = 0.001  # ms; abaixo disso vai para o balde zero
+
+    def __init__(self, precisao=0.01):
+        self.precisao = precisao
+        self.gama = (1 + precisao) / (1 - precisao)
+        self._log_gama = math.log(self.gama)
+        self.baldes = {}
+        self.zeros = 0
+        self.n = 0
+        self.soma = 0.0
+        self.minimo = None
+        self.maximo = None
+
+    def adicionar(self, valor, vezes=1):
+        self.n += vezes
+        self.soma += valor * vezes
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        if valor < self.MINIMO:
+            self.zeros += vezes
+            return
+        k = math.ceil(math.log(valor) / self._log_gama)
+        self.baldes[k] = self.baldes.get(k, 0) + vezes
+
+    def adicionar_varios(self, valores):
+        for v in valores:
+            if v == v:
+                self.adicionar(v)
+
+    def mesclar(self, outro):
+        if outro.precisao != self.precisao:
+            raise ValueError("Esboços com precisões diferentes")
+        for k, c in outro.baldes.items():
+            self.baldes[k] = self.baldes.get(k, 0) + c
+        self.zeros += outro.zeros
+        self.n += outro.n
+        self.soma += outro.soma
+        for v in (outro.minimo, outro.maximo):
+            if v is not None:
+                self.minimo = v if self.minimo is None else min(self.minimo, v)
+                self.maximo = v if self.maximo is None else max(self.maximo, v)
+        return self
+
+    def quantil(self, q):
+        # q em [0, 1]
+        return self.quantis((q,))[0]
+
+    def quantis(self, qs):
+        # Mesma definição de percentil(): interpolação linear entre as duas posições
+        # vizinhas, cada uma lida do balde que a contém. Uma passada pelos baldes.
+        if not self.n:
+            return [None] * len(qs)
+        posicoes = [q * (self.n - 1) for q in qs]
+        vizinhas = {int(p) for p in posicoes} | {min(int(p) + 1, self.n - 1) for p in posicoes}
+        valores = self._valores(sorted(vizinhas))
+        resultado = []
+        for pos in posicoes:
+            baixo = int(pos)
+            alto = min(baixo + 1, self.n - 1)
+            resultado.append(valores[baixo] + (valores[alto] - valores[baixo]) * (pos - baixo))
+        return resultado
+
+    def _valores(self, posicoes):
+        # posições (0..n-1, crescentes) -> valor representativo do balde de cada uma
+        valores = {}
+        baldes = iter(sorted(self.baldes.items()))
+        acumulado = self.zeros
+        valor = 0.0
+        for pos in posicoes:
+            while acumulado <= pos:
+                k, c = next(baldes, (None, 0))
+                if k is None:
+                    valor = self.maximo
+                    break
+                acumulado += c
+                valor = min(max(2 * self.gama ** k / (self.gama + 1), self.minimo), self.maximo)
+            valores[pos] = valor
+        return valores
+
+    @property
+    def media(self):
+        return self.soma / self.n if self.n else None
+
+    def resumo(self):
+        p50, p90, p99 = self.quantis((0.5, 0.9, 0.99))
+        return {"amostras": self.n, "rtt_min_ms": self.minimo, "rtt_media_ms": self.media,
+                "rtt_max_ms": self.maximo, "p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+
+    def como_dict(self):
+        return {"precisao": self.precisao, "baldes": {str(k): c for k, c in self.baldes.items()},
+                "zeros": self.zeros, "n": self.n, "soma": self.soma,
+                "minimo": self.minimo, "maximo": self.maximo}
+
+    @classmethod
+    def de_dict(cls, d):
+        e = cls(d["precisao"])
+        e.baldes = {int(k): c for k, c in d["baldes"].items()}
+        for chave in ("zeros", "n", "soma", "minimo", "maximo"):
+            setattr(e, chave, d[chave])
+        return e
@@ -0,0 +1,175 @@
+# Saída ao vivo de comandos longos (ping, mtr) em streaming, com memória constante
+# Cada linha passa pelo interpretador do comando e vira um evento (resposta, perda,
+# salto, resumo ou linha comum) que atualiza os agregados na hora; a linha vai direto
+# para o arquivo de saída no disco e só a cauda (últimas N linhas) fica na memória.
+# A tela é avisada no máximo a cada `intervalo` segundos: um `ping -c 3600` de uma
+# hora usa a mesma memória e quase a mesma CPU que um de 10 pacotes.
+
+import collections
+import os
+import re
+import time
+
+import sonda
+
+RESPOSTA, PERDA, SALTO, RESUMO, LINHA = "resposta", "perda", "salto", "resumo", "linha"
+
+CAUDA = 50             # linhas guardadas para o registro (o resto fica só no arquivo)
+CAUDA_TELA = 12        # linhas mostradas enquanto o comando roda
+INTERVALO_TELA = 0.25  # no máximo 4 redesenhos por segundo
+
+
+class Evento:
+    __slots__ = ("tipo", "linha", "dados")
+
+    def __init__(self, tipo, linha, dados=None):
+        self.tipo = tipo
+        self.linha = linha
+        self.dados = dados
+
+
+class InterpretadorPing:
+    # ping do sistema (iputils/busybox). Perdas vêm dos buracos na sequência (ou do
+    # "no answer yet" do -O); o resumo final corrige as perdas do fim da série.
+    RE_RESPOSTA = re.compile(r"(?:icmp_)?seq=(\d+)(?: ttl=(\d+))?.*?time[=<]([\d.]+) ?ms")
+    RE_SEM_RESPOSTA = re.compile(r"(?:no answer yet for icmp_seq=|Request timeout for icmp_seq )(\d+)")
+    RE_ENVIADOS = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+    RE_RTT = re.compile(r"= ([\d.]+)/([\d.]+)/([\d.]+)(?:/([\d.]+))? ms")
+
+    def __init__(self, alvo=""):
+        self.stats = sonda.EstatisticasRTT(alvo)
+        self.stats.metodo = "ping do sistema"
+        self._proximo = None
+
+    def _ate(self, seq):
+        # Sequências puladas antes de `seq` foram perdidas
+        st = self.stats
+        if self._proximo is None:
+            self._proximo = seq
+        while self._proximo < seq:
+            st.registrar_envio(self._proximo)
+            st.registrar_perda(self._proximo)
+            self._proximo += 1
+
+    def interpretar(self, linha):
+        st = self.stats
+        achado = self.RE_RESPOSTA.search(linha)
+        if achado and "(DUP!)" not in linha:
+            seq, rtt = int(achado.group(1)), float(achado.group(3))
+            if self._proximo is not None and seq < self._proximo:
+                st.perdidos = max(0, st.perdidos - 1)  # resposta atrasada de um "perdido"
+            else:
+                self._ate(seq)
+                st.registrar_envio(seq)
+                self._proximo = seq + 1
+            st.registrar_resposta(seq, rtt)
+            ttl = achado.group(2)
+            return Evento(RESPOSTA, linha, {"seq": seq, "rtt_ms": rtt, "ttl": int(ttl) if ttl else None})
+        if achado:
+            st.duplicados += 1
+            return Evento(LINHA, linha)
+        achado = self.RE_SEM_RESPOSTA.search(linha)
+        if achado:
+            seq = int(achado.group(1))
+            self._ate(seq + 1)
+            return Evento(PERDA, linha, {"seq": seq})
+        achado = self.RE_ENVIADOS.search(linha)
+        if achado:
+            enviados, recebidos = int(achado.group(1)), int(achado.group(2))
+            # Perdas no fim da série não deixam buraco: só o resumo as revela
+            for _ in range(max(0, enviados - st.recebidos - st.perdidos)):
+                st.registrar_perda(None)
+            st.enviados = max(st.enviados, enviados)
+            return Evento(RESUMO, linha, {"enviados": enviados, "recebidos": recebidos})
+        achado = self.RE_RTT.search(linha)
+        if achado and "min/avg/max" in linha:
+            desvio = achado.group(4)
+            return Evento(RESUMO, linha, {"min_ms": float(achado.group(1)), "media_ms": float(achado.group(2)),
+                                          "max_ms": float(achado.group(3)),
+                                          "desvio_ms": float(desvio) if desvio else None})
+        return Evento(LINHA, linha)
+
+
+class InterpretadorMtr:
+    # mtr --report: "  3.|-- 10.3.0.1   0.0%   10   5.1   5.4   4.5   7.2   0.9"
+    RE_SALTO = re.compile(r"^\s*(\d+)\.\|?[-`]+\s+(\S+)\s+([\d.]+)%\s+(\d+)\s+([\d.]+)\s+([\d.]+)"
+                          r"\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)")
+
+    def __init__(self, alvo=""):
+        self.alvo = alvo
+        self.saltos = {}  # ttl -> último relatório do salto (no máximo uns 30)
+
+    def interpretar(self, linha):
+        achado = self.RE_SALTO.match(linha)
+        if not achado:
+            return Evento(LINHA, linha)
+        g = achado.groups()
+        salto = {"ttl": int(g[0]), "host": g[1], "perda_pct": float(g[2]), "enviados": int(g[3]),
+                 "ultimo_ms": float(g[4]), "media_ms": float(g[5]), "melhor_ms": float(g[6]),
+                 "pior_ms": float(g[7]), "desvio_ms": float(g[8])}
+        self.saltos[salto["ttl"]] = salto
+        return Evento(SALTO, linha, salto)
+
+    def lista(self):
+        return [self.saltos[ttl] for ttl in sorted(self.saltos)]
+
+
+class Fluxo:
+    # ao_linha de comandos.executar_live: interpreta, grava no disco, guarda a cauda
+    def __init__(self, interpretador=None, caminho=None, cauda=CAUDA, ao_mudar=None,
+                 intervalo=INTERVALO_TELA):
+        self.interpretador = interpretador
+        self.caminho = caminho
+        self.cauda = collections.deque(maxlen=cauda)
+        self.linhas = 0
+        self.eventos = collections.Counter()
+        self.ao_mudar = ao_mudar
+        self.intervalo = intervalo
+        self._ultima_tela = 0.0
+        self._pendente = False
+        self._arquivo = None
+        if caminho:
+            os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+            self._arquivo = open(caminho, "a", encoding="utf-8")
+
+    def __call__(self, linha):
+        self.linhas += 1
+        self.cauda.append(linha)
+        if self._arquivo:
+            self._arquivo.write(linha + "\n")
+        evento = self.interpretador.interpretar(linha) if self.interpretador else Evento(LINHA, linha)
+        self.eventos[evento.tipo] += 1
+        self._pendente = True
+        if self.ao_mudar:
+            agora = time.monotonic()
+            if agora - self._ultima_tela >= self.intervalo:
+                self._ultima_tela = agora
+                self._pendente = False
+                if self._arquivo:
+                    self._arquivo.flush()
+                self.ao_mudar(self)
+        return evento
+
+    def fechar(self, aviso=None):
+        if aviso:
+            self.linhas += 1
+            self.cauda.append(aviso)
+        if self._arquivo:
+            if aviso:
+                self._arquivo.write(aviso + "\n")
+            self._arquivo.close()
+            self._arquivo = None
+        if self.ao_mudar and self._pendente:
+            self._pendente = False
+            self.ao_mudar(self)
+
+    def ultimas(self, n=CAUDA_TELA):
+        return list(self.cauda)[-n:]
+
+    def texto_cauda(self):
+        # Cauda para o registro, avisando quantas linhas ficaram só no arquivo
+        texto = "\n".join(self.cauda)
+        omitidas = self.linhas - len(self.cauda)
+        if omitidas > 0 and self.caminho:
+            texto = f"[... {omitidas} linhas anteriores em {self.caminho}]\n{texto}"
+        return texto
@@ -0,0 +1,358 @@
+# Modo frota - checa centenas de alvos (CPEs) de uma lista, com concorrência limitada
+# Lê a lista de alvos (CSV com cabeçalho ou JSONL), roda os checks escolhidos com um
+# limite global e outro por sub-rede (para não derrubar o concentrador de um bairro
+# inteiro de uma vez) e grava cada alvo numa linha JSONL assim que ele termina. Se a
+# execução for interrompida, rodar de novo com o mesmo arquivo de saída retoma de
+# onde parou: alvos já gravados são pulados.
+#
+#   python elias.py --frota alvos.csv -o frota.jsonl [--checks ping,portas] [--concorrencia 64]
+#
+# CSV (colunas opcionais, exceto host):
+#   host,nome,portas,checks,latencia_max_ms,perda_max_pct
+#   200.160.2.3,cliente-0042,"22,80,7547",ping,80,5
+# JSONL: {"host": "200.160.2.3", "nome": "cliente-0042", "portas": [22, 7547], "perda_max_pct": 2}
+#
+# Cada alvo sai como saudável, degradado (respondeu, mas fora dos limites ou com
+# porta esperada fechada) ou fora (nenhum check obteve resposta).
+
+import argparse
+import asyncio
+import csv
+import ipaddress
+import json
+import os
+import socket
+import sys
+import time
+
+import instrumentos
+import rastreio
+import sonda
+import varredura
+
+SAUDAVEL, DEGRADADO, FORA = "saudavel", "degradado", "fora"
+CHECKS = ("ping", "portas", "rastreio")
+
+PADRAO = {
+    "checks": ["ping", "portas"],
+    "portas": [],
+    "latencia_max_ms": 100.0,
+    "perda_max_pct": 5.0,
+}
+
+
+# ---------- lista de alvos ----------
+
+def _lista(valor, conversor=str):
+    # "22,80" / "ping;portas" / [22, 80] -> lista
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, (list, tuple)):
+        return [conversor(v) for v in valor]
+    return [conversor(v) for v in str(valor).replace(";", ",").replace("+", ",").split(",") if v.strip()]
+
+
+def _normalizar(bruto, padrao, origem):
+    host = str(bruto.get("host") or bruto.get("alvo") or "").strip()
+    if not host:
+        raise ValueError(f"{origem}: alvo sem host")
+    portas = bruto.get("portas")
+    if isinstance(portas, str):
+        portas = varredura.parse_portas(portas) if portas.strip() else None
+    checks = _lista(bruto.get("checks"), lambda c: c.strip().lower()) or padrao["checks"]
+    desconhecidos = [c for c in checks if c not in CHECKS]
+    if desconhecidos:
+        raise ValueError(f"{origem}: check desconhecido {', '.join(desconhecidos)} (use {', '.join(CHECKS)})")
+    alvo = {
+        "host": host,
+        "nome": str(bruto.get("nome") or "").strip() or host,
+        "portas": [int(p) for p in portas] if portas else list(padrao["portas"]),
+        "checks": checks,
+    }
+    # Sem nenhum check executável o alvo sairia "fora" sem ter sido sondado
+    if not any(c != "portas" or alvo["portas"] for c in checks):
+        raise ValueError(f"{origem}: check portas sem portas")
+    for limite in ("latencia_max_ms", "perda_max_pct"):
+        valor = bruto.get(limite)
+        alvo[limite] = float(valor) if valor not in (None, "") else padrao[limite]
+    return alvo
+
+
+def carregar_alvos(caminho, padrao=None):
+    # CSV (pelo cabeçalho) ou JSONL (pela extensão ou primeira linha começando com "{")
+    padrao = dict(PADRAO, **(padrao or {}))
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        texto = f.read()
+    primeira = texto.lstrip()[:1]
+    alvos = []
+    if caminho.endswith((".jsonl", ".ndjson")) or primeira == "{":
+        for n, linha in enumerate(texto.splitlines(), 1):
+            linha = linha.strip()
+            if linha and not linha.startswith("#"):
+                alvos.append(_normalizar(json.loads(linha), padrao, f"{caminho}:{n}"))
+    else:
+        linhas = (l for l in texto.splitlines() if l.strip() and not l.lstrip().startswith("#"))
+        for n, registro in enumerate(csv.DictReader(linhas), 2):
+            registro = {(k or "").strip().lower(): (v or "").strip() for k, v in registro.items()}
+            alvos.append(_normalizar(registro, padrao, f"{caminho}:{n}"))
+    nomes = set()
+    for alvo in alvos:
+        if alvo["nome"] in nomes:
+            raise ValueError(f"Alvo repetido na lista: {alvo['nome']} (o nome identifica o alvo ao retomar)")
+        nomes.add(alvo["nome"])
+    return alvos
+
+
+# ---------- retomada ----------
+
+def retomar(caminho, nomes=None):
+    # Lê o JSONL de uma execução anterior: devolve ({nomes concluídos}, {status: n}),
+    # só dos alvos em `nomes` se informado. Uma última linha cortada pela interrupção
+    # é descartada do arquivo.
+    feitos, contagem = set(), {SAUDAVEL: 0, DEGRADADO: 0, FORA: 0}
+    if not os.path.exists(caminho):
+        return feitos, contagem
+    valido = 0
+    with open(caminho, "rb") as f:
+        for linha in f:
+            if not linha.endswith(b"\n"):
+                break
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                break
+            valido += len(linha)
+            if nomes is not None and registro["nome"] not in nomes:
+                continue
+            feitos.add(registro["nome"])
+            contagem[registro["status"]] = contagem.get(registro["status"], 0) + 1
+    if valido < os.path.getsize(caminho):
+        with open(caminho, "r+b") as f:
+            f.truncate(valido)
+    return feitos, contagem
+
+
+# ---------- classificação ----------
+
+def classificar(alvo, resultado):
+    # (status, motivos) a partir dos checks já executados
+    if resultado.get("erro"):
+        return FORA, [resultado["erro"]]
+    motivos = []
+    respondeu = False
+    ping = resultado.get("ping")
+    if ping:
+        if ping["recebidos"]:
+            respondeu = True
+            if ping["perda_pct"] > alvo["perda_max_pct"]:
+                motivos.append(f"perda {ping['perda_pct']:.0f}% > {alvo['perda_max_pct']:g}%")
+            if ping["p50_ms"] is not None and ping["p50_ms"] > alvo["latencia_max_ms"]:
+                motivos.append(f"latência {ping['p50_ms']:.0f} ms > {alvo['latencia_max_ms']:g} ms")
+        else:
+            motivos.append("sem resposta ao ping")
+    for porta in resultado.get("portas", ()):
+        if porta["estado"] == varredura.ABERTA:
+            respondeu = True
+        else:
+            if porta["estado"] == varredura.FECHADA:
+                respondeu = True   # RST também prova que o alvo está no ar
+            motivos.append(f"porta {porta['porta']} {porta['estado']}")
+    rota = resultado.get("rastreio")
+    if rota:
+        if rota["alcancado"]:
+            respondeu = True
+        else:
+            motivos.append(f"rastreio parou no salto {rota['saltos']}")
+    if not respondeu:
+        return FORA, motivos
+    return (DEGRADADO if motivos else SAUDAVEL), motivos
+
+
+# ---------- execução ----------
+
+class Frota:
+    # concorrencia: alvos simultâneos no total; por_subrede: simultâneos na mesma /prefixo
+    def __init__(self, concorrencia=64, por_subrede=8, prefixo=24, contagem=5, intervalo=0.2,
+                 timeout=1.0, max_saltos=20, ao_resultado=None):
+        self.concorrencia = concorrencia
+        self.por_subrede = por_subrede
+        self.prefixo = prefixo
+        self.contagem = contagem
+        self.intervalo = intervalo
+        self.timeout = timeout
+        self.max_saltos = max_saltos
+        self.ao_resultado = ao_resultado
+        self._global = None
+        self._subredes = {}
+        self._canais = {}
+
+    def _subrede(self, endereco):
+        ip = ipaddress.ip_address(endereco)
+        prefixo = self.prefixo if ip.version == 4 else 64
+        rede = ipaddress.ip_network(f"{endereco}/{prefixo}", strict=False)
+        if rede not in self._subredes:
+            self._subredes[rede] = asyncio.Semaphore(self.por_subrede)
+        return self._subredes[rede]
+
+    async def _ping(self, familia, endereco):
+        # Um canal ICMP por família para a frota inteira, não um socket bruto por alvo
+        if familia not in self._canais:
+            self._canais[familia] = sonda.CanalICMP(familia) if sonda.icmp_disponivel(familia) else None
+        canal = self._canais[familia]
+        st = sonda.EstatisticasRTT(endereco)
+        st.metodo = "icmp" if canal else "tcp"
+
+        async def _eco(seq):
+            await asyncio.sleep(seq * self.intervalo)
+            st.registrar_envio(seq)
+            if canal:
+                rtt = await canal.eco(endereco, self.timeout)
+            else:
+                rtt = await sonda.eco_tcp(endereco, sonda.PORTA_PADRAO["tcp"], self.timeout)
+            instrumentos.contar("sondas", metodo=st.metodo)
+            if rtt is None:
+                instrumentos.contar("timeouts", origem=st.metodo)
+                st.registrar_perda(seq)
+            else:
+                st.registrar_resposta(seq, rtt)
+
+        await asyncio.gather(*(_eco(i) for i in range(self.contagem)))
+        resumo = st.resumo()
+        return {k: resumo[k] for k in ("metodo", "enviados", "recebidos", "perda_pct", "rtt_min_ms",
+                                       "rtt_media_ms", "rtt_max_ms", "jitter_ms", "p50_ms")}
+
+    async def _portas(self, alvo, endereco):
+        resultados = await asyncio.gather(*(varredura.sondar_porta(alvo["host"], endereco, p, self.timeout)
+                                            for p in alvo["portas"]))
+        return [{"porta": r["porta"], "estado": r["estado"], "latencia_ms": r["latencia_ms"]}
+                for r in resultados]
+
+    async def _rastreio(self, endereco):
+        rota = await rastreio.rastrear(endereco, metodo="icmp" if sonda.icmp_disponivel() else "tcp",
+                                       max_saltos=self.max_saltos, sondas=1, timeout=self.timeout,
+                                       nomes=False)
+        ultimo = rota["hops"][-1] if rota["hops"] else None
+        return {"alcancado": rota["alcancado"], "saltos": len(rota["hops"]),
+                "ultimo": ultimo["enderecos"][0] if ultimo and ultimo["enderecos"] else None}
+
+    async def checar(self, alvo):
+        inicio = time.perf_counter()
+        resultado = {"nome": alvo["nome"], "host": alvo["host"], "endereco": None}
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(alvo["host"], None, type=socket.SOCK_STREAM)
+            familia, endereco = infos[0][0], infos[0][4][0]
+        except (socket.gaierror, OSError):
+            resultado["erro"] = "não foi possível resolver o host"
+            familia = endereco = None
+        if endereco:
+            resultado["endereco"] = endereco
+            # Sub-rede antes do global: quem espera vaga no bairro não segura vaga da frota
+            async with self._subrede(endereco), self._global:
+                with instrumentos.Trecho(alvo["nome"], "frota", host=alvo["host"]):
+                    tarefas = {}
+                    if "ping" in alvo["checks"]:
+                        tarefas["ping"] = self._ping(familia, endereco)
+                    if "portas" in alvo["checks"] and alvo["portas"]:
+                        tarefas["portas"] = self._portas(alvo, endereco)
+                    if "rastreio" in alvo["checks"]:
+                        tarefas["rastreio"] = self._rastreio(endereco)
+                    for nome, valor in zip(tarefas, await asyncio.gather(*tarefas.values())):
+                        resultado[nome] = valor
+        resultado["status"], resultado["motivos"] = classificar(alvo, resultado)
+        resultado["ts"] = round(time.time(), 3)
+        resultado["duracao_s"] = round(time.perf_counter() - inicio, 3)
+        return resultado
+
+    async def executar(self, alvos, caminho_saida, feitos=()):
+        # Grava uma linha por alvo assim que termina; devolve {status: n} desta execução
+        self._global = asyncio.Semaphore(self.concorrencia)
+        contagem = {SAUDAVEL: 0, DEGRADADO: 0, FORA: 0}
+        pendentes = [a for a in alvos if a["nome"] not in feitos]
+        try:
+            with open(caminho_saida, "a", encoding="utf-8") as saida:
+                for tarefa in asyncio.as_completed([self.checar(a) for a in pendentes]):
+                    resultado = await tarefa
+                    saida.write(json.dumps(resultado, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    saida.flush()
+                    contagem[resultado["status"]] += 1
+                    if self.ao_resultado:
+                        self.ao_resultado(resultado, contagem)
+        finally:
+            for canal in self._canais.values():
+                if canal:
+                    canal.fechar()
+            self._canais.clear()
+        return contagem
+
+
+# ---------- interface de linha de comando ----------
+
+def formatar_resumo(contagem, feitos, total):
+    return (f"{feitos}/{total} alvos  saudáveis {contagem[SAUDAVEL]}  "
+            f"degradados {contagem[DEGRADADO]}  fora {contagem[FORA]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="elias --frota", description="Checa uma lista de alvos em lote")
+    parser.add_argument("lista", help="CSV (com cabeçalho) ou JSONL com os alvos")
+    parser.add_argument("-o", "--saida", help="JSONL de resultados (padrão: <lista>.resultado.jsonl)")
+    parser.add_argument("--checks", default=",".join(PADRAO["checks"]),
+                        help=f"checks padrão para quem não define ({','.join(CHECKS)})")
+    parser.add_argument("--portas", default="", help="portas padrão (ex: 22,80,7547)")
+    parser.add_argument("--latencia-max", type=float, default=PADRAO["latencia_max_ms"], help="ms")
+    parser.add_argument("--perda-max", type=float, default=PADRAO["perda_max_pct"], help="%%")
+    parser.add_argument("--concorrencia", type=int, default=64, help="alvos simultâneos no total")
+    parser.add_argument("--por-subrede", type=int, default=8, help="alvos simultâneos por sub-rede")
+    parser.add_argument("--prefixo", type=int, default=24, help="tamanho da sub-rede IPv4 para o limite")
+    parser.add_argument("--contagem", type=int, default=5, help="pings por alvo")
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--do-zero", action="store_true", help="descarta a saída anterior em vez de retomar")
+    args = parser.parse_args(argv)
+
+    padrao = {"checks": _lista(args.checks), "latencia_max_ms": args.latencia_max,
+              "perda_max_pct": args.perda_max,
+              "portas": varredura.parse_portas(args.portas) if args.portas.strip() else []}
+    try:
+        alvos = carregar_alvos(args.lista, padrao)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    saida = args.saida or os.path.splitext(args.lista)[0] + ".resultado.jsonl"
+    if args.do_zero and os.path.exists(saida):
+        os.remove(saida)
+    feitos, anteriores = retomar(saida, {a["nome"] for a in alvos})
+    if feitos:
+        print(f"Retomando: {len(feitos)} alvos já em {saida}", file=sys.stderr)
+
+    terminal = sys.stderr.isatty()
+    ultimo = [0.0]
+
+    def _ao_resultado(resultado, contagem):
+        total = {s: anteriores.get(s, 0) + contagem[s] for s in contagem}
+        concluidos = len(feitos) + sum(contagem.values())
+        agora = time.monotonic()
+        if concluidos < len(alvos) and agora - ultimo[0] < (0.1 if terminal else 5.0):
+            return
+        ultimo[0] = agora
+        linha = formatar_resumo(total, concluidos, len(alvos))
+        print(f"\r{linha}\033[K" if terminal else linha, end="" if terminal else "\n",
+              file=sys.stderr, flush=True)
+
+    frota = Frota(concorrencia=args.concorrencia, por_subrede=args.por_subrede, prefixo=args.prefixo,
+                  contagem=args.contagem, timeout=args.timeout, ao_resultado=_ao_resultado)
+    try:
+        contagem = asyncio.run(frota.executar(alvos, saida, feitos))
+    except KeyboardInterrupt:
+        print(f"\nInterrompido; rode de novo com o mesmo -o para retomar ({saida})", file=sys.stderr)
+        return 130
+    if terminal:
+        print(file=sys.stderr)
+    total = {s: anteriores.get(s, 0) + contagem[s] for s in contagem}
+    print(formatar_resumo(total, len(alvos), len(alvos)))
+    print(f"Resultados em {saida}")
+    return 0 if total[SAUDAVEL] == len(alvos) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
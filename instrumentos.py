@@ -0,0 +1,203 @@
+# Instrumentação leve da sessão - trechos cronometrados e contadores
+# Cada diagnóstico, comando externo e impressão na tela vira um trecho (início,
+# duração, thread, trecho pai) e as sondas contam sondas, timeouts e bytes. O pai de
+# cada trecho vem de um contextvar, então trechos dentro de tarefas asyncio
+# concorrentes aninham certo. Custo por trecho: duas leituras de relógio e um append.
+#
+# Exportação no fim da sessão:
+#   - JSON próprio (trechos + contadores)
+#   - Chrome trace (abrir em chrome://tracing ou https://ui.perfetto.dev)
+#   - snapshot no formato texto do Prometheus
+# perfilar() roda uma função sob cProfile e devolve o relatório do pstats.
+
+import contextvars
+import io
+import itertools
+import json
+import os
+import threading
+import time
+
+LIMITE_TRECHOS = 100000
+
+_inicio_ns = time.perf_counter_ns()
+_inicio_epoch = time.time()
+_trechos = []
+_descartados = 0
+_contadores = {}
+_duracoes = {}          # (nome, categoria) -> [soma_s, quantidade]
+_lock = threading.Lock()
+_pai = contextvars.ContextVar("trecho_pai", default=None)
+_proximo_id = itertools.count(1).__next__
+
+# nome -> texto do HELP do Prometheus
+DESCRICOES = {
+    "sondas": "Sondas enviadas (ICMP, UDP, TCP, DNS, HTTP)",
+    "timeouts": "Sondas e comandos que estouraram o tempo limite",
+    "bytes": "Bytes transferidos pelos testes de vazão e HTTP",
+    "comandos": "Comandos externos executados",
+}
+
+
+class Trecho:
+    # with instrumentos.Trecho("dns", "diagnostico", alvo="8.8.8.8"): ...
+    __slots__ = ("nome", "categoria", "atributos", "id", "_inicio", "_token")
+
+    def __init__(self, nome, categoria="geral", **atributos):
+        self.nome = nome
+        self.categoria = categoria
+        self.atributos = atributos
+
+    def __enter__(self):
+        self.id = _proximo_id()
+        self._token = _pai.set(self.id)
+        self._inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        fim = time.perf_counter_ns()
+        _pai.reset(self._token)
+        pai = _pai.get()
+        if tipo is not None:
+            self.atributos["erro"] = tipo.__name__
+        registrar_trecho(self.nome, self.categoria, self._inicio, fim, pai, self.id, self.atributos)
+        return False
+
+
+def registrar_trecho(nome, categoria, inicio_ns, fim_ns, pai=None, id_=None, atributos=None):
+    global _descartados
+    duracao_s = (fim_ns - inicio_ns) / 1e9
+    with _lock:
+        acumulado = _duracoes.setdefault((nome, categoria), [0.0, 0])
+        acumulado[0] += duracao_s
+        acumulado[1] += 1
+        if len(_trechos) >= LIMITE_TRECHOS:
+            _descartados += 1
+            return
+        _trechos.append((id_ or _proximo_id(), pai, nome, categoria, inicio_ns - _inicio_ns,
+                         fim_ns - inicio_ns, threading.get_ident(), atributos or None))
+
+
+def contar(nome, valor=1, **rotulos):
+    chave = (nome, tuple(sorted(rotulos.items())))
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def contadores():
+    with _lock:
+        return {(n, r): v for (n, r), v in _contadores.items()}
+
+
+# ---------- exportação ----------
+
+def sessao():
+    with _lock:
+        trechos = list(_trechos)
+        conts = dict(_contadores)
+        descartados = _descartados
+    return {
+        "inicio": _inicio_epoch,
+        "duracao_s": round((time.perf_counter_ns() - _inicio_ns) / 1e9, 3),
+        "pid": os.getpid(),
+        "trechos": [{"id": i, "pai": p, "nome": n, "categoria": c, "inicio_ms": round(ini / 1e6, 3),
+                     "duracao_ms": round(dur / 1e6, 3), "thread": t, "atributos": a}
+                    for i, p, n, c, ini, dur, t, a in trechos],
+        "trechos_descartados": descartados,
+        "contadores": [{"nome": n, "rotulos": dict(r), "valor": v} for (n, r), v in sorted(conts.items())],
+    }
+
+
+def chrome_trace():
+    # Formato "Trace Event": eventos completos (ph=X) em microssegundos
+    pid = os.getpid()
+    with _lock:
+        trechos = list(_trechos)
+    eventos = [{"name": n, "cat": c, "ph": "X", "ts": ini / 1000, "dur": dur / 1000,
+                "pid": pid, "tid": t, "args": a or {}}
+               for _, _, n, c, ini, dur, t, a in trechos]
+    eventos.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "elias"}})
+    return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+
+def _rotulos_prometheus(rotulos):
+    if not rotulos:
+        return ""
+    partes = []
+    for k, v in rotulos:
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def prometheus():
+    # Snapshot no formato texto 0.0.4: contadores + soma/quantidade de duração por trecho
+    with _lock:
+        conts = dict(_contadores)
+        duracoes = dict((k, list(v)) for k, v in _duracoes.items())
+    linhas = []
+    por_nome = {}
+    for (nome, rotulos), valor in sorted(conts.items()):
+        por_nome.setdefault(nome, []).append((rotulos, valor))
+    for nome, series in por_nome.items():
+        metrica = f"elias_{nome}_total"
+        linhas.append(f"# HELP {metrica} {DESCRICOES.get(nome, nome)}")
+        linhas.append(f"# TYPE {metrica} counter")
+        for rotulos, valor in series:
+            linhas.append(f"{metrica}{_rotulos_prometheus(rotulos)} {valor}")
+    if duracoes:
+        linhas.append("# HELP elias_trecho_segundos Tempo gasto por trecho instrumentado")
+        linhas.append("# TYPE elias_trecho_segundos summary")
+        for (nome, categoria), (soma, quantidade) in sorted(duracoes.items()):
+            rotulos = _rotulos_prometheus((("categoria", categoria), ("nome", nome)))
+            linhas.append(f"elias_trecho_segundos_sum{rotulos} {soma:.6f}")
+            linhas.append(f"elias_trecho_segundos_count{rotulos} {quantidade}")
+    linhas.append("# HELP elias_sessao_segundos Duração da sessão até o snapshot")
+    linhas.append("# TYPE elias_sessao_segundos gauge")
+    linhas.append(f"elias_sessao_segundos {(time.perf_counter_ns() - _inicio_ns) / 1e9:.3f}")
+    return "\n".join(linhas) + "\n"
+
+
+def exportar(pasta, prefixo=None):
+    # Grava <prefixo>.trace.json, <prefixo>.chrome.json e <prefixo>.prom; devolve os caminhos
+    os.makedirs(pasta, exist_ok=True)
+    prefixo = prefixo or time.strftime("sessao_%Y-%m-%d_%H-%M-%S", time.localtime(_inicio_epoch))
+    base = os.path.join(pasta, prefixo)
+    caminhos = {"json": base + ".trace.json", "chrome": base + ".chrome.json", "prometheus": base + ".prom"}
+    with open(caminhos["json"], "w", encoding="utf-8") as f:
+        json.dump(sessao(), f, ensure_ascii=False)
+    with open(caminhos["chrome"], "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f)
+    with open(caminhos["prometheus"], "w", encoding="utf-8") as f:
+        f.write(prometheus())
+    return caminhos
+
+
+def resumo(limite=15):
+    # Texto com os trechos que mais somaram tempo e os contadores
+    with _lock:
+        duracoes = sorted(((s, q, n, c) for (n, c), (s, q) in _duracoes.items()), reverse=True)
+        conts = sorted(_contadores.items())
+    linhas = [f"{'Trecho':<40} {'Categoria':<12} {'Qtd':>6} {'Total (ms)':>11}"]
+    for soma, quantidade, nome, categoria in duracoes[:limite]:
+        linhas.append(f"{nome[:40]:<40} {categoria:<12} {quantidade:>6} {soma * 1000:>11.1f}")
+    if conts:
+        linhas.append("")
+        for (nome, rotulos), valor in conts:
+            linhas.append(f"{nome}{_rotulos_prometheus(rotulos)} = {valor}")
+    return "\n".join(linhas)
+
+
+def perfilar(funcao, *args, arquivo=None, linhas=25, ordem="cumulative", **kwargs):
+    # Roda funcao sob cProfile; devolve (resultado, relatório do pstats)
+    import cProfile
+    import pstats
+    perfil = cProfile.Profile()
+    try:
+        resultado = perfil.runcall(funcao, *args, **kwargs)
+    finally:
+        if arquivo:
+            perfil.dump_stats(arquivo)
+    saida = io.StringIO()
+    pstats.Stats(perfil, stream=saida).sort_stats(ordem).print_stats(linhas)
+    return resultado, saida.getvalue()
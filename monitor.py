@@ -0,0 +1,343 @@
+# Monitoramento contínuo - sondas agendadas em intervalos próprios, por dias a fio
+# Pega quedas intermitentes que um teste pontual não vê. As amostras recentes ficam
+# em anéis de tamanho fixo na memória; a cada janela um resumo vai para o armazém
+# (tipo "monitor_<sonda>") e cada queda vira um evento "monitor_queda", ambos como
+# registros tipados (registro.Resultado) que o prognóstico lê como os demais testes.
+#
+# Uso: python elias.py --monitor [config.json] [--duracao 3600]
+#
+# Config (JSON): {"nome": "...", "janela_s": 300, "cpu_pct": 2.0, "rss_mb": 64,
+#                 "sondas": [{"tipo": "ping_gateway", "intervalo": 1},
+#                            {"tipo": "porta", "host": "example.com", "porta": 443, "intervalo": 30}]}
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import sys
+import time
+
+import armazem
+import estado_rede
+import estatistica
+import registro
+import resolvedor
+import sonda
+import varredura
+import web
+
+CONFIG_PADRAO = {
+    "nome": "padrao",
+    "janela_s": 300,     # intervalo entre resumos gravados em disco
+    "amostras": 3600,    # tamanho de cada anel (1 h de ping a 1/s)
+    "cpu_pct": 2.0,      # orçamento de CPU do processo
+    "rss_mb": 64,        # orçamento de memória residente
+    "falhas_queda": 3,   # falhas seguidas para declarar queda
+    "sondas": [
+        {"tipo": "ping_gateway", "intervalo": 1},
+        {"tipo": "dns", "intervalo": 30},
+        {"tipo": "captive", "intervalo": 60},
+    ],
+}
+
+FATOR_MAXIMO = 8  # sob CPU alta os intervalos são esticados até este fator
+
+
+# ---------- sondas (uma amostra cada: (ok, ms, detalhe)) ----------
+
+class _PingGateway:
+    def __init__(self, alvo=None, timeout=1.0):
+        self.alvo_fixo = alvo
+        self.timeout = timeout
+        self.canal = None
+
+    @property
+    def alvo(self):
+        return self.alvo_fixo or estado_rede.obter().gateway()
+
+    async def __call__(self):
+        alvo = self.alvo
+        if not alvo:
+            return False, None, "sem gateway"
+        if self.canal is None and sonda.icmp_disponivel():
+            self.canal = sonda.CanalICMP()
+        if self.canal:
+            rtt = await self.canal.eco(alvo, self.timeout)
+        else:
+            rtt = await sonda.eco_tcp(alvo, sonda.PORTA_PADRAO["tcp"], self.timeout)
+        return rtt is not None, rtt, None if rtt is not None else "sem resposta"
+
+    def fechar(self):
+        if self.canal:
+            self.canal.fechar()
+
+
+class _DNS:
+    def __init__(self, nome="google.com", servidor=None, timeout=2.0):
+        self.nome = nome
+        self.servidor = servidor
+        self.timeout = timeout
+
+    @property
+    def alvo(self):
+        return self.servidor or next(iter(resolvedor.resolvedores_sistema()), None)
+
+    async def __call__(self):
+        servidor = self.alvo
+        if not servidor:
+            return False, None, "sem resolvedor"
+        r = await resolvedor.consultar(servidor, self.nome, timeout=self.timeout)
+        if "erro" in r:
+            return False, None, r["erro"]
+        return r["rcode"] == "NOERROR", r["tempo_ms"], r["rcode"]
+
+
+class _Captive:
+    def __init__(self, url="http://clients3.google.com/generate_204", timeout=5.0):
+        self.alvo = url
+        self.timeout = timeout
+
+    async def __call__(self):
+        r = await web.sondar(self.alvo, self.timeout, seguir=0)
+        if r["erro"]:
+            return False, None, r["erro"]
+        return r["status"] == 204, r["fases"]["total_ms"], f"HTTP {r['status']}"
+
+
+class _Porta:
+    def __init__(self, host, porta, timeout=2.0):
+        self.host = host
+        self.porta = int(porta)
+        self.alvo = f"{host}:{porta}"
+        self.timeout = timeout
+
+    async def __call__(self):
+        r = await varredura.sondar_porta(self.host, self.host, self.porta, timeout=self.timeout)
+        return r["estado"] == varredura.ABERTA, r["latencia_ms"], r["estado"]
+
+
+SONDAS = {
+    "ping_gateway": _PingGateway,
+    "dns": _DNS,
+    "captive": _Captive,
+    "porta": _Porta,
+}
+
+
+def _resultado_janela(resumo):
+    # Medidas com os nomes dos demais testes de latência, para o prognóstico acompanhar
+    r = registro.Resultado(f"monitor_{resumo['sonda']}", f"Monitor: {resumo['sonda']}", resumo["alvo"],
+                           detalhes=resumo)
+    r.medir("latencia", resumo["rtt_media_ms"], "ms", "Latência média", alerta=80, critico=150)
+    r.medir("p99", resumo["p99_ms"], "ms", "p99")
+    r.medir("jitter", resumo["jitter_ms"], "ms", "Jitter", critico=20)
+    r.medir("perda", resumo["perda_pct"], "%", "Perda", alerta=5, critico=20, casas=1)
+    if resumo["em_queda"]:
+        r.achar(registro.CRITICO, f"{resumo['sonda']} em queda no fim da janela")
+    return r
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Monitor:
+    def __init__(self, config=None, db=None, ao_resumo=None, ao_evento=None):
+        self.config = dict(CONFIG_PADRAO, **(config or {}))
+        self.db = db
+        self.ao_resumo = ao_resumo
+        self.ao_evento = ao_evento
+        self.fator = 1.0
+        self.sondas = []
+        for item in self.config["sondas"]:
+            params = dict(item)
+            tipo = params.pop("tipo")
+            intervalo = float(params.pop("intervalo", 10))
+            if tipo not in SONDAS:
+                raise ValueError(f"Sonda desconhecida: {tipo}")
+            self.sondas.append({
+                "tipo": tipo, "intervalo": intervalo, "executar": SONDAS[tipo](**params),
+                "amostras": estatistica.Amostras(self.config["amostras"]), "sessao": estatistica.Esboco(),
+                "falhas_seguidas": 0, "queda_desde": None,
+            })
+        self._cpu = time.process_time()
+        self._parede = time.monotonic()
+
+    async def _agendar(self, s):
+        loop = asyncio.get_running_loop()
+        proximo = loop.time()
+        while True:
+            intervalo = s["intervalo"] * self.fator
+            try:
+                ok, ms, detalhe = await asyncio.wait_for(s["executar"](), intervalo)
+            except asyncio.TimeoutError:
+                ok, ms, detalhe = False, None, "timeout"
+            except OSError as e:
+                ok, ms, detalhe = False, None, str(e)
+            except Exception as e:
+                # Erro inesperado na sonda: conta como falha e a agenda segue (senão a
+                # tarefa morre calada e o monitor grava janelas vazias por dias)
+                ok, ms, detalhe = False, None, type(e).__name__
+            agora = time.time()
+            s["amostras"].adicionar(ms if ok else None, agora)
+            if ok:
+                s["sessao"].adicionar(ms)
+            self._quedas(s, ok, agora, detalhe)
+            # Agenda pelo relógio, não pelo fim da sonda: sem deriva ao longo de dias
+            proximo += intervalo
+            espera = proximo - loop.time()
+            if espera < 0:
+                proximo = loop.time()
+                espera = 0
+            await asyncio.sleep(espera)
+
+    def _quedas(self, s, ok, agora, detalhe):
+        if ok:
+            if s["queda_desde"] is not None:
+                evento = {"sonda": s["tipo"], "inicio": s["queda_desde"], "fim": agora,
+                          "duracao_s": round(agora - s["queda_desde"], 1), "motivo": s.get("motivo")}
+                if self.db:
+                    r = registro.Resultado("monitor_queda", f"Queda em {s['tipo']}", s["executar"].alvo,
+                                           detalhes=evento, ts=agora)
+                    r.medir("duracao", evento["duracao_s"], "s", "Duração da queda", casas=1)
+                    r.achar(registro.CRITICO, f"{s['tipo']} sem resposta por {evento['duracao_s']} s "
+                                              f"({evento['motivo']})")
+                    self.db.registrar_resultado(r)
+                if self.ao_evento:
+                    self.ao_evento(evento)
+            s["falhas_seguidas"] = 0
+            s["queda_desde"] = None
+            return
+        s["falhas_seguidas"] += 1
+        if s["falhas_seguidas"] == self.config["falhas_queda"]:
+            s["queda_desde"] = agora - s["intervalo"] * self.fator * (s["falhas_seguidas"] - 1)
+            s["motivo"] = detalhe
+
+    def resumir(self, desde):
+        resumos = []
+        for s in self.sondas:
+            resumo = {"sonda": s["tipo"], "alvo": s["executar"].alvo}
+            resumo.update(estatistica.resumir(s["amostras"].serie(desde)))
+            # Percentis da sessão inteira, em memória constante
+            sessao = s["sessao"].resumo()
+            resumo.update({"sessao_p50_ms": sessao["p50_ms"], "sessao_p99_ms": sessao["p99_ms"],
+                           "sessao_amostras": sessao["amostras"], "em_queda": s["queda_desde"] is not None})
+            n = resumo["amostras"]
+            resumos.append(resumo)
+            if n and self.db:
+                self.db.registrar_resultado(_resultado_janela(resumo))
+        if self.db:
+            self.db.flush()
+        return resumos
+
+    def recursos(self):
+        # CPU do processo desde a última janela; estica ou encolhe os intervalos
+        cpu = time.process_time()
+        parede = time.monotonic()
+        cpu_pct = 100.0 * (cpu - self._cpu) / max(parede - self._parede, 1e-6)
+        self._cpu, self._parede = cpu, parede
+        if cpu_pct > self.config["cpu_pct"]:
+            self.fator = min(self.fator * 2, FATOR_MAXIMO)
+        elif cpu_pct < self.config["cpu_pct"] / 4 and self.fator > 1:
+            self.fator = max(self.fator / 2, 1.0)
+        rss = _rss_mb()
+        if rss > self.config["rss_mb"]:
+            gc.collect()
+            rss = _rss_mb()
+        return {"cpu_pct": round(cpu_pct, 2), "rss_mb": round(rss, 1), "fator_intervalo": self.fator,
+                "acima_orcamento": rss > self.config["rss_mb"]}
+
+    def _resultado_recursos(self, uso):
+        r = registro.Resultado("monitor_recursos", "Monitor: recursos", detalhes=uso)
+        r.medir("cpu", uso["cpu_pct"], "%", "CPU do processo", alerta=self.config["cpu_pct"])
+        r.medir("rss", uso["rss_mb"], "MiB", "Memória residente", alerta=self.config["rss_mb"], casas=1)
+        return r
+
+    async def executar(self, duracao=None):
+        tarefas = [asyncio.ensure_future(self._agendar(s)) for s in self.sondas]
+        loop = asyncio.get_running_loop()
+        fim = loop.time() + duracao if duracao else None
+        desde = time.time()
+        try:
+            while True:
+                janela = self.config["janela_s"]
+                if fim is not None:
+                    janela = min(janela, fim - loop.time())
+                if janela > 0:
+                    await asyncio.sleep(janela)
+                agora = time.time()
+                resumos = self.resumir(desde)
+                desde = agora
+                uso = self.recursos()
+                if self.db:
+                    self.db.registrar_resultado(self._resultado_recursos(uso))
+                if self.ao_resumo:
+                    self.ao_resumo(resumos, uso)
+                if fim is not None and loop.time() >= fim:
+                    break
+        except asyncio.CancelledError:
+            # Ctrl+C: grava o que houver da janela incompleta
+            self.resumir(desde)
+            raise
+        finally:
+            for t in tarefas:
+                t.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+            for s in self.sondas:
+                if hasattr(s["executar"], "fechar"):
+                    s["executar"].fechar()
+            if self.db:
+                self.db.flush()
+
+
+def carregar_config(caminho=None):
+    if not caminho:
+        return dict(CONFIG_PADRAO)
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _imprimir_resumo(resumos, uso):
+    hora = time.strftime("%H:%M:%S")
+    partes = []
+    for r in resumos:
+        if not r["amostras"]:
+            continue
+        media = f"{r['rtt_media_ms']:.1f}ms" if r["rtt_media_ms"] is not None else "-"
+        alerta = " QUEDA" if r["em_queda"] else ""
+        partes.append(f"{r['sonda']}={media} perda {r['perda_pct']:.0f}%{alerta}")
+    print(f"[{hora}] " + " | ".join(partes) +
+          f" | cpu {uso['cpu_pct']}% rss {uso['rss_mb']}MB x{uso['fator_intervalo']:g}", flush=True)
+
+
+def _imprimir_evento(evento):
+    print(f"[{time.strftime('%H:%M:%S')}] queda em {evento['sonda']}: {evento['duracao_s']} s "
+          f"({evento['motivo']})", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="elias --monitor", description="Monitoramento contínuo de rede")
+    parser.add_argument("config", nargs="?", help="arquivo JSON com sondas e orçamento")
+    parser.add_argument("--duracao", type=float, help="encerra após N segundos (padrão: até Ctrl+C)")
+    parser.add_argument("--janela", type=float, help="segundos entre resumos gravados")
+    args = parser.parse_args(argv)
+
+    config = carregar_config(args.config)
+    if args.janela:
+        config["janela_s"] = args.janela
+    monitor = Monitor(config, db=armazem.abrir(), ao_resumo=_imprimir_resumo, ao_evento=_imprimir_evento)
+    try:
+        asyncio.run(monitor.executar(args.duracao))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# Descoberta de PMTU por busca binária - usada por diagnostico_mtu
+# Ecos ICMP com DF: resposta = cabe, EMSGSIZE/"frag needed" = grande demais,
+# timeout = perda (repetida e confirmada antes de ser tratada como buraco negro).
+# Resultados ficam em cache por (destino, interface) durante a sessão.
+
+import asyncio
+import socket
+import time
+
+import estado_rede
+import sonda
+
+MTU_MINIMO = {socket.AF_INET: 576, socket.AF_INET6: 1280}
+CABECALHO = {socket.AF_INET: 20 + 8, socket.AF_INET6: 40 + 8}  # IP + ICMP
+IP_MTU = 14
+IPV6_MTU = 24
+
+CABE = "cabe"
+GRANDE = "grande"
+PERDA = "perda"
+
+
+class CachePMTU:
+    def __init__(self, ttl=600):
+        # 600 s = expiração padrão do PMTU aprendido pelo kernel (net.ipv4.route.mtu_expires)
+        self.ttl = ttl
+        self._dados = {}
+
+    def obter(self, destino, interface):
+        item = self._dados.get((destino, interface))
+        if item and time.monotonic() - item[0] < self.ttl:
+            return item[1]
+        self._dados.pop((destino, interface), None)
+        return None
+
+    def guardar(self, destino, interface, resultado):
+        self._dados[(destino, interface)] = (time.monotonic(), resultado)
+
+    def limpar(self):
+        self._dados.clear()
+
+
+cache = CachePMTU()
+
+
+def mtu_conhecido(familia, endereco):
+    # MTU que o kernel usaria hoje para o destino (interface ou PMTU em cache)
+    try:
+        with socket.socket(familia, socket.SOCK_DGRAM) as s:
+            s.connect((endereco, 33434))
+            if familia == socket.AF_INET:
+                return s.getsockopt(socket.IPPROTO_IP, IP_MTU)
+            return s.getsockopt(socket.IPPROTO_IPV6, IPV6_MTU)
+    except OSError:
+        return 1500
+
+
+async def _sondar_tamanho(canal, endereco, mtu, timeout, tentativas):
+    # Devolve (CABE|GRANDE|PERDA, mtu_informado_pelo_roteador, sondas_enviadas)
+    familia = canal.familia
+    for tentativa in range(1, tentativas + 1):
+        try:
+            rtt = await canal.eco(endereco, timeout, mtu - CABECALHO[familia])
+        except sonda.PacoteGrande as e:
+            return GRANDE, e.mtu, tentativa
+        if rtt is not None:
+            return CABE, None, tentativa
+    return PERDA, None, tentativas
+
+
+async def _descobrir(canal, destino, endereco, interface, timeout, tentativas):
+    familia = canal.familia
+    lo = MTU_MINIMO[familia]
+    hi = min(mtu_conhecido(familia, endereco), 65535)
+    res = {"destino": destino, "endereco": endereco, "interface": interface,
+           "pmtu": None, "status": "ok", "sondas": 0, "perdas": 0,
+           "buraco_negro": False, "mtu_roteador": None, "cache": False}
+
+    async def sondar(mtu):
+        estado, mtu_rot, n = await _sondar_tamanho(canal, endereco, mtu, timeout, tentativas)
+        res["sondas"] += n
+        res["perdas"] += n - (estado != PERDA)
+        if mtu_rot:
+            res["mtu_roteador"] = mtu_rot
+        return estado, mtu_rot
+
+    # Caso comum: o caminho aceita o MTU da interface -> 1 sonda
+    estado, _ = await sondar(hi)
+    if estado == CABE:
+        res["pmtu"] = hi
+        return res
+    estado_min, _ = await sondar(lo)
+    if estado_min != CABE:
+        res["status"] = "inalcancavel"
+        return res
+
+    hi -= 1
+    while lo < hi:
+        meio = (lo + hi + 1) // 2
+        estado, mtu_rot = await sondar(meio)
+        if estado == CABE:
+            lo = meio
+        elif estado == GRANDE:
+            # O roteador informou o MTU do próximo salto: pula direto para ele
+            hi = min(meio - 1, mtu_rot) if mtu_rot and mtu_rot >= lo else meio - 1
+        else:
+            # Perda persistente num tamanho maior que um já confirmado: o caminho
+            # descarta em silêncio (filtro de ICMP / buraco negro de PMTU)
+            res["buraco_negro"] = True
+            hi = meio - 1
+    res["pmtu"] = lo
+    return res
+
+
+async def descobrir(destinos, timeout=1.0, tentativas=2, usar_cache=True, cache_pmtu=None):
+    cache_pmtu = cache_pmtu or cache
+    canais = {}
+    resultados = {}
+
+    async def _um(destino):
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(destino, None, type=socket.SOCK_DGRAM)
+        except socket.gaierror:
+            resultados[destino] = {"destino": destino, "status": "nao_resolvido", "pmtu": None}
+            return
+        familia, endereco = infos[0][0], infos[0][4][0]
+        interface = estado_rede.obter().interface_para(endereco)
+        if usar_cache:
+            em_cache = cache_pmtu.obter(destino, interface)
+            if em_cache:
+                resultados[destino] = dict(em_cache, cache=True)
+                return
+        if familia not in canais:
+            try:
+                canais[familia] = sonda.CanalICMP(familia, df=True)
+            except OSError:
+                canais[familia] = None
+        if canais[familia] is None:
+            resultados[destino] = {"destino": destino, "status": "sem_permissao_icmp", "pmtu": None}
+            return
+        res = await _descobrir(canais[familia], destino, endereco, interface, timeout, tentativas)
+        if res["status"] == "ok":
+            cache_pmtu.guardar(destino, interface, res)
+        resultados[destino] = res
+
+    try:
+        await asyncio.gather(*(_um(d) for d in dict.fromkeys(destinos)))
+    finally:
+        for canal in canais.values():
+            if canal:
+                canal.fechar()
+    return resultados
+
+
+def descobrir_pmtu(destinos, **kwargs):
+    return asyncio.run(descobrir(destinos, **kwargs))
@@ -0,0 +1,171 @@
+# Prognóstico incremental - agregados por tipo de teste e alvo sobre todo o histórico
+# Cada execução só processa os resultados gravados desde a anterior; o estado
+# (EWMA de latência, taxa de perda, vazões recentes, CUSUM) fica no próprio armazém.
+# As métricas saem das medidas dos registros tipados (registro.py), já na unidade certa.
+
+import math
+from collections import deque
+
+import estatistica
+import registro
+
+ESTADO = "prognostico"
+VERSAO = 1
+
+ALFA = 0.2          # peso da amostra nova nas médias móveis exponenciais
+ALFA_REF = 0.05     # média lenta usada como patamar de referência do CUSUM
+CUSUM_K = 0.5       # folga (em desvios) antes de acumular
+CUSUM_H = 8.0       # limiar (em desvios) para declarar mudança de patamar
+JANELA_VAZAO = 200  # vazões guardadas por alvo para os percentis
+
+# métrica acompanhada -> (medida do registro, unidade)
+METRICAS = {
+    "latencia_ms": ("latencia", "ms"),
+    "perda_pct": ("perda", "%"),
+    "jitter_ms": ("jitter", "ms"),
+    "vazao_mbps": ("vazao", "Mbps"),
+}
+
+
+def extrair_metricas(resultado):
+    m = {}
+    for chave, (nome, unidade) in METRICAS.items():
+        valor = resultado.valor(nome, unidade)
+        if valor is not None:
+            m[chave] = valor
+    return m
+
+
+class Tendencia:
+    def __init__(self, tipo, alvo):
+        self.tipo = tipo
+        self.alvo = alvo
+        self.n = 0
+        self.primeiro_ts = None
+        self.ultimo_ts = None
+        self.lat_ewma = None
+        self.lat_ref = None
+        self.lat_var = 0.0
+        self.jitter_ewma = None
+        self.perda_ewma = None
+        self.perda_soma = 0.0
+        self.perda_n = 0
+        self.vazoes = deque(maxlen=JANELA_VAZAO)
+        self.cusum_alta = 0.0
+        self.cusum_baixa = 0.0
+        self.mudancas = deque(maxlen=10)  # (ts, "alta"|"queda", patamar_antes, patamar_depois)
+
+    @staticmethod
+    def _ewma(atual, valor):
+        return valor if atual is None else atual + ALFA * (valor - atual)
+
+    def adicionar(self, ts, metricas):
+        self.n += 1
+        self.primeiro_ts = self.primeiro_ts or ts
+        self.ultimo_ts = ts
+        if "latencia_ms" in metricas:
+            self._latencia(ts, metricas["latencia_ms"])
+        if "jitter_ms" in metricas:
+            self.jitter_ewma = self._ewma(self.jitter_ewma, metricas["jitter_ms"])
+        if "perda_pct" in metricas:
+            self.perda_ewma = self._ewma(self.perda_ewma, metricas["perda_pct"])
+            self.perda_soma += metricas["perda_pct"]
+            self.perda_n += 1
+        if "vazao_mbps" in metricas:
+            self.vazoes.append(metricas["vazao_mbps"])
+
+    def _latencia(self, ts, valor):
+        self.lat_ewma = self._ewma(self.lat_ewma, valor)
+        if self.lat_ref is None:
+            self.lat_ref = valor
+            return
+        # CUSUM bilateral sobre o desvio padronizado em relação ao patamar de referência
+        desvio = max(math.sqrt(self.lat_var), 1.0, 0.05 * self.lat_ref)
+        z = (valor - self.lat_ref) / desvio
+        self.cusum_alta = max(0.0, self.cusum_alta + z - CUSUM_K)
+        self.cusum_baixa = max(0.0, self.cusum_baixa - z - CUSUM_K)
+        if self.cusum_alta > CUSUM_H or self.cusum_baixa > CUSUM_H:
+            sentido = "alta" if self.cusum_alta > CUSUM_H else "queda"
+            self.mudancas.append((ts, sentido, self.lat_ref, valor))
+            self.lat_ref = self.lat_ewma = valor
+            self.cusum_alta = self.cusum_baixa = 0.0
+            return
+        diff = valor - self.lat_ref
+        self.lat_ref += ALFA_REF * diff
+        self.lat_var = (1 - ALFA_REF) * (self.lat_var + ALFA_REF * diff * diff)
+
+    @property
+    def perda_media(self):
+        return self.perda_soma / self.perda_n if self.perda_n else None
+
+    def vazao_percentis(self):
+        return estatistica.percentis(self.vazoes, (10, 50, 90))
+
+    def como_dict(self):
+        d = dict(vars(self))
+        d["vazoes"] = list(self.vazoes)
+        d["mudancas"] = list(self.mudancas)
+        return d
+
+    @classmethod
+    def de_dict(cls, d):
+        t = cls(d["tipo"], d["alvo"])
+        for chave, valor in d.items():
+            setattr(t, chave, valor)
+        t.vazoes = deque(d["vazoes"], maxlen=JANELA_VAZAO)
+        t.mudancas = deque((tuple(m) for m in d["mudancas"]), maxlen=10)
+        return t
+
+
+class Prognostico:
+    def __init__(self, db):
+        self.db = db
+        estado = db.ler_estado(ESTADO) or {}
+        if estado.get("versao") != VERSAO:
+            estado = {}
+        self.ultimo_id = estado.get("ultimo_id", 0)
+        self.tendencias = {tuple(k.split("\x1f", 1)): Tendencia.de_dict(v)
+                           for k, v in estado.get("tendencias", {}).items()}
+
+    def atualizar(self):
+        # Processa só o que entrou depois do último id visto; devolve quantos
+        novos = 0
+        for reg in self.db.iterar(depois_de_id=self.ultimo_id):
+            self.ultimo_id = reg["id"]
+            metricas = extrair_metricas(registro.de_linha(reg))
+            if not metricas:
+                continue
+            chave = (reg["tipo"], reg["alvo"] or "")
+            if chave not in self.tendencias:
+                self.tendencias[chave] = Tendencia(*chave)
+            self.tendencias[chave].adicionar(reg["ts"], metricas)
+            novos += 1
+        if novos or self.ultimo_id:
+            self.salvar()
+        return novos
+
+    def salvar(self):
+        self.db.gravar_estado(ESTADO, {
+            "versao": VERSAO,
+            "ultimo_id": self.ultimo_id,
+            "tendencias": {"\x1f".join(k): t.como_dict() for k, t in self.tendencias.items()},
+        })
+
+    def diagnosticar(self):
+        # [(classe, texto)] com as classes de registro.py
+        achados = []
+        for t in sorted(self.tendencias.values(), key=lambda t: (t.tipo, t.alvo)):
+            nome = f"{t.tipo}" + (f" ({t.alvo})" if t.alvo else "")
+            if t.perda_ewma is not None and t.perda_ewma > 10:
+                achados.append((registro.CRITICO, f"{nome}: alta perda de pacotes ({t.perda_ewma:.1f}% recente)"))
+            if t.lat_ewma is not None and t.lat_ewma > 150:
+                achados.append((registro.CRITICO, f"{nome}: latência excessiva ({t.lat_ewma:.1f} ms recente)"))
+            p50 = t.vazao_percentis()[50]
+            if p50 is not None and p50 < 10:
+                achados.append((registro.ALERTA, f"{nome}: velocidade baixa (mediana {p50:.1f} Mbps)"))
+            if t.mudancas:
+                ts, sentido, antes, depois = t.mudancas[-1]
+                if sentido == "alta":
+                    achados.append((registro.ALERTA,
+                                    f"{nome}: latência mudou de patamar ({antes:.1f} → {depois:.1f} ms)"))
+        return achados
@@ -0,0 +1,247 @@
+# Traceroute nativo com todos os TTLs em paralelo - usado por diagnostico_traceroute
+# Cada sonda usa seu próprio socket com IP_TTL e IP_RECVERR: o ICMP "time exceeded"
+# (ou "unreachable") volta pela fila de erros do socket com o endereço do roteador,
+# então não precisa de root para UDP/TCP. O resultado sai em ~1 RTT + 1 timeout
+# (pelos saltos mudos), em vez de saltos × timeout.
+
+import asyncio
+import errno
+import os
+import socket
+import struct
+import time
+
+import instrumentos
+import sonda
+
+IP_RECVERR = 11
+IPV6_RECVERR = 25
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+ICMP_TIME_EXCEEDED = 11
+ICMP6_TIME_EXCEEDED = 3
+PORTA_BASE_UDP = 33434
+
+SALTO = "salto"         # roteador intermediário (time exceeded)
+DESTINO = "destino"     # o próprio destino respondeu
+INALCANCAVEL = "inalcancavel"  # unreachable vindo de um roteador
+
+
+def _ler_fila_erros(sock, familia):
+    # Devolve (endereco_origem, tipo_icmp, codigo) ou None
+    try:
+        _, anc, _, _ = sock.recvmsg(512, 512, socket.MSG_ERRQUEUE)
+    except (BlockingIOError, InterruptedError):
+        return None
+    for nivel, tipo, dados in anc:
+        if (nivel, tipo) not in ((socket.IPPROTO_IP, IP_RECVERR), (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+            continue
+        _, origem, tipo_icmp, codigo, _, _, _ = struct.unpack_from("=IBBBBII", dados)
+        if origem not in (SO_EE_ORIGIN_ICMP, SO_EE_ORIGIN_ICMP6):
+            continue
+        ofensor = dados[16:]
+        if familia == socket.AF_INET:
+            endereco = socket.inet_ntoa(ofensor[4:8])
+        else:
+            endereco = socket.inet_ntop(socket.AF_INET6, ofensor[8:24])
+        return endereco, tipo_icmp, codigo
+    return None
+
+
+def _classificar_erro(familia, endereco_destino, endereco, tipo_icmp):
+    tempo = ICMP_TIME_EXCEEDED if familia == socket.AF_INET else ICMP6_TIME_EXCEEDED
+    if tipo_icmp == tempo:
+        return SALTO
+    # Port unreachable vindo do próprio destino = chegamos
+    return DESTINO if endereco == endereco_destino else INALCANCAVEL
+
+
+def _abrir_socket(metodo, familia, ttl):
+    if metodo == "icmp":
+        proto = socket.IPPROTO_ICMP if familia == socket.AF_INET else socket.IPPROTO_ICMPV6
+        try:
+            s = socket.socket(familia, socket.SOCK_DGRAM, proto)
+            raw = False
+        except PermissionError:
+            s = socket.socket(familia, socket.SOCK_RAW, proto)
+            raw = True
+    else:
+        s = socket.socket(familia, socket.SOCK_STREAM if metodo == "tcp" else socket.SOCK_DGRAM)
+        raw = False
+    if familia == socket.AF_INET:
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+        s.setsockopt(socket.IPPROTO_IP, IP_RECVERR, 1)
+    else:
+        s.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+        s.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVERR, 1)
+    s.setblocking(False)
+    return s, raw
+
+
+async def _sonda(metodo, familia, endereco, ttl, indice, timeout, porta):
+    # Devolve {"endereco", "rtt_ms", "tipo"} ou None (sem resposta)
+    loop = asyncio.get_running_loop()
+    s, raw = _abrir_socket(metodo, familia, ttl)
+    fut = loop.create_future()
+    ident = os.getpid() & 0xFFFF
+    seq = (ttl << 4) | indice
+    inicio = time.perf_counter()
+    instrumentos.contar("sondas", metodo="rastreio_" + metodo)
+
+    def concluir(resultado):
+        if not fut.done():
+            fut.set_result(resultado)
+
+    def ao_ler():
+        erro = _ler_fila_erros(s, familia)
+        if erro:
+            origem, tipo_icmp, _ = erro
+            concluir((origem, _classificar_erro(familia, endereco, origem, tipo_icmp)))
+            return
+        if metodo == "icmp":
+            try:
+                dados, origem = s.recvfrom(2048)
+            except OSError:
+                return
+            if raw and familia == socket.AF_INET:
+                dados = dados[(dados[0] & 0x0F) * 4:]
+            if len(dados) >= 8:
+                tipo, _, _, r_ident, r_seq = struct.unpack("!BBHHH", dados[:8])
+                if tipo in (sonda.ICMP_ECHO_REPLY, sonda.ICMP6_ECHO_REPLY) and r_seq == seq and \
+                        (not raw or r_ident == ident):
+                    concluir((origem[0], DESTINO))
+        elif metodo == "udp":
+            try:
+                s.recv(2048)
+                concluir((endereco, DESTINO))  # algum serviço respondeu na porta
+            except ConnectionRefusedError:
+                concluir((endereco, DESTINO))
+            except OSError:
+                pass
+
+    def ao_conectar():
+        # TCP: handshake completo ou RST vindo do destino. Dispara uma vez só: o socket
+        # continua gravável e, registrado, chamaria de novo sem parar até o timeout
+        loop.remove_writer(s.fileno())
+        codigo = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if codigo in (0, errno.ECONNREFUSED):
+            concluir((endereco, DESTINO))
+            return
+        ao_ler()
+        if codigo and not fut.done():
+            # Outro erro sem ICMP na fila (ex: sem rota): a sonda termina sem resposta
+            fut.set_exception(OSError(codigo, os.strerror(codigo)))
+
+    loop.add_reader(s.fileno(), ao_ler)
+    try:
+        if metodo == "icmp":
+            pacote = sonda._pacote_eco(familia, ident, seq)
+            s.sendto(pacote, (endereco, 0))
+        elif metodo == "udp":
+            s.sendto(b"elias", (endereco, porta + ttl))
+        else:
+            loop.add_writer(s.fileno(), ao_conectar)
+            try:
+                s.connect((endereco, porta))
+            except BlockingIOError:
+                pass
+        origem, tipo = await asyncio.wait_for(fut, timeout)
+        return {"endereco": origem, "rtt_ms": (time.perf_counter() - inicio) * 1000, "tipo": tipo}
+    except asyncio.TimeoutError:
+        instrumentos.contar("timeouts", origem="rastreio_" + metodo)
+        return None
+    except OSError:
+        return None
+    finally:
+        loop.remove_reader(s.fileno())
+        if metodo == "tcp":
+            loop.remove_writer(s.fileno())
+        s.close()
+
+
+async def _nome_reverso(endereco, timeout=1.0):
+    loop = asyncio.get_running_loop()
+    try:
+        nome, _ = await asyncio.wait_for(loop.getnameinfo((endereco, 0), socket.NI_NAMEREQD), timeout)
+        return nome
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def rastrear(destino, metodo="udp", max_saltos=30, sondas=3, timeout=2.0, porta=None,
+                   nomes=True, ao_salto=None):
+    # ao_salto(ttl, sondas) é chamado quando todas as sondas de um TTL terminam
+    loop = asyncio.get_running_loop()
+    inicio = time.perf_counter()
+    infos = await loop.getaddrinfo(destino, None, type=socket.SOCK_DGRAM)
+    familia, endereco = infos[0][0], infos[0][4][0]
+    porta = porta or (PORTA_BASE_UDP if metodo == "udp" else 80)
+
+    hops = {ttl: [None] * sondas for ttl in range(1, max_saltos + 1)}
+    tarefas = {}
+    ttl_destino = [max_saltos + 1]
+
+    async def _executar(ttl, i):
+        res = await _sonda(metodo, familia, endereco, ttl, i, timeout, porta)
+        hops[ttl][i] = res
+        if res and res["tipo"] in (DESTINO, INALCANCAVEL) and ttl < ttl_destino[0]:
+            ttl_destino[0] = ttl
+            # Sondas além do destino não acrescentam nada: cancela
+            for (t, _), tarefa in tarefas.items():
+                if t > ttl:
+                    tarefa.cancel()
+        if ao_salto and all(tarefas[(ttl, j)].done() or j == i for j in range(sondas)):
+            ao_salto(ttl, hops[ttl])
+
+    for ttl in range(1, max_saltos + 1):
+        if ttl > ttl_destino[0]:
+            break
+        for i in range(sondas):
+            tarefas[(ttl, i)] = asyncio.ensure_future(_executar(ttl, i))
+        # Ordem crescente de TTL: o destino limita a taxa de ICMP por origem,
+        # então os primeiros TTLs que chegam lá precisam ser respondidos primeiro
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*tarefas.values(), return_exceptions=True)
+
+    ultimo = min(ttl_destino[0], max_saltos)
+    resultado = []
+    for ttl in range(1, ultimo + 1):
+        respostas = [r for r in hops[ttl] if r]
+        enderecos = list(dict.fromkeys(r["endereco"] for r in respostas))
+        resultado.append({
+            "ttl": ttl,
+            "enderecos": enderecos,
+            "rtts_ms": [r["rtt_ms"] if r else None for r in hops[ttl]],
+            "destino": any(r["tipo"] == DESTINO for r in respostas),
+            "inalcancavel": any(r["tipo"] == INALCANCAVEL for r in respostas),
+        })
+    if nomes:
+        todos = list(dict.fromkeys(e for h in resultado for e in h["enderecos"]))
+        reversos = dict(zip(todos, await asyncio.gather(*(_nome_reverso(e) for e in todos))))
+        for h in resultado:
+            h["nomes"] = [reversos.get(e) for e in h["enderecos"]]
+    return {
+        "destino": destino, "endereco": endereco, "metodo": metodo,
+        "alcancado": bool(resultado and resultado[-1]["destino"]),
+        "hops": resultado,
+        "duracao_s": time.perf_counter() - inicio,
+    }
+
+
+def traceroute(destino, **kwargs):
+    return asyncio.run(rastrear(destino, **kwargs))
+
+
+def formatar(resultado):
+    linhas = [f"traceroute para {resultado['destino']} ({resultado['endereco']}), "
+              f"{resultado['metodo'].upper()}, {len(resultado['hops'])} saltos"]
+    for h in resultado["hops"]:
+        rtts = "  ".join(f"{r:.2f} ms" if r is not None else "*" for r in h["rtts_ms"])
+        if h["enderecos"]:
+            nomes = h.get("nomes") or [None] * len(h["enderecos"])
+            quem = ", ".join(f"{n} ({e})" if n else e for e, n in zip(h["enderecos"], nomes))
+        else:
+            quem = "*"
+        extra = " !H" if h["inalcancavel"] else ""
+        linhas.append(f"{h['ttl']:>2}  {quem}  {rtts}{extra}")
+    return "\n".join(linhas)
@@ -0,0 +1,263 @@
+# Registros tipados de resultado - o que cada diagnóstico produz em vez de texto com markup
+# Um Resultado tem medidas numéricas (valor + unidade + limites de alerta/crítico),
+# achados classificados, causas/sugestões, a saída bruta de comandos (texto puro) e os
+# dados estruturados do teste. A tela (elias), o armazém e o prognóstico leem daqui;
+# ninguém mais precisa procurar números com regex no texto.
+#
+# Esquema versionado: como_dict() grava "v": ESQUEMA. Registros sem "v" (logs antigos
+# {"output": texto} e resumos antigos do monitor/wifi) são convertidos por carregar() - é o
+# único lugar que ainda lê texto. JSON compacto com orjson quando instalado.
+
+import json
+import re
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ESQUEMA = 1
+
+OK, ALERTA, CRITICO, INFO = "ok", "alerta", "critico", "info"
+GRAVIDADE = {INFO: 0, OK: 1, ALERTA: 2, CRITICO: 3}
+ICONES = {OK: "✅", ALERTA: "🟡", CRITICO: "🔴", INFO: "ℹ️"}
+
+# unidade -> (grandeza, fator para a unidade base da grandeza)
+UNIDADES = {
+    "s": ("tempo", 1.0), "ms": ("tempo", 1e-3), "us": ("tempo", 1e-6),
+    "bps": ("taxa", 1.0), "kbps": ("taxa", 1e3), "Mbps": ("taxa", 1e6), "Gbps": ("taxa", 1e9),
+    "B": ("tamanho", 1.0), "KiB": ("tamanho", 1024.0), "MiB": ("tamanho", 2.0 ** 20),
+    "%": ("fracao", 0.01),
+}
+
+
+def converter(valor, de, para):
+    if de == para or valor is None:
+        return valor
+    g1, f1 = UNIDADES[de]
+    g2, f2 = UNIDADES[para]
+    if g1 != g2:
+        raise ValueError(f"Unidades incompatíveis: {de} -> {para}")
+    return valor * f1 / f2
+
+
+class Medida:
+    # maior_pior=True: passar de `alerta`/`critico` é ruim (latência); False: ficar abaixo (vazão)
+    __slots__ = ("nome", "valor", "unidade", "rotulo", "alerta", "critico", "maior_pior", "casas")
+
+    def __init__(self, nome, valor, unidade="", rotulo=None, alerta=None, critico=None, maior_pior=True,
+                 casas=2):
+        self.nome = nome
+        self.valor = valor
+        self.unidade = unidade
+        self.rotulo = rotulo or nome
+        self.alerta = alerta
+        self.critico = critico
+        self.maior_pior = maior_pior
+        self.casas = casas
+
+    @property
+    def classe(self):
+        if self.valor is None:
+            return INFO
+        if self.alerta is None and self.critico is None:
+            return INFO
+        passou = (lambda limite: limite is not None and
+                  (self.valor > limite if self.maior_pior else self.valor < limite))
+        if passou(self.critico):
+            return CRITICO
+        if passou(self.alerta):
+            return ALERTA
+        return OK
+
+    def formatar(self):
+        if self.valor is None:
+            return "-"
+        if isinstance(self.valor, float):
+            texto = f"{self.valor:.{self.casas}f}"
+        else:
+            texto = str(self.valor)
+        return f"{texto} {self.unidade}".rstrip() if self.unidade != "%" else f"{texto}%"
+
+    def como_lista(self):
+        # [nome, valor, unidade, rotulo, alerta, critico, maior_pior, casas] - compacto no disco
+        return [self.nome, self.valor, self.unidade, self.rotulo if self.rotulo != self.nome else None,
+                self.alerta, self.critico, self.maior_pior, self.casas]
+
+    @classmethod
+    def de_lista(cls, lista):
+        return cls(*lista)
+
+
+class Resultado:
+    __slots__ = ("tipo", "titulo", "alvo", "interface", "ts", "medidas", "achados", "causas",
+                 "solucoes", "classificacao", "texto", "detalhes", "versao")
+
+    def __init__(self, tipo, titulo=None, alvo=None, interface=None, texto="", detalhes=None, ts=None):
+        self.tipo = tipo
+        self.titulo = titulo or tipo
+        self.alvo = alvo
+        self.interface = interface
+        self.ts = ts or time.time()
+        self.medidas = []
+        self.achados = []        # [(classe, texto)]
+        self.causas = []
+        self.solucoes = []
+        self.classificacao = None
+        self.texto = texto       # saída bruta de comando, texto puro (sem markup)
+        self.detalhes = detalhes or {}
+        self.versao = ESQUEMA
+
+    def medir(self, nome, valor, unidade="", rotulo=None, alerta=None, critico=None, maior_pior=True,
+              casas=2):
+        medida = Medida(nome, valor, unidade, rotulo, alerta, critico, maior_pior, casas)
+        self.medidas.append(medida)
+        return medida
+
+    def achar(self, classe, texto, causa=None, solucao=None):
+        self.achados.append((classe, texto))
+        if causa:
+            self.causas.append(causa)
+        if solucao:
+            self.solucoes.append(solucao)
+
+    def medida(self, nome):
+        for m in self.medidas:
+            if m.nome == nome:
+                return m
+        return None
+
+    def valor(self, nome, unidade=None):
+        m = self.medida(nome)
+        if m is None or m.valor is None:
+            return None
+        return converter(m.valor, m.unidade, unidade) if unidade else m.valor
+
+    @property
+    def classe(self):
+        # A pior classe entre medidas e achados
+        classes = [m.classe for m in self.medidas] + [c for c, _ in self.achados]
+        return max(classes, key=GRAVIDADE.__getitem__, default=INFO)
+
+    # ---------- serialização ----------
+
+    def como_dict(self):
+        d = {"v": self.versao, "tipo": self.tipo, "titulo": self.titulo, "ts": self.ts,
+             "classe": self.classe}
+        for chave in ("alvo", "interface", "classificacao", "texto"):
+            valor = getattr(self, chave)
+            if valor:
+                d[chave] = valor
+        if self.medidas:
+            d["medidas"] = [m.como_lista() for m in self.medidas]
+        for chave in ("achados", "causas", "solucoes"):
+            valor = getattr(self, chave)
+            if valor:
+                d[chave] = [list(a) for a in valor] if chave == "achados" else list(valor)
+        if self.detalhes:
+            d["detalhes"] = self.detalhes
+        return d
+
+    def json(self):
+        return dumps(self.como_dict())
+
+    @classmethod
+    def de_dict(cls, d):
+        r = cls(d["tipo"], d.get("titulo"), d.get("alvo"), d.get("interface"), d.get("texto", ""),
+                d.get("detalhes"), d.get("ts"))
+        r.versao = d.get("v", ESQUEMA)
+        r.medidas = [Medida.de_lista(m) for m in d.get("medidas", ())]
+        r.achados = [tuple(a) for a in d.get("achados", ())]
+        r.causas = list(d.get("causas", ()))
+        r.solucoes = list(d.get("solucoes", ()))
+        r.classificacao = d.get("classificacao")
+        return r
+
+    def texto_plano(self):
+        # Versão texto puro do que a tela mostra (exportação, relatórios)
+        linhas = []
+        if self.alvo:
+            linhas.append(f"Alvo: {self.alvo}")
+        for m in self.medidas:
+            marca = f" {ICONES[m.classe]}" if m.classe in (ALERTA, CRITICO) else ""
+            linhas.append(f"{m.rotulo}: {m.formatar()}{marca}")
+        if self.texto:
+            linhas.append(self.texto)
+        if self.classificacao:
+            linhas.append(f"\nClassificação: {self.classificacao}")
+        for titulo, itens in (("Problemas identificados", [f"{ICONES[c]} {t}" for c, t in self.achados]),
+                              ("Possíveis causas", self.causas), ("Sugestões de solução", self.solucoes)):
+            if itens:
+                linhas.append(f"\n{titulo}:\n- " + "\n- ".join(itens))
+        return "\n".join(linhas).strip()
+
+
+def dumps(obj):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            pass  # tipo que o orjson não conhece (ex: inteiro acima de 64 bits)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(texto):
+    return orjson.loads(texto) if orjson is not None else json.loads(texto)
+
+
+# ---------- registros antigos (sem "v") ----------
+
+# Textos gravados antes dos registros tipados
+RE_LATENCIA = re.compile(r"Latência(?: média)?:(?:\[/bold\])?\s*(\d+(?:\.\d+)?)\s*ms")
+RE_PERDA = re.compile(r"(\d+(?:\.\d+)?)% packet loss|Perda de [Pp]acotes:(?:\[/bold\])?\s*(\d+(?:\.\d+)?)\s*%")
+RE_JITTER = re.compile(r"Jitter(?: estimado)?:(?:\[/bold\])?\s*(\d+(?:\.\d+)?)\s*ms")
+RE_VAZAO = re.compile(r"(?:Velocidade média|Download):(?:\[/bold\])?\s*(\d+(?:\.\d+)?)\s*Mbps")
+RE_MARKUP = re.compile(r"\[/?[a-z][a-z ]*\]")
+
+# campo numérico dos dicionários antigos -> (medida, unidade)
+CAMPOS_LEGADOS = {
+    "rtt_media_ms": ("latencia", "ms"),
+    "perda_pct": ("perda", "%"),
+    "jitter_ms": ("jitter", "ms"),
+    "vazao_mbps": ("vazao", "Mbps"),
+}
+
+
+def _de_legado(dados, tipo, titulo, alvo, interface, ts):
+    dados = dict(dados)
+    texto = dados.pop("output", "") or ""
+    r = Resultado(tipo or "resultado", titulo, alvo, interface, RE_MARKUP.sub("", texto), dados, ts)
+    r.versao = 0
+    for campo, (nome, unidade) in CAMPOS_LEGADOS.items():
+        if dados.get(campo) is not None:
+            r.medir(nome, dados[campo], unidade)
+    if texto:
+        for nome, unidade, regex in (("latencia", "ms", RE_LATENCIA), ("jitter", "ms", RE_JITTER),
+                                     ("vazao", "Mbps", RE_VAZAO)):
+            if r.medida(nome) is None:
+                achado = regex.search(texto)
+                if achado:
+                    r.medir(nome, float(achado.group(1)), unidade)
+        if r.medida("perda") is None:
+            achado = RE_PERDA.search(texto)
+            if achado:
+                r.medir("perda", float(achado.group(1) or achado.group(2)), "%")
+    return r
+
+
+def carregar(dados, tipo=None, titulo=None, alvo=None, interface=None, ts=None):
+    # dados: dict do armazém (ou texto JSON); os demais vêm das colunas, para registros antigos
+    if isinstance(dados, (str, bytes)):
+        dados = loads(dados)
+    versao = dados.get("v")
+    if versao is None:
+        return _de_legado(dados, tipo, titulo, alvo, interface, ts)
+    if versao > ESQUEMA:
+        raise ValueError(f"Registro com esquema {versao} mais novo que o suportado ({ESQUEMA})")
+    return Resultado.de_dict(dados)
+
+
+def de_linha(item):
+    # Linha do armazém ({id, ts, tipo, titulo, alvo, interface, site, dados}) -> Resultado
+    return carregar(item["dados"], item["tipo"], item["titulo"], item["alvo"], item["interface"], item["ts"])
@@ -0,0 +1,289 @@
+# Benchmark de DNS nativo - consultas UDP cruas (TCP quando a resposta vem truncada)
+# Consulta os resolvedores do sistema e uma lista de públicos/do provedor em paralelo
+# e compara latência (p50/p90/p99), falhas e NXDOMAIN de cada um.
+# ServidorStub responde localmente para testes sem internet.
+
+import asyncio
+import random
+import socket
+import struct
+import time
+
+import estatistica
+import instrumentos
+
+TIPO_A = 1
+TIPO_CNAME = 5
+TIPO_AAAA = 28
+RCODE = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 4: "NOTIMP", 5: "REFUSED"}
+
+PUBLICOS = {
+    "Google": "8.8.8.8",
+    "Cloudflare": "1.1.1.1",
+    "Quad9": "9.9.9.9",
+    "OpenDNS": "208.67.222.222",
+}
+
+NOMES_PADRAO = ["google.com", "youtube.com", "facebook.com", "whatsapp.net",
+                "instagram.com", "netflix.com", "globo.com", "gov.br"]
+
+
+class ErroDNS(Exception):
+    pass
+
+
+def resolvedores_sistema(caminho="/etc/resolv.conf"):
+    servidores = []
+    try:
+        with open(caminho) as f:
+            for linha in f:
+                partes = linha.split()
+                if len(partes) >= 2 and partes[0] == "nameserver":
+                    servidores.append(partes[1])
+    except OSError:
+        pass
+    return servidores
+
+
+def _codificar_nome(nome):
+    partes = [p for p in nome.rstrip(".").split(".") if p]
+    return b"".join(bytes([len(p)]) + p.encode("idna") for p in partes) + b"\0"
+
+
+def montar_consulta(nome, tipo=TIPO_A, ident=None):
+    ident = random.getrandbits(16) if ident is None else ident
+    cabecalho = struct.pack("!HHHHHH", ident, 0x0100, 1, 0, 0, 0)  # RD=1
+    return cabecalho + _codificar_nome(nome) + struct.pack("!HH", tipo, 1)
+
+
+def _ler_nome(dados, pos):
+    partes = []
+    saltos = 0
+    fim = None
+    while True:
+        tam = dados[pos]
+        if tam & 0xC0 == 0xC0:
+            if fim is None:
+                fim = pos + 2
+            pos = ((tam & 0x3F) << 8) | dados[pos + 1]
+            saltos += 1
+            if saltos > 20:
+                raise ErroDNS("Ponteiro de compressão em laço")
+            continue
+        if tam == 0:
+            pos += 1
+            break
+        partes.append(dados[pos + 1:pos + 1 + tam].decode("latin-1"))
+        pos += 1 + tam
+    return ".".join(partes), (fim if fim is not None else pos)
+
+
+def interpretar_resposta(dados, ident=None):
+    if len(dados) < 12:
+        raise ErroDNS("Resposta curta demais")
+    rid, flags, qd, an, _, _ = struct.unpack("!HHHHHH", dados[:12])
+    if ident is not None and rid != ident:
+        raise ErroDNS("ID da resposta não confere")
+    pos = 12
+    for _ in range(qd):
+        _, pos = _ler_nome(dados, pos)
+        pos += 4
+    respostas = []
+    for _ in range(an):
+        nome, pos = _ler_nome(dados, pos)
+        tipo, _, ttl, tam = struct.unpack("!HHIH", dados[pos:pos + 10])
+        pos += 10
+        rdata = dados[pos:pos + tam]
+        if tipo == TIPO_A and tam == 4:
+            valor = socket.inet_ntoa(rdata)
+        elif tipo == TIPO_AAAA and tam == 16:
+            valor = socket.inet_ntop(socket.AF_INET6, rdata)
+        elif tipo == TIPO_CNAME:
+            valor = _ler_nome(dados, pos)[0]
+        else:
+            valor = rdata.hex()
+        respostas.append({"nome": nome, "tipo": tipo, "ttl": ttl, "valor": valor})
+        pos += tam
+    return {"id": rid, "truncada": bool(flags & 0x0200), "rcode": RCODE.get(flags & 0xF, str(flags & 0xF)),
+            "respostas": respostas}
+
+
+async def _consulta_udp(servidor, porta, pacote, timeout):
+    loop = asyncio.get_running_loop()
+    familia = socket.AF_INET6 if ":" in servidor else socket.AF_INET
+    with socket.socket(familia, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        s.connect((servidor, porta))
+        await loop.sock_sendall(s, pacote)
+        ident = pacote[:2]
+        fim = loop.time() + timeout
+        while True:
+            dados = await asyncio.wait_for(loop.sock_recv(s, 4096), max(0.0, fim - loop.time()))
+            if dados[:2] == ident:  # ignora respostas atrasadas/forjadas
+                return dados
+
+
+async def _consulta_tcp(servidor, porta, pacote, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(servidor, porta), timeout)
+    try:
+        writer.write(struct.pack("!H", len(pacote)) + pacote)
+        await writer.drain()
+        tam = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), timeout))[0]
+        return await asyncio.wait_for(reader.readexactly(tam), timeout)
+    finally:
+        writer.close()
+
+
+async def consultar(servidor, nome, tipo=TIPO_A, timeout=2.0, porta=53):
+    # Devolve {rcode, respostas, tempo_ms, tcp} ou {erro, tempo_ms}
+    pacote = montar_consulta(nome, tipo)
+    ident = struct.unpack("!H", pacote[:2])[0]
+    inicio = time.perf_counter()
+    tcp = False
+    instrumentos.contar("sondas", metodo="dns")
+    try:
+        dados = await _consulta_udp(servidor, porta, pacote, timeout)
+        resposta = interpretar_resposta(dados, ident)
+        if resposta["truncada"]:
+            tcp = True
+            dados = await _consulta_tcp(servidor, porta, pacote, timeout)
+            resposta = interpretar_resposta(dados, ident)
+    except asyncio.TimeoutError:
+        instrumentos.contar("timeouts", origem="dns")
+        return {"erro": "timeout", "tempo_ms": (time.perf_counter() - inicio) * 1000}
+    except (OSError, ErroDNS, IndexError, struct.error, asyncio.IncompleteReadError) as e:
+        return {"erro": str(e) or type(e).__name__, "tempo_ms": (time.perf_counter() - inicio) * 1000}
+    resposta["tempo_ms"] = (time.perf_counter() - inicio) * 1000
+    resposta["tcp"] = tcp
+    return resposta
+
+
+def _resumir(nome, servidor, resultados):
+    tempos = [r["tempo_ms"] for r in resultados if "erro" not in r and r["rcode"] in ("NOERROR", "NXDOMAIN")]
+    falhas = sum(1 for r in resultados if "erro" in r or r["rcode"] not in ("NOERROR", "NXDOMAIN"))
+    nx = sum(1 for r in resultados if r.get("rcode") == "NXDOMAIN")
+    total = len(resultados) or 1
+    pct = estatistica.percentis(tempos)
+    return {
+        "nome": nome, "servidor": servidor, "consultas": len(resultados),
+        "p50_ms": pct[50], "p90_ms": pct[90], "p99_ms": pct[99],
+        "falha_pct": 100.0 * falhas / total, "nxdomain_pct": 100.0 * nx / total,
+        "tcp": sum(1 for r in resultados if r.get("tcp")),
+    }
+
+
+def recomendar(resumos):
+    # Menor p90 entre os que quase não falham; empate decidido pelo p50
+    candidatos = [r for r in resumos if r["p90_ms"] is not None and r["falha_pct"] < 5]
+    if not candidatos:
+        return None
+    return min(candidatos, key=lambda r: (r["p90_ms"], r["p50_ms"]))
+
+
+async def benchmark(servidores, nomes=None, repeticoes=3, timeout=2.0, concorrencia=8, porta=53):
+    # servidores: {"rótulo": "ip"}; cada rótulo recebe repeticoes × len(nomes) consultas
+    nomes = nomes or NOMES_PADRAO
+    inicio = time.perf_counter()
+
+    async def _servidor(rotulo, ip):
+        sem = asyncio.Semaphore(concorrencia)
+
+        async def _uma(nome):
+            async with sem:
+                return await consultar(ip, nome, timeout=timeout, porta=porta)
+
+        resultados = []
+        # A primeira rodada tende a não estar em cache; as seguintes medem o cache do resolvedor
+        for _ in range(repeticoes):
+            resultados += await asyncio.gather(*(_uma(n) for n in nomes))
+        return _resumir(rotulo, ip, resultados)
+
+    resumos = await asyncio.gather(*(_servidor(r, ip) for r, ip in servidores.items()))
+    melhor = recomendar(resumos)
+    return {"resolvedores": list(resumos), "recomendado": melhor["nome"] if melhor else None,
+            "duracao_s": time.perf_counter() - inicio}
+
+
+def servidores_padrao(extras=None, publicos=True):
+    servidores = {f"Sistema ({ip})": ip for ip in resolvedores_sistema()}
+    if publicos:
+        servidores.update(PUBLICOS)
+    servidores.update(extras or {})
+    return servidores
+
+
+def executar_benchmark(servidores=None, **kwargs):
+    return asyncio.run(benchmark(servidores or servidores_padrao(), **kwargs))
+
+
+class ServidorStub:
+    # Servidor DNS mínimo para testes offline (UDP e TCP no mesmo endereço).
+    # registros: {"nome": "ip"}; nomes em `truncar` respondem com TC=1 via UDP.
+    def __init__(self, registros, host="127.0.0.1", porta=0, atraso=0.0, truncar=()):
+        self.registros = {k.rstrip(".").lower(): v for k, v in registros.items()}
+        self.host = host
+        self.porta = porta
+        self.atraso = atraso
+        self.truncar = {n.rstrip(".").lower() for n in truncar}
+        self._transporte = None
+        self._servidor_tcp = None
+
+    def responder(self, consulta, via_tcp=False):
+        ident, _, _, _, _, _ = struct.unpack("!HHHHHH", consulta[:12])
+        nome, pos = _ler_nome(consulta, 12)
+        pergunta = consulta[12:pos + 4]
+        tipo = struct.unpack("!H", consulta[pos:pos + 2])[0]
+        ip = self.registros.get(nome.lower())
+        if nome.lower() in self.truncar and not via_tcp:
+            return struct.pack("!HHHHHH", ident, 0x8380, 1, 0, 0, 0) + pergunta
+        if ip is None:
+            return struct.pack("!HHHHHH", ident, 0x8183, 1, 0, 0, 0) + pergunta
+        if tipo != TIPO_A:
+            return struct.pack("!HHHHHH", ident, 0x8180, 1, 0, 0, 0) + pergunta
+        registro = b"\xc0\x0c" + struct.pack("!HHIH", TIPO_A, 1, 60, 4) + socket.inet_aton(ip)
+        return struct.pack("!HHHHHH", ident, 0x8180, 1, 1, 0, 0) + pergunta + registro
+
+    async def iniciar(self):
+        loop = asyncio.get_running_loop()
+        stub = self
+
+        class _UDP(asyncio.DatagramProtocol):
+            def connection_made(self, transporte):
+                self.transporte = transporte
+
+            def datagram_received(self, dados, origem):
+                resposta = stub.responder(dados)
+                if stub.atraso:
+                    loop.call_later(stub.atraso, self.transporte.sendto, resposta, origem)
+                else:
+                    self.transporte.sendto(resposta, origem)
+
+        async def _tcp(reader, writer):
+            try:
+                tam = struct.unpack("!H", await reader.readexactly(2))[0]
+                resposta = self.responder(await reader.readexactly(tam), via_tcp=True)
+                writer.write(struct.pack("!H", len(resposta)) + resposta)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, OSError):
+                pass
+            finally:
+                writer.close()
+
+        # Porta 0: a livre em UDP pode estar ocupada em TCP; sorteia outra e tenta de novo
+        pedida = self.porta
+        for tentativa in range(10):
+            self._transporte, _ = await loop.create_datagram_endpoint(_UDP, local_addr=(self.host, pedida))
+            self.porta = self._transporte.get_extra_info("sockname")[1]
+            try:
+                self._servidor_tcp = await asyncio.start_server(_tcp, self.host, self.porta)
+                return self
+            except OSError:
+                self._transporte.close()
+                if pedida or tentativa == 9:
+                    raise
+
+    def parar(self):
+        if self._transporte:
+            self._transporte.close()
+        if self._servidor_tcp:
+            self._servidor_tcp.close()
@@ -0,0 +1,447 @@
+# Retenção e arquivamento do log_rede - o elias.db guarda só os resultados recentes
+# Resultados com mais de `dias_ativos` dias saem do SQLite para segmentos comprimidos
+# em log_rede/arquivo/ (gzip; zstd se o pacote zstandard estiver instalado). Cada
+# segmento é uma sequência de blocos comprimidos independentes (~256 KiB de JSON por
+# bloco) seguida de um índice: faixa de ids e datas, tipos e posição de cada bloco.
+# A leitura mapeia o arquivo (mmap), lê o índice do rodapé e descomprime só os blocos
+# que podem conter o que foi pedido. Depois valem os limites de idade e de tamanho
+# da pasta (fora o elias.db): sai primeiro o mais velho entre segmentos, saídas de
+# comandos, traces e perfis.
+#
+# Uso: python retencao.py [--pasta log_rede] [--aplicar] [--listar] [--ler ID]
+# Sem --aplicar só mostra o que seria arquivado e apagado (--simular, o padrão).
+
+import argparse
+import bisect
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+import registro
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGICA = b"ELSG"
+VERSAO = 1
+RODAPE = struct.Struct("<QI4s")  # posição do índice, tamanho do índice, mágica
+TAMANHO_BLOCO = 256 * 1024
+PASTA_ARQUIVO = "arquivo"
+DIA = 86400
+
+POLITICA_PADRAO = {
+    "dias_ativos": 30,       # no elias.db
+    "dias_arquivo": 365,     # nos segmentos
+    "dias_saidas": 14,       # saidas/*.log, traces/, perfil_*.pstats
+    "max_mb": 200,           # pasta fora o elias.db (que a retenção nunca apaga)
+    "compressao": "auto",    # auto = zstd se disponível, senão gzip
+    "intervalo_h": 24,       # manutenção automática no máximo 1x por intervalo
+}
+
+COLUNAS = ("id", "ts", "tipo", "titulo", "alvo", "interface", "site", "dados")
+
+
+# ---------- compressão ----------
+
+def _gzip(dados):
+    c = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: membro gzip completo
+    return c.compress(dados) + c.flush()
+
+
+def _gunzip(dados):
+    return zlib.decompress(dados, 31)
+
+
+def _zstd(dados):
+    return zstandard.ZstdCompressor(level=6).compress(dados)
+
+
+def _unzstd(dados):
+    return zstandard.ZstdDecompressor().decompress(dados)
+
+
+COMPRESSORES = {"gzip": (_gzip, _gunzip, ".seg.gz"), "zstd": (_zstd, _unzstd, ".seg.zst")}
+
+
+def escolher_compressao(nome="auto"):
+    if nome == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if nome == "zstd" and zstandard is None:
+        raise ValueError("Compressão zstd pede o pacote zstandard (pip install zstandard)")
+    if nome not in COMPRESSORES:
+        raise ValueError(f"Compressão desconhecida: {nome}")
+    return nome
+
+
+# ---------- escrita ----------
+
+def linha_segmento(linha):
+    # Linha crua do SQLite (colunas + dados já em JSON) -> linha do segmento, sem
+    # decodificar e recodificar a coluna dados
+    return (registro.dumps(list(linha[:-1]))[:-1] + "," + linha[-1] + "]\n").encode()
+
+
+def escrever_segmento(pasta, linhas, compressao="auto", tamanho_bloco=TAMANHO_BLOCO):
+    # linhas: tuplas cruas na ordem de COLUNAS, em ordem de id. Grava num temporário e
+    # renomeia: quem lê nunca vê um segmento pela metade. Devolve o caminho (ou None).
+    compressao = escolher_compressao(compressao)
+    comprimir, _, extensao = COMPRESSORES[compressao]
+    os.makedirs(pasta, exist_ok=True)
+    temporario = os.path.join(pasta, f".gravando-{os.getpid()}{extensao}")
+    try:
+        caminho = _gravar(temporario, linhas, comprimir, compressao, tamanho_bloco, extensao)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+    if caminho is None:
+        os.unlink(temporario)
+        return None
+    caminho = os.path.join(pasta, caminho)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def _gravar(temporario, linhas, comprimir, compressao, tamanho_bloco, extensao):
+    # Devolve o nome final do segmento (ou None se não havia linhas)
+    blocos, buffer, atual = [], [], None
+    posicao = 0
+    with open(temporario, "wb") as f:
+        def _fechar_bloco():
+            nonlocal posicao
+            dados = comprimir(b"".join(buffer))
+            f.write(dados)
+            atual["pos"], atual["tam"] = posicao, len(dados)
+            atual["tipos"] = sorted(atual["tipos"])
+            blocos.append(atual)
+            posicao += len(dados)
+
+        tamanho = 0
+        for linha in linhas:
+            if atual is None:
+                atual = {"id0": linha[0], "id1": linha[0], "ts0": linha[1], "ts1": linha[1], "n": 0, "tipos": set()}
+                buffer, tamanho = [], 0
+            bruto = linha_segmento(linha)
+            buffer.append(bruto)
+            tamanho += len(bruto)
+            atual["id1"] = linha[0]
+            atual["ts0"] = min(atual["ts0"], linha[1])
+            atual["ts1"] = max(atual["ts1"], linha[1])
+            atual["n"] += 1
+            atual["tipos"].add(linha[2])
+            if tamanho >= tamanho_bloco:
+                _fechar_bloco()
+                atual = None
+        if atual is not None:
+            _fechar_bloco()
+        if not blocos:
+            return None
+        indice = registro.dumps({"v": VERSAO, "compressao": compressao, "blocos": blocos,
+                                 "n": sum(b["n"] for b in blocos)}).encode()
+        f.write(indice)
+        f.write(RODAPE.pack(posicao, len(indice), MAGICA))
+        f.flush()
+        os.fsync(f.fileno())
+    return f"resultados_{blocos[0]['id0']:010d}-{blocos[-1]['id1']:010d}{extensao}"
+
+
+# ---------- leitura ----------
+
+class Segmento:
+    # Leitura por mmap: só o rodapé, o índice e os blocos pedidos saem do disco
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._arquivo = open(caminho, "rb")
+        try:
+            self._mapa = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._arquivo.close()
+            raise ValueError(f"Segmento vazio: {caminho}")
+        if len(self._mapa) < RODAPE.size:
+            self.fechar()
+            raise ValueError(f"Segmento truncado: {caminho}")
+        pos, tam, magica = RODAPE.unpack(self._mapa[-RODAPE.size:])
+        if magica != MAGICA:
+            self.fechar()
+            raise ValueError(f"Não é um segmento do elias: {caminho}")
+        indice = registro.loads(self._mapa[pos:pos + tam])
+        if indice["v"] > VERSAO:
+            self.fechar()
+            raise ValueError(f"Segmento com versão {indice['v']} mais nova que a suportada ({VERSAO})")
+        self.compressao = indice["compressao"]
+        self.blocos = indice["blocos"]
+        self.n = indice["n"]
+        self._ids = [b["id0"] for b in self.blocos]
+        self._cache = (None, None)  # último bloco lido (leituras em sequência)
+
+    @property
+    def id0(self):
+        return self.blocos[0]["id0"]
+
+    @property
+    def id1(self):
+        return self.blocos[-1]["id1"]
+
+    @property
+    def ts0(self):
+        return min(b["ts0"] for b in self.blocos)
+
+    @property
+    def ts1(self):
+        return max(b["ts1"] for b in self.blocos)
+
+    def ler_bloco(self, i):
+        if self._cache[0] == i:
+            return self._cache[1]
+        b = self.blocos[i]
+        dados = COMPRESSORES[self.compressao][1](self._mapa[b["pos"]:b["pos"] + b["tam"]])
+        itens = [dict(zip(COLUNAS, registro.loads(linha))) for linha in dados.splitlines()]
+        self._cache = (i, itens)
+        return itens
+
+    def obter(self, id_):
+        i = bisect.bisect_right(self._ids, id_) - 1
+        if i < 0 or id_ > self.blocos[i]["id1"]:
+            return None
+        return next((item for item in self.ler_bloco(i) if item["id"] == id_), None)
+
+    def iterar(self, tipo=None, desde=None, ate=None, reverso=False):
+        # Pula os blocos cujo índice já descarta o filtro (tipo ou faixa de datas)
+        ordem = range(len(self.blocos) - 1, -1, -1) if reverso else range(len(self.blocos))
+        for i in ordem:
+            b = self.blocos[i]
+            if tipo is not None and tipo not in b["tipos"]:
+                continue
+            if (desde is not None and b["ts1"] < desde) or (ate is not None and b["ts0"] > ate):
+                continue
+            itens = self.ler_bloco(i)
+            yield from (reversed(itens) if reverso else itens)
+
+    @property
+    def tamanho(self):
+        return len(self._mapa)
+
+    def fechar(self):
+        self._mapa.close()
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class Arquivo:
+    # Todos os segmentos de uma pasta, em ordem de id; abertos sob demanda
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self._abertos = {}
+
+    def caminhos(self):
+        try:
+            nomes = os.listdir(self.pasta)
+        except OSError:
+            return []
+        extensoes = tuple(e for _, _, e in COMPRESSORES.values())
+        return [os.path.join(self.pasta, n) for n in sorted(nomes)
+                if n.startswith("resultados_") and n.endswith(extensoes)]
+
+    def segmento(self, caminho):
+        if caminho not in self._abertos:
+            self._abertos[caminho] = Segmento(caminho)
+        return self._abertos[caminho]
+
+    def segmentos(self, reverso=False):
+        caminhos = self.caminhos()
+        for caminho in (reversed(caminhos) if reverso else caminhos):
+            try:
+                yield self.segmento(caminho)
+            except (OSError, ValueError):
+                continue  # segmento danificado não derruba a consulta
+
+    def obter(self, id_):
+        for seg in self.segmentos():
+            if seg.id0 <= id_ <= seg.id1:
+                return seg.obter(id_)
+        return None
+
+    def consultar(self, tipo=None, alvo=None, interface=None, site=None, desde=None, ate=None, limite=None,
+                  recentes_primeiro=True):
+        # Mesmos filtros de Armazem.consultar; ids crescem com o tempo, então
+        # "mais recentes primeiro" = segmentos e blocos de trás para a frente
+        itens = []
+        for seg in self.segmentos(reverso=recentes_primeiro):
+            if (desde is not None and seg.ts1 < desde) or (ate is not None and seg.ts0 > ate):
+                continue
+            for item in seg.iterar(tipo, desde, ate, reverso=recentes_primeiro):
+                if ((tipo is not None and item["tipo"] != tipo) or (alvo is not None and item["alvo"] != alvo) or
+                        (interface is not None and item["interface"] != interface) or
+                        (site is not None and item["site"] != site) or
+                        (desde is not None and item["ts"] < desde) or (ate is not None and item["ts"] > ate)):
+                    continue
+                itens.append(item)
+                if limite and len(itens) >= limite:
+                    return itens
+        return itens
+
+    def fechar(self):
+        for seg in self._abertos.values():
+            seg.fechar()
+        self._abertos.clear()
+
+    def esquecer(self, caminho):
+        seg = self._abertos.pop(caminho, None)
+        if seg:
+            seg.fechar()
+
+
+# ---------- retenção ----------
+
+def _arquivos_descartaveis(pasta):
+    # (idade de referência, caminho, tamanho) do que a retenção pode apagar, fora os segmentos
+    candidatos = []
+    for raiz, sub in ((os.path.join(pasta, "saidas"), None), (os.path.join(pasta, "traces"), None), (pasta, "perfil_")):
+        try:
+            nomes = os.listdir(raiz)
+        except OSError:
+            continue
+        for nome in nomes:
+            if sub and not (nome.startswith(sub) and nome.endswith(".pstats")):
+                continue
+            caminho = os.path.join(raiz, nome)
+            try:
+                st = os.stat(caminho)
+            except OSError:
+                continue
+            if os.path.isfile(caminho):
+                candidatos.append((st.st_mtime, caminho, st.st_size))
+    return candidatos
+
+
+def tamanho_pasta(pasta):
+    total = 0
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in nomes:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+
+def aplicar(db, politica=None, agora=None, simular=False):
+    # Arquiva o que passou de dias_ativos, apaga o que passou das idades e, se a pasta
+    # ainda estiver acima de max_mb, o mais velho primeiro. Devolve o relatório.
+    p = dict(POLITICA_PADRAO, **(politica or {}))
+    agora = agora or time.time()
+    pasta = os.path.dirname(db.caminho) or "."
+    arquivo = db.arquivo()
+    rel = {"arquivados": 0, "segmento": None, "removidos": [], "liberados_bytes": 0}
+
+    if simular:
+        rel["arquivados"] = db.contar(ate=agora - p["dias_ativos"] * DIA)
+    else:
+        rel["arquivados"], rel["segmento"] = db.arquivar(agora - p["dias_ativos"] * DIA, p["compressao"])
+        if rel["arquivados"]:
+            db.compactar()
+
+    def _remover(caminho, tamanho):
+        if not simular:
+            arquivo.esquecer(caminho)
+            try:
+                os.unlink(caminho)
+            except OSError:
+                return
+        rel["removidos"].append(caminho)
+        rel["liberados_bytes"] += tamanho
+
+    # .json/.txt do save_log antigo: apagados só depois de guardados no banco (sem
+    # duplicar); os que não puderam ser lidos ficam onde estão
+    for caminho in db.importar_legado(pasta, simular=simular):
+        for c in (caminho, caminho[:-len(".json")] + ".txt"):
+            if os.path.exists(c):
+                _remover(c, os.path.getsize(c))
+
+    # (idade, caminho, tamanho): segmentos pela data do resultado mais novo, o resto pelo mtime
+    candidatos = [(seg.ts1, seg.caminho, seg.tamanho) for seg in arquivo.segmentos()]
+    for ts, caminho, tamanho in list(candidatos):
+        if ts < agora - p["dias_arquivo"] * DIA:
+            _remover(caminho, tamanho)
+    outros = _arquivos_descartaveis(pasta)
+    for ts, caminho, tamanho in outros:
+        if ts < agora - p["dias_saidas"] * DIA:
+            _remover(caminho, tamanho)
+
+    # O banco (e o WAL) não entra na conta: não pode ser apagado, e contá-lo faria um
+    # banco grande levar embora todo o arquivo
+    banco = sum(os.path.getsize(c) for c in (db.caminho, db.caminho + "-wal", db.caminho + "-shm")
+                if os.path.exists(c))
+    total = tamanho_pasta(pasta) - banco - (rel["liberados_bytes"] if simular else 0)
+    limite = p["max_mb"] * 2 ** 20
+    for ts, caminho, tamanho in sorted(c for c in candidatos + outros if c[1] not in rel["removidos"]):
+        if total <= limite:
+            break
+        _remover(caminho, tamanho)
+        total -= tamanho
+    rel["tamanho_mb"] = (total + banco) / 2 ** 20
+    return rel
+
+
+def formatar(rel):
+    linhas = [f"{rel['arquivados']} resultado(s) arquivado(s)" + (f" em {rel['segmento']}" if rel["segmento"] else ""),
+              f"{len(rel['removidos'])} arquivo(s) removido(s), {rel['liberados_bytes'] / 2 ** 20:.1f} MiB liberados",
+              f"log_rede ocupa {rel['tamanho_mb']:.1f} MiB"]
+    return "\n".join(linhas + [f"  - {c}" for c in rel["removidos"]])
+
+
+def main(argv=None):
+    import armazem
+    parser = argparse.ArgumentParser(description="Retenção e arquivamento do log_rede")
+    parser.add_argument("--pasta", default=armazem.DIR_PADRAO)
+    parser.add_argument("--dias-ativos", type=int, default=POLITICA_PADRAO["dias_ativos"],
+                        help="resultados mais novos que isso ficam no elias.db")
+    parser.add_argument("--dias-arquivo", type=int, default=POLITICA_PADRAO["dias_arquivo"])
+    parser.add_argument("--dias-saidas", type=int, default=POLITICA_PADRAO["dias_saidas"])
+    parser.add_argument("--max-mb", type=float, default=POLITICA_PADRAO["max_mb"])
+    parser.add_argument("--compressao", choices=["auto", "gzip", "zstd"], default="auto")
+    parser.add_argument("--simular", dest="aplicar", action="store_false", default=False,
+                        help="só mostra o que seria feito (padrão)")
+    parser.add_argument("--aplicar", action="store_true", help="arquiva e apaga de fato")
+    parser.add_argument("--listar", action="store_true", help="lista os segmentos")
+    parser.add_argument("--ler", type=int, metavar="ID", help="mostra um resultado arquivado")
+    args = parser.parse_args(argv)
+
+    db = armazem.Armazem(os.path.join(args.pasta, armazem.ARQUIVO_PADRAO))
+    try:
+        if args.listar:
+            for seg in db.arquivo().segmentos():
+                print(f"{os.path.basename(seg.caminho)}  {seg.n:6d} resultados  {len(seg.blocos):3d} blocos  "
+                      f"{seg.tamanho / 1024:8.1f} KiB  {time.strftime('%Y-%m-%d', time.localtime(seg.ts0))} a "
+                      f"{time.strftime('%Y-%m-%d', time.localtime(seg.ts1))}")
+            return 0
+        if args.ler is not None:
+            item = db.obter(args.ler)
+            if item is None:
+                print(f"Resultado {args.ler} não encontrado", file=sys.stderr)
+                return 1
+            print(registro.de_linha(item).texto_plano())
+            return 0
+        politica = {"dias_ativos": args.dias_ativos, "dias_arquivo": args.dias_arquivo,
+                    "dias_saidas": args.dias_saidas, "max_mb": args.max_mb, "compressao": args.compressao}
+        rel = aplicar(db, politica, simular=not args.aplicar)
+        if args.aplicar:
+            db.gravar_estado("retencao", {"ts": time.time()})
+        print(("" if args.aplicar else "[simulação] ") + formatar(rel))
+        return 0
+    finally:
+        db.fechar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+# Motor de ping nativo - substitui o parse do texto de `ping -c 10`
+# Sonda vários alvos ao mesmo tempo num único event loop, com estatísticas ao vivo.
+# Métodos: ICMP (socket datagrama sem root, ou raw como root), UDP (porta fechada
+# responde com ICMP port unreachable) e TCP connect (SYN-ACK ou RST contam como resposta).
+
+import asyncio
+import errno
+import math
+import os
+import socket
+import struct
+import time
+from collections import deque
+
+import estatistica
+import instrumentos
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+ICMP_DEST_UNREACH = 3
+ICMP_FRAG_NEEDED = 4
+ICMP6_PACKET_TOO_BIG = 2
+
+# Valores de <linux/in.h> / <linux/in6.h> (nem todos expostos pelo módulo socket)
+IP_MTU_DISCOVER = 10
+IP_PMTUDISC_DO = 2
+IPV6_MTU_DISCOVER = 23
+IPV6_PMTUDISC_DO = 2
+
+PORTA_PADRAO = {"tcp": 53, "udp": 33434}
+JANELA_DUPLICADOS = 1024  # últimos seq respondidos lembrados para contar duplicatas
+
+
+class PacoteGrande(Exception):
+    # Eco com DF que não passa: EMSGSIZE local ou ICMP "fragmentation needed"
+    def __init__(self, mtu=None):
+        super().__init__(f"Pacote maior que o MTU do caminho ({mtu or '?'})")
+        self.mtu = mtu
+
+
+class EstatisticasRTT:
+    # Agregados em streaming: nada de guardar a lista de tempos
+    def __init__(self, alvo=""):
+        self.alvo = alvo
+        self.metodo = None
+        self.erro = None
+        self.enviados = 0
+        self.recebidos = 0
+        self.perdidos = 0
+        self.minimo = None
+        self.maximo = None
+        self.media = 0.0
+        self._m2 = 0.0
+        self._jitter = estatistica.Jitter()
+        self.rajadas = estatistica.Rajadas()
+        self.esboco = estatistica.Esboco()
+        self.reordenados = 0
+        self.duplicados = 0
+        self._maior_seq = -1
+        self._respondidos = set()
+        self._ordem = deque()
+
+    def registrar_envio(self, seq):
+        self.enviados += 1
+
+    def registrar_resposta(self, seq, rtt_ms):
+        if seq in self._respondidos:
+            self.duplicados += 1
+            return
+        self._respondidos.add(seq)
+        self._ordem.append(seq)
+        if len(self._ordem) > JANELA_DUPLICADOS:
+            self._respondidos.discard(self._ordem.popleft())
+        self.recebidos += 1
+        if seq < self._maior_seq:
+            self.reordenados += 1
+        else:
+            self._maior_seq = seq
+        self.minimo = rtt_ms if self.minimo is None else min(self.minimo, rtt_ms)
+        self.maximo = rtt_ms if self.maximo is None else max(self.maximo, rtt_ms)
+        # Média/variância de Welford
+        delta = rtt_ms - self.media
+        self.media += delta / self.recebidos
+        self._m2 += delta * (rtt_ms - self.media)
+        self._jitter.adicionar(rtt_ms)
+        self.rajadas.registrar(False)
+        self.esboco.adicionar(rtt_ms)
+
+    def registrar_perda(self, seq):
+        self.perdidos += 1
+        self.rajadas.registrar(True)
+
+    @property
+    def jitter(self):
+        # RFC 3550, na ordem de chegada
+        return self._jitter.valor
+
+    @property
+    def concluidos(self):
+        return self.recebidos + self.perdidos
+
+    @property
+    def perda_pct(self):
+        return 100.0 * self.perdidos / self.concluidos if self.concluidos else 0.0
+
+    @property
+    def desvio(self):
+        return math.sqrt(self._m2 / (self.recebidos - 1)) if self.recebidos > 1 else 0.0
+
+    @property
+    def r_fator(self):
+        return estatistica.r_fator(self.media, self.jitter, self.perda_pct) if self.recebidos else 0.0
+
+    @property
+    def mos(self):
+        return estatistica.mos(self.r_fator) if self.recebidos else None
+
+    def resumo(self):
+        return {
+            "alvo": self.alvo,
+            "metodo": self.metodo,
+            "enviados": self.enviados,
+            "recebidos": self.recebidos,
+            "perda_pct": round(self.perda_pct, 2),
+            "rtt_min_ms": self.minimo,
+            "rtt_media_ms": self.media if self.recebidos else None,
+            "rtt_max_ms": self.maximo,
+            "desvio_ms": self.desvio,
+            "jitter_ms": self.jitter,
+            "p50_ms": self.esboco.quantil(0.5),
+            "p90_ms": self.esboco.quantil(0.9),
+            "p99_ms": self.esboco.quantil(0.99),
+            "r_fator": self.r_fator,
+            "mos": self.mos,
+            "rajadas_perda": self.rajadas.resumo(),
+            "reordenados": self.reordenados,
+            "duplicados": self.duplicados,
+        }
+
+
+def resultado_claro(st, minimo=5):
+    # Critério de parada antecipada: após `minimo` respostas/perdas, o alvo está
+    # claramente fora do ar, ou está sem perda e com RTT estável.
+    if st.concluidos < minimo:
+        return False
+    if st.recebidos == 0:
+        return True
+    return st.perdidos == 0 and st.desvio <= max(1.0, 0.1 * st.media)
+
+
+def _checksum(dados):
+    if len(dados) % 2:
+        dados += b"\0"
+    soma = sum(struct.unpack(f"!{len(dados) // 2}H", dados))
+    soma = (soma >> 16) + (soma & 0xFFFF)
+    soma += soma >> 16
+    return ~soma & 0xFFFF
+
+
+def _pacote_eco(familia, ident, seq, tamanho=56):
+    tipo = ICMP_ECHO_REQUEST if familia == socket.AF_INET else ICMP6_ECHO_REQUEST
+    payload = (b"elias" * (tamanho // 5 + 1))[:tamanho]
+    cabecalho = struct.pack("!BBHHH", tipo, 0, 0, ident, seq)
+    # ICMPv6: o kernel calcula o checksum (depende do pseudo-cabeçalho)
+    soma = _checksum(cabecalho + payload) if familia == socket.AF_INET else 0
+    return struct.pack("!BBHHH", tipo, 0, soma, ident, seq) + payload
+
+
+class CanalICMP:
+    # Um socket por família compartilhado por todos os alvos. Cada eco recebe um
+    # seq próprio do canal (alvos diferentes podem resolver para o mesmo endereço)
+    # e as respostas são despachadas por seq para a corrotina que está esperando.
+    # Com df=True os ecos saem sem fragmentação e eco() levanta PacoteGrande.
+    def __init__(self, familia=socket.AF_INET, df=False):
+        self.familia = familia
+        self.df = df
+        proto = socket.IPPROTO_ICMP if familia == socket.AF_INET else socket.IPPROTO_ICMPV6
+        try:
+            self.sock = socket.socket(familia, socket.SOCK_DGRAM, proto)
+            self.raw = False
+        except PermissionError:
+            # Sem net.ipv4.ping_group_range: só funciona como root
+            self.sock = socket.socket(familia, socket.SOCK_RAW, proto)
+            self.raw = True
+        if df:
+            if familia == socket.AF_INET:
+                self.sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+            else:
+                self.sock.setsockopt(socket.IPPROTO_IPV6, IPV6_MTU_DISCOVER, IPV6_PMTUDISC_DO)
+        self.sock.setblocking(False)
+        self.ident = os.getpid() & 0xFFFF
+        self._esperando = {}
+        self._seq = 0
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self.sock.fileno(), self._ao_ler)
+
+    def _ao_ler(self):
+        while True:
+            try:
+                dados, origem = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            agora = time.perf_counter()
+            if self.raw and self.familia == socket.AF_INET:
+                dados = dados[(dados[0] & 0x0F) * 4:]
+            if len(dados) < 8:
+                continue
+            tipo, codigo, _, ident, seq = struct.unpack("!BBHHH", dados[:8])
+            if self.raw and self.df and self._frag_necessaria(tipo, codigo, dados):
+                continue
+            if tipo not in (ICMP_ECHO_REPLY, ICMP6_ECHO_REPLY):
+                continue
+            if self.raw and ident != self.ident:
+                continue
+            espera = self._esperando.get(seq)
+            if espera and espera[0] == origem[0] and not espera[1].done():
+                espera[1].set_result(agora)
+
+    def _frag_necessaria(self, tipo, codigo, dados):
+        # Socket raw recebe o próprio ICMP de erro, com o cabeçalho original embutido.
+        # Sockets datagrama não: lá o kernel só atualiza o PMTU e o próximo envio
+        # falha com EMSGSIZE.
+        if self.familia == socket.AF_INET:
+            if (tipo, codigo) != (ICMP_DEST_UNREACH, ICMP_FRAG_NEEDED):
+                return False
+            mtu = struct.unpack("!H", dados[6:8])[0]
+            interno = dados[8:]
+            if len(interno) < 20:
+                return True
+            interno = interno[(interno[0] & 0x0F) * 4:]
+            destino = socket.inet_ntoa(dados[8 + 16:8 + 20])
+        else:
+            if tipo != ICMP6_PACKET_TOO_BIG:
+                return False
+            mtu = struct.unpack("!I", dados[4:8])[0]
+            interno = dados[8 + 40:]
+            destino = socket.inet_ntop(socket.AF_INET6, dados[8 + 24:8 + 40])
+        if len(interno) < 8:
+            return True
+        _, _, _, ident, seq = struct.unpack("!BBHHH", interno[:8])
+        espera = self._esperando.get(seq)
+        if ident == self.ident and espera and espera[0] == destino and not espera[1].done():
+            espera[1].set_exception(PacoteGrande(mtu or None))
+        return True
+
+    async def eco(self, endereco, timeout, tamanho=56):
+        seq = self._seq = (self._seq + 1) & 0xFFFF
+        fut = self._loop.create_future()
+        self._esperando[seq] = (endereco, fut)
+        pacote = _pacote_eco(self.familia, self.ident, seq, tamanho)
+        inicio = time.perf_counter()
+        try:
+            await self._loop.sock_sendto(self.sock, pacote, (endereco, 0))
+            chegada = await asyncio.wait_for(fut, timeout)
+        except OSError as e:
+            if self.df and e.errno == errno.EMSGSIZE:
+                raise PacoteGrande() from e
+            return None
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._esperando.pop(seq, None)
+        return (chegada - inicio) * 1000
+
+    def fechar(self):
+        self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+async def eco_udp(endereco, porta, timeout, familia=socket.AF_INET):
+    loop = asyncio.get_running_loop()
+    with socket.socket(familia, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        inicio = time.perf_counter()
+        try:
+            s.connect((endereco, porta))
+            await loop.sock_sendall(s, b"elias")
+            await asyncio.wait_for(loop.sock_recv(s, 1024), timeout)
+        except ConnectionRefusedError:
+            pass  # ICMP port unreachable: o alvo respondeu
+        except (asyncio.TimeoutError, OSError):
+            return None
+        return (time.perf_counter() - inicio) * 1000
+
+
+async def eco_tcp(endereco, porta, timeout):
+    inicio = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(endereco, porta), timeout)
+    except ConnectionRefusedError:
+        return (time.perf_counter() - inicio) * 1000  # RST também é resposta
+    except (asyncio.TimeoutError, OSError):
+        return None
+    rtt = (time.perf_counter() - inicio) * 1000
+    writer.close()
+    return rtt
+
+
+def icmp_disponivel(familia=socket.AF_INET):
+    proto = socket.IPPROTO_ICMP if familia == socket.AF_INET else socket.IPPROTO_ICMPV6
+    for tipo in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+        try:
+            socket.socket(familia, tipo, proto).close()
+            return True
+        except OSError:
+            continue
+    return False
+
+
+async def _resolver(alvo):
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(alvo, None, type=socket.SOCK_DGRAM)
+    familia, _, _, _, sockaddr = infos[0]
+    return familia, sockaddr[0]
+
+
+async def sondar(alvos, contagem=10, intervalo=0.2, timeout=1.0, metodo="auto", porta=None,
+                 tamanho=56, ao_atualizar=None, parar_quando=None):
+    # contagem=None sonda até parar_quando() devolver True (ou a tarefa ser cancelada).
+    # ao_atualizar(stats) é chamado a cada resposta/perda.
+    alvos = list(dict.fromkeys(alvos))
+    stats = {a: EstatisticasRTT(a) for a in alvos}
+    resolvidos = {}
+    for alvo in alvos:
+        try:
+            resolvidos[alvo] = await _resolver(alvo)
+        except (socket.gaierror, OSError):
+            stats[alvo].erro = "Não foi possível resolver o destino"
+
+    if metodo == "auto":
+        metodo = "icmp" if icmp_disponivel() else "tcp"
+    porta = porta or PORTA_PADRAO.get(metodo)
+    canais = {}
+
+    def _eco(familia, endereco):
+        if metodo == "icmp":
+            if familia not in canais:
+                canais[familia] = CanalICMP(familia)
+            return canais[familia].eco(endereco, timeout, tamanho)
+        if metodo == "udp":
+            return eco_udp(endereco, porta, timeout, familia)
+        return eco_tcp(endereco, porta, timeout)
+
+    async def _sonda(alvo, seq, familia, endereco):
+        st = stats[alvo]
+        rtt = await _eco(familia, endereco)
+        instrumentos.contar("sondas", metodo=metodo)
+        if rtt is None:
+            instrumentos.contar("timeouts", origem=metodo)
+            st.registrar_perda(seq)
+        else:
+            st.registrar_resposta(seq, rtt)
+        if ao_atualizar:
+            ao_atualizar(st)
+
+    async def _alvo(alvo):
+        familia, endereco = resolvidos[alvo]
+        st = stats[alvo]
+        pendentes = set()
+        seq = 0
+        proximo = time.perf_counter()
+        while contagem is None or seq < contagem:
+            if parar_quando and parar_quando(st):
+                break
+            st.registrar_envio(seq)
+            tarefa = asyncio.ensure_future(_sonda(alvo, seq, familia, endereco))
+            pendentes.add(tarefa)
+            tarefa.add_done_callback(pendentes.discard)
+            seq += 1
+            # Intervalo fixo a partir do relógio, sem acumular atraso
+            proximo += intervalo
+            await asyncio.sleep(max(0.0, proximo - time.perf_counter()))
+        if pendentes:
+            await asyncio.gather(*pendentes)
+
+    try:
+        await asyncio.gather(*(_alvo(a) for a in alvos if a in resolvidos))
+    finally:
+        for canal in canais.values():
+            canal.fechar()
+    for st in stats.values():
+        st.metodo = metodo
+    return stats
+
+
+def pingar(alvos, **kwargs):
+    return asyncio.run(sondar(alvos, **kwargs))
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import descoberta
+
+# Trechos reais do oui.txt do IEEE e do nmap-mac-prefixes
+IEEE = """OUI/MA-L                                                    Organization
+company_id                                                  Organization
+                                                            Address
+
+00-22-72   (hex)\t\tAmerican Micro-Fuel Device Corp.
+002272     (base 16)\t\tAmerican Micro-Fuel Device Corp.
+\t\t\t\t2181 Buchanan Loop
+\t\t\t\tFerndale  WA  98248
+\t\t\t\tUS
+
+00-D0-EF   (hex)\t\tIGT
+00D0EF     (base 16)\t\tIGT
+\t\t\t\t9295 PROTOTYPE DRIVE
+\t\t\t\tRENO  NV  89511
+\t\t\t\tUS
+"""
+
+NMAP = """# $Id$ generated with make-mac-prefixes.pl
+000000 Xerox
+000001 Xerox
+00000C Cisco
+"""
+
+
+class CompilarOuiTeste(unittest.TestCase):
+    def compilar(self, conteudo, nome):
+        temporaria = tempfile.TemporaryDirectory()
+        self.addCleanup(temporaria.cleanup)
+        pasta = temporaria.name
+        origem = os.path.join(pasta, nome)
+        destino = os.path.join(pasta, "indice.txt")
+        with open(origem, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        n = descoberta.compilar_oui(origem, destino)
+        self.addCleanup(setattr, descoberta, "_oui", None)
+        return n, descoberta._carregar_oui(destino)
+
+    def test_ieee(self):
+        n, oui = self.compilar(IEEE, "oui.txt")
+        self.assertEqual(n, 2)
+        self.assertEqual(oui, {"002272": "American Micro-Fuel Device Corp.", "00D0EF": "IGT"})
+
+    def test_nmap(self):
+        n, oui = self.compilar(NMAP, "nmap-mac-prefixes")
+        self.assertEqual(n, 3)
+        self.assertEqual(oui["00000C"], "Cisco")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import armazem
+import retencao
+
+
+class AplicarTeste(unittest.TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.db = armazem.Armazem(os.path.join(pasta.name, armazem.ARQUIVO_PADRAO))
+        self.addCleanup(self.db.fechar)
+        self.agora = time.time()
+
+    def preencher(self, n, ts):
+        for i in range(n):
+            self.db.registrar("ping", {"saida": os.urandom(1024).hex()}, alvo=f"10.0.0.{i % 250}", ts=ts)
+        self.db.flush()
+
+    def test_banco_acima_do_limite_nao_apaga_o_arquivo(self):
+        self.preencher(50, self.agora - 40 * retencao.DIA)
+        self.preencher(300, self.agora)
+        politica = {"max_mb": 0.1}
+        rel = retencao.aplicar(self.db, politica, agora=self.agora)
+        self.assertEqual(rel["arquivados"], 50)
+        self.assertGreater(os.path.getsize(self.db.caminho), politica["max_mb"] * 2 ** 20)
+        self.assertEqual(rel["removidos"], [])
+        self.assertTrue(os.path.exists(rel["segmento"]))
+        self.assertEqual(len(list(self.db.arquivo().segmentos())), 1)
+
+    def test_limite_apaga_o_segmento_mais_velho(self):
+        self.preencher(50, self.agora - 60 * retencao.DIA)
+        retencao.aplicar(self.db, {"dias_ativos": 50}, agora=self.agora)
+        self.preencher(50, self.agora - 40 * retencao.DIA)
+        self.preencher(1, self.agora)
+        rel = retencao.aplicar(self.db, {"max_mb": 0.08}, agora=self.agora)
+        self.assertEqual(len(rel["removidos"]), 1)
+        self.assertTrue(os.path.exists(rel["segmento"]))
+        self.assertNotIn(rel["segmento"], rel["removidos"])
+
+
+if __name__ == "__main__":
+    unittest.main()
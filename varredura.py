@@ -0,0 +1,136 @@
+# Varredura de portas assíncrona - usada por diagnostico_portas
+# Testa várias portas/hosts ao mesmo tempo com limite de concorrência
+
+import asyncio
+import errno
+import socket
+import time
+
+import instrumentos
+
+ABERTA = "aberta"
+FECHADA = "fechada"
+FILTRADA = "filtrada"
+
+# Erros que indicam que algo no caminho descartou/rejeitou o SYN (ICMP unreachable)
+ERROS_FILTRADA = {errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EACCES, errno.EPERM}
+
+
+def parse_portas(texto):
+    # "1-1024,8080" -> [1, 2, ..., 1024, 8080]
+    portas = set()
+    for parte in texto.replace(" ", "").split(","):
+        if not parte:
+            continue
+        if "-" in parte:
+            ini, fim = parte.split("-", 1)
+            ini, fim = int(ini), int(fim)
+            if ini > fim:
+                ini, fim = fim, ini
+        else:
+            ini = fim = int(parte)
+        if ini < 1 or fim > 65535:
+            raise ValueError(f"Porta fora do intervalo 1-65535: {parte}")
+        portas.update(range(ini, fim + 1))
+    if not portas:
+        raise ValueError("Nenhuma porta informada")
+    return sorted(portas)
+
+
+def parse_hosts(texto):
+    return [h for h in texto.replace(",", " ").split() if h]
+
+
+async def _resolver(host):
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        return None
+    return infos[0][4][0] if infos else None
+
+
+async def _ler_banner(reader, writer, timeout):
+    try:
+        dados = await asyncio.wait_for(reader.read(256), timeout)
+    except (asyncio.TimeoutError, OSError):
+        dados = b""
+    if not dados:
+        # Serviços que esperam o cliente falar primeiro (HTTP, por exemplo)
+        try:
+            writer.write(b"HEAD / HTTP/1.0\r\n\r\n")
+            await writer.drain()
+            dados = await asyncio.wait_for(reader.read(256), timeout)
+        except (asyncio.TimeoutError, OSError):
+            dados = b""
+    texto = dados.decode("latin-1", errors="replace").strip()
+    return texto.splitlines()[0][:120] if texto else ""
+
+
+async def sondar_porta(host, endereco, porta, timeout=1.5, banner=False, banner_timeout=1.0):
+    inicio = time.perf_counter()
+    resultado = {"host": host, "endereco": endereco, "porta": porta,
+                 "estado": FILTRADA, "latencia_ms": None, "banner": ""}
+    instrumentos.contar("sondas", metodo="tcp_porta")
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(endereco, porta), timeout)
+    except asyncio.TimeoutError:
+        instrumentos.contar("timeouts", origem="tcp_porta")
+        return resultado
+    except ConnectionRefusedError:
+        resultado["estado"] = FECHADA
+        resultado["latencia_ms"] = (time.perf_counter() - inicio) * 1000
+        return resultado
+    except OSError as e:
+        resultado["estado"] = FILTRADA if e.errno in ERROS_FILTRADA else FECHADA
+        return resultado
+
+    resultado["estado"] = ABERTA
+    resultado["latencia_ms"] = (time.perf_counter() - inicio) * 1000
+    try:
+        if banner:
+            resultado["banner"] = await _ler_banner(reader, writer, banner_timeout)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    return resultado
+
+
+async def varrer(hosts, portas, concorrencia=200, timeout=1.5, banner=False, ao_resultado=None):
+    # ao_resultado(res) é chamado a cada porta concluída (para progresso ao vivo)
+    inicio = time.perf_counter()
+    sem = asyncio.Semaphore(concorrencia)
+    enderecos = dict(zip(hosts, await asyncio.gather(*(_resolver(h) for h in hosts))))
+    nao_resolvidos = [h for h, e in enderecos.items() if e is None]
+
+    async def _tarefa(host, porta):
+        async with sem:
+            return await sondar_porta(host, enderecos[host], porta, timeout, banner)
+
+    tarefas = [asyncio.ensure_future(_tarefa(h, p))
+               for h in hosts if enderecos[h] for p in portas]
+    resultados = []
+    for fut in asyncio.as_completed(tarefas):
+        res = await fut
+        resultados.append(res)
+        if ao_resultado:
+            ao_resultado(res)
+
+    ordem = {h: i for i, h in enumerate(hosts)}
+    resultados.sort(key=lambda r: (ordem[r["host"]], r["porta"]))
+    duracao = time.perf_counter() - inicio
+    return {
+        "resultados": resultados,
+        "nao_resolvidos": nao_resolvidos,
+        "duracao_s": duracao,
+        "portas_por_segundo": len(resultados) / duracao if duracao > 0 else 0.0,
+        "resumo": {estado: sum(1 for r in resultados if r["estado"] == estado)
+                   for estado in (ABERTA, FECHADA, FILTRADA)},
+    }
+
+
+def varrer_portas(hosts, portas, **kwargs):
+    return asyncio.run(varrer(hosts, portas, **kwargs))
@@ -0,0 +1,266 @@
+# Teste de vazão HTTP com vários fluxos - usado por test_download_speed
+# N conexões persistentes (keep-alive) em paralelo, cada uma pedindo o arquivo de
+# novo ao terminar; o corpo é descartado com recv_into num buffer reaproveitado.
+# A cada `intervalo` segundos registra a vazão somada; os primeiros `aquecimento`
+# segundos (slow start do TCP) ficam fora da média.
+#
+# ServidorLocal serve bytes a partir da memória (e descarta uploads) para testes sem internet.
+
+import socket
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import instrumentos
+
+ALVOS_PADRAO = [
+    ("Hetzner (Alemanha) 100MB", "https://nbg1-speed.hetzner.com/100MB.bin"),
+    ("Hetzner (Finlândia) 100MB", "https://hel1-speed.hetzner.com/100MB.bin"),
+    ("OVH (França) 100MB", "http://proof.ovh.net/files/100Mb.dat"),
+]
+
+TAMANHO_BUFFER = 256 * 1024
+
+
+class _Fluxo(threading.Thread):
+    # Uma conexão (refeita só quando o servidor fecha) baixando a URL em laço
+    def __init__(self, url, parar, timeout, buffer):
+        super().__init__(daemon=True)
+        self.url = url
+        self.partes = urlsplit(url)
+        self.parar = parar
+        self.timeout = timeout
+        self.buf = bytearray(buffer)
+        self.visao = memoryview(self.buf)
+        self.bytes = 0
+        self.conexoes = 0
+        self.requisicoes = 0
+        self.ttfb_ms = []
+        self.erro = None
+        self.sock = None
+
+    def _conectar(self):
+        https = self.partes.scheme == "https"
+        porta = self.partes.port or (443 if https else 80)
+        s = socket.create_connection((self.partes.hostname, porta), self.timeout)
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if https:
+            s = ssl.create_default_context().wrap_socket(s, server_hostname=self.partes.hostname)
+        self.sock = s
+        self.conexoes += 1
+
+    def _fechar(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _cabecalhos(self):
+        # Lê até o fim dos cabeçalhos; devolve (status, headers, bytes de corpo já lidos)
+        dados = b""
+        while b"\r\n\r\n" not in dados:
+            n = self.sock.recv_into(self.visao)
+            if not n:
+                raise ConnectionError("Conexão fechada antes da resposta")
+            dados += self.visao[:n]
+            if b"\r\n\r\n" not in dados and len(dados) > 65536:
+                raise ValueError("Cabeçalho HTTP grande demais")
+        cabecalho, _, resto = dados.partition(b"\r\n\r\n")
+        linhas = cabecalho.decode("latin-1").split("\r\n")
+        status = int(linhas[0].split()[1])
+        headers = {}
+        for linha in linhas[1:]:
+            k, _, v = linha.partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return status, headers, len(resto)
+
+    def _requisicao(self):
+        caminho = self.partes.path or "/"
+        if self.partes.query:
+            caminho += "?" + self.partes.query
+        pedido = (f"GET {caminho} HTTP/1.1\r\nHost: {self.partes.netloc}\r\n"
+                  f"User-Agent: elias-vazao\r\nAccept-Encoding: identity\r\n\r\n").encode()
+        inicio = time.perf_counter()
+        self.sock.sendall(pedido)
+        status, headers, ja_lidos = self._cabecalhos()
+        self.ttfb_ms.append((time.perf_counter() - inicio) * 1000)
+        self.requisicoes += 1
+        if status >= 400:
+            raise ValueError(f"HTTP {status}")
+        self.bytes += ja_lidos
+        tamanho = headers.get("content-length")
+        restante = int(tamanho) - ja_lidos if tamanho is not None else None
+        recv_into = self.sock.recv_into
+        visao = self.visao
+        while not self.parar.is_set() and (restante is None or restante > 0):
+            n = recv_into(visao)
+            if not n:
+                restante = None
+                break
+            self.bytes += n
+            if restante is not None:
+                restante -= n
+        # Sem Content-Length (ou fechada pelo servidor): a conexão não é reaproveitável
+        if restante is None or headers.get("connection", "").lower() == "close":
+            self._fechar()
+
+    def run(self):
+        try:
+            while not self.parar.is_set():
+                if self.sock is None:
+                    self._conectar()
+                self._requisicao()
+        except (OSError, ValueError, IndexError) as e:
+            if not self.parar.is_set():
+                self.erro = str(e) or type(e).__name__
+        finally:
+            self._fechar()
+
+
+def medir(urls, fluxos=4, duracao=10.0, aquecimento=2.0, intervalo=1.0, timeout=5.0,
+          buffer=TAMANHO_BUFFER, ao_intervalo=None):
+    # urls: lista de URLs; os fluxos são distribuídos entre elas em rodízio.
+    # ao_intervalo(t, mbps, aquecendo) é chamado a cada intervalo.
+    if isinstance(urls, str):
+        urls = [urls]
+    parar = threading.Event()
+    trabalhadores = [_Fluxo(urls[i % len(urls)], parar, timeout, buffer) for i in range(fluxos)]
+    inicio = time.perf_counter()
+    for t in trabalhadores:
+        t.start()
+
+    intervalos = []
+    anterior, t_anterior = 0, inicio
+    bytes_aquecimento, t_medicao = None, None
+    fim = inicio + round(aquecimento / intervalo) * intervalo + duracao
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim or not any(t.is_alive() for t in trabalhadores):
+            break
+        time.sleep(min(intervalo, fim - agora))
+        agora = time.perf_counter()
+        total = sum(t.bytes for t in trabalhadores)
+        mbps = (total - anterior) * 8 / ((agora - t_anterior) * 1e6)
+        aquecendo = len(intervalos) < round(aquecimento / intervalo)
+        if not aquecendo and bytes_aquecimento is None:
+            # Primeira amostra depois do aquecimento: a medição começa no fim do anterior
+            bytes_aquecimento, t_medicao = anterior, t_anterior
+        intervalos.append({"t": round(agora - inicio, 2), "mbps": mbps, "aquecimento": aquecendo})
+        if ao_intervalo:
+            ao_intervalo(agora - inicio, mbps, aquecendo)
+        anterior, t_anterior = total, agora
+
+    parar.set()
+    for t in trabalhadores:
+        # Desbloqueia recv pendente sem esperar o timeout
+        if t.sock:
+            try:
+                t.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        t.join(timeout)
+
+    if bytes_aquecimento is None:
+        bytes_aquecimento, t_medicao = 0, inicio
+    medidos = anterior - bytes_aquecimento
+    tempo = t_anterior - t_medicao
+    validos = [i["mbps"] for i in intervalos if not i["aquecimento"]]
+    instrumentos.contar("bytes", sum(t.bytes for t in trabalhadores), origem="vazao", sentido="rx")
+    ttfb = sorted(x for t in trabalhadores for x in t.ttfb_ms)
+    return {
+        "urls": list(urls),
+        "fluxos": fluxos,
+        "duracao_s": round(tempo, 3),
+        "aquecimento_s": aquecimento,
+        "bytes": anterior,
+        "bytes_medidos": medidos,
+        "vazao_mbps": medidos * 8 / (tempo * 1e6) if tempo > 0 else 0.0,
+        "pico_mbps": max(validos) if validos else None,
+        "intervalos": intervalos,
+        "ttfb_ms": ttfb[len(ttfb) // 2] if ttfb else None,
+        "por_fluxo": [{"url": t.url, "bytes": t.bytes, "conexoes": t.conexoes,
+                       "requisicoes": t.requisicoes, "erro": t.erro} for t in trabalhadores],
+        "erros": sorted({t.erro for t in trabalhadores if t.erro}),
+    }
+
+
+class ServidorLocal:
+    # Servidor HTTP/1.1 com keep-alive que responde GET /<bytes> com zeros da memória
+    # e aceita POST de qualquer tamanho
+    def __init__(self, host="127.0.0.1", porta=0, tamanho=100 * 2**20):
+        bloco = memoryview(bytes(min(tamanho, 1 * 2**20)))
+        self.tamanho = tamanho
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                try:
+                    total = int(self.path.strip("/") or tamanho)
+                except ValueError:
+                    total = tamanho
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(total))
+                self.end_headers()
+                try:
+                    while total > 0:
+                        n = min(total, len(bloco))
+                        self.wfile.write(bloco[:n])
+                        total -= n
+                except OSError:
+                    self.close_connection = True
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass  # cliente derrubou a conexão (o teste de carga encerra com RST)
+
+            def do_POST(self):
+                # Upload: o corpo é lido e descartado (usado pelo teste de latência sob carga)
+                restante = int(self.headers.get("Content-Length") or 0)
+                visao = memoryview(bytearray(len(bloco)))
+                try:
+                    while restante > 0:
+                        n = self.rfile.readinto(visao[:min(restante, len(visao))])
+                        if not n:
+                            break
+                        restante -= n
+                except OSError:
+                    pass
+                if restante > 0:
+                    self.close_connection = True
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer((host, porta), _Handler)
+        self.servidor.daemon_threads = True
+        self.host, self.porta = self.servidor.server_address[:2]
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.porta}/{self.tamanho}"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
@@ -0,0 +1,461 @@
+# Sondas HTTP(S) nativas com tempo por fase - captive portal, IP público e sites lentos
+# Cada requisição mede separadamente DNS (getaddrinfo), conexão TCP, handshake TLS,
+# espera pelo primeiro byte (TTFB, contado do envio do pedido) e o total: mostra se a
+# "internet lenta" é resolução, handshake ou servidor. Conexões keep-alive ficam num
+# Pool por (esquema, host, porta) e são reaproveitadas (sem DNS/TCP/TLS na 2ª vez).
+# Redirecionamentos são seguidos até `seguir` vezes e ficam registrados; a detecção de
+# captive portal pede URLs de teste conhecidas sem seguir e compara com o esperado.
+# ServidorStub responde localmente para testes sem internet.
+#
+# Uso: python web.py https://exemplo.com http://outro.net [--repeticoes 2] [--json]
+#      python web.py --captive
+
+import argparse
+import asyncio
+import json
+import socket
+import ssl
+import sys
+import time
+from urllib.parse import urljoin, urlsplit
+
+import instrumentos
+
+FASES = ("dns_ms", "conexao_ms", "tls_ms", "ttfb_ms")
+COLUNAS = {"dns_ms": "DNS", "conexao_ms": "TCP", "tls_ms": "TLS", "ttfb_ms": "TTFB"}
+NOMES_FASES = {"dns_ms": "DNS", "conexao_ms": "conexão TCP", "tls_ms": "handshake TLS", "ttfb_ms": "servidor"}
+REDIRECIONAMENTOS = (301, 302, 303, 307, 308)
+LIMITE_CORPO = 64 * 1024
+USER_AGENT = "curl/8.0"  # ifconfig.me e afins devolvem texto puro (não HTML) para o curl
+
+# URL de teste -> (status esperado, trecho esperado no corpo)
+CAPTIVE = {
+    "http://clients3.google.com/generate_204": (204, None),
+    "http://connectivitycheck.gstatic.com/generate_204": (204, None),
+    "http://detectportal.firefox.com/success.txt": (200, b"success"),
+    "http://captive.apple.com/hotspot-detect.html": (200, b"Success"),
+}
+IP_PUBLICO = "http://ifconfig.me/ip"
+URLS_PADRAO = ["https://www.google.com/", "https://www.cloudflare.com/", "https://www.gov.br/",
+               "https://www.globo.com/"]
+
+LIVRE, PORTAL, INTERCEPTADO, SEM_ACESSO = "livre", "portal", "interceptado", "sem_acesso"
+
+
+class ErroHTTP(Exception):
+    pass
+
+
+class _ConexaoVencida(Exception):
+    # Conexão do pool que o servidor já tinha fechado: refaz o pedido numa nova
+    pass
+
+
+class _Conexao:
+    __slots__ = ("chave", "reader", "writer", "ip")
+
+    def __init__(self, chave, reader, writer, ip):
+        self.chave = chave
+        self.reader = reader
+        self.writer = writer
+        self.ip = ip
+
+
+class Pool:
+    # Conexões ociosas por (esquema, host, porta); guarda no máximo `por_host` de cada
+    def __init__(self, por_host=4, contexto_ssl=None):
+        self.por_host = por_host
+        self._contexto = contexto_ssl
+        self._livres = {}
+        self.abertas = 0
+        self.reusadas = 0
+
+    def contexto_ssl(self):
+        # Carregar a cadeia de CAs custa alguns ms: uma vez por pool
+        if self._contexto is None:
+            self._contexto = ssl.create_default_context()
+        return self._contexto
+
+    def pegar(self, chave):
+        livres = self._livres.get(chave)
+        while livres:
+            c = livres.pop()
+            if not c.reader.at_eof() and not c.writer.is_closing():
+                self.reusadas += 1
+                return c
+            c.writer.close()
+        return None
+
+    def devolver(self, c):
+        livres = self._livres.setdefault(c.chave, [])
+        if len(livres) < self.por_host:
+            livres.append(c)
+        else:
+            c.writer.close()
+
+    def fechar(self):
+        for livres in self._livres.values():
+            for c in livres:
+                c.writer.close()
+        self._livres.clear()
+
+
+def _ms(inicio):
+    return (time.perf_counter() - inicio) * 1000
+
+
+async def _conectar(pool, chave, timeout, fases, estado):
+    esquema, host, porta = chave
+    loop = asyncio.get_running_loop()
+    estado["fase"] = "dns"
+    try:
+        # IP literal: nada a resolver (e sem passar pela thread do getaddrinfo)
+        infos = socket.getaddrinfo(host, porta, type=socket.SOCK_STREAM, flags=socket.AI_NUMERICHOST)
+    except socket.gaierror:
+        t = time.perf_counter()
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, porta, type=socket.SOCK_STREAM), timeout)
+        fases["dns_ms"] += _ms(t)
+    familia, tipo, proto, _, endereco = infos[0]
+    estado["fase"] = "conexao"
+    sock = socket.socket(familia, tipo, proto)
+    sock.setblocking(False)
+    try:
+        t = time.perf_counter()
+        await asyncio.wait_for(loop.sock_connect(sock, endereco), timeout)
+        fases["conexao_ms"] += _ms(t)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if esquema == "https":
+            estado["fase"] = "tls"
+            t = time.perf_counter()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(sock=sock, ssl=pool.contexto_ssl(), server_hostname=host), timeout)
+            fases["tls_ms"] = (fases["tls_ms"] or 0.0) + _ms(t)
+        else:
+            reader, writer = await asyncio.open_connection(sock=sock)
+    except BaseException:
+        sock.close()
+        raise
+    pool.abertas += 1
+    return _Conexao(chave, reader, writer, endereco[0])
+
+
+async def _ler_corpo(reader, status, headers, metodo, limite, timeout):
+    # Devolve (corpo até `limite`, bytes do corpo, conexão reaproveitável)
+    if metodo == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return b"", 0, True
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        partes, total = [], 0
+        while True:
+            tamanho = int((await asyncio.wait_for(reader.readline(), timeout)).split(b";")[0], 16)
+            if tamanho == 0:
+                while (await asyncio.wait_for(reader.readline(), timeout)).strip():
+                    pass
+                return b"".join(partes), total, True
+            if total + tamanho > limite:
+                return b"".join(partes), total, False
+            partes.append(await asyncio.wait_for(reader.readexactly(tamanho), timeout))
+            total += tamanho
+            await asyncio.wait_for(reader.readline(), timeout)
+    if "content-length" in headers:
+        tamanho = int(headers["content-length"])
+        corpo = await asyncio.wait_for(reader.readexactly(min(tamanho, limite)), timeout)
+        return corpo, len(corpo), tamanho <= limite
+    corpo = await asyncio.wait_for(reader.read(limite), timeout)
+    return corpo, len(corpo), False
+
+
+async def _requisitar(pool, url, metodo, cabecalhos, timeout, limite, fases, estado, reaproveitar=True):
+    partes = urlsplit(url)
+    if partes.scheme not in ("http", "https") or not partes.hostname:
+        raise ValueError(f"URL inválida: {url}")
+    porta = partes.port or (443 if partes.scheme == "https" else 80)
+    chave = (partes.scheme, partes.hostname, porta)
+    caminho = (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+    c = pool.pegar(chave) if reaproveitar else None
+    reusada = c is not None
+    if c is None:
+        c = await _conectar(pool, chave, timeout, fases, estado)
+    devolver = False
+    try:
+        host = partes.hostname if partes.port is None else f"{partes.hostname}:{porta}"
+        pedido = {"Host": host, "User-Agent": USER_AGENT, "Accept": "*/*", "Connection": "keep-alive"}
+        pedido.update(cabecalhos or {})
+        estado["fase"] = "envio"
+        t = time.perf_counter()
+        try:
+            c.writer.write((f"{metodo} {caminho} HTTP/1.1\r\n" +
+                            "".join(f"{k}: {v}\r\n" for k, v in pedido.items()) + "\r\n").encode("latin-1"))
+            await c.writer.drain()
+            estado["fase"] = "ttfb"
+            linha = await asyncio.wait_for(c.reader.readline(), timeout)
+        except ConnectionError:
+            if reusada:
+                raise _ConexaoVencida()
+            raise
+        if not linha:
+            if reusada:
+                raise _ConexaoVencida()
+            raise ErroHTTP("Conexão fechada sem resposta")
+        fases["ttfb_ms"] += _ms(t)
+        try:
+            versao, status = linha.split()[:2]
+            status = int(status)
+        except ValueError:
+            raise ErroHTTP(f"Linha de status inválida: {linha[:60]!r}")
+        estado["fase"] = "corpo"
+        headers = {}
+        while True:
+            linha = await asyncio.wait_for(c.reader.readline(), timeout)
+            if not linha.strip():
+                break
+            k, _, v = linha.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        corpo, tamanho, inteira = await _ler_corpo(c.reader, status, headers, metodo, limite, timeout)
+        instrumentos.contar("bytes", tamanho, origem="http", sentido="rx")
+        devolver = (inteira and versao == b"HTTP/1.1" and
+                    headers.get("connection", "").lower() != "close")
+        return {"status": status, "cabecalhos": headers, "corpo": corpo, "bytes": tamanho,
+                "ip": c.ip, "reusada": reusada}
+    finally:
+        if devolver:
+            pool.devolver(c)
+        else:
+            c.writer.close()
+
+
+def gargalo(fases):
+    # A fase mais lenta entre DNS, TCP, TLS e servidor
+    medidas = {f: fases[f] for f in FASES if fases.get(f)}
+    return max(medidas, key=medidas.get) if medidas else None
+
+
+async def sondar(url, timeout=5.0, pool=None, seguir=5, metodo="GET", cabecalhos=None, limite=LIMITE_CORPO):
+    # Devolve {url, url_final, status, fases, gargalo, ip, reusada, redirecionamentos,
+    # cabecalhos, corpo, bytes, erro, fase_erro}; as fases somam toda a cadeia de redirecionamentos.
+    # Cada salto em `redirecionamentos` guarda seu ip e se reaproveitou conexão; `reusada`
+    # só é True se todos os saltos (inclusive o último) reaproveitaram.
+    proprio = pool is None
+    pool = pool or Pool()
+    fases = {"dns_ms": 0.0, "conexao_ms": 0.0, "tls_ms": None, "ttfb_ms": 0.0}
+    estado = {"fase": None}
+    r = {"url": url, "url_final": url, "status": None, "fases": fases, "gargalo": None, "ip": None,
+         "reusada": False, "redirecionamentos": [], "cabecalhos": {}, "corpo": b"", "bytes": 0,
+         "erro": None, "fase_erro": None}
+    inicio = time.perf_counter()
+    reusadas = []
+    try:
+        atual = url
+        while True:
+            instrumentos.contar("sondas", metodo="http")
+            try:
+                resposta = await _requisitar(pool, atual, metodo, cabecalhos, timeout, limite, fases, estado)
+            except _ConexaoVencida:
+                resposta = await _requisitar(pool, atual, metodo, cabecalhos, timeout, limite, fases, estado,
+                                             reaproveitar=False)
+            r.update(resposta, url_final=atual)
+            reusadas.append(resposta["reusada"])
+            r["reusada"] = all(reusadas)
+            destino = resposta["cabecalhos"].get("location")
+            if resposta["status"] not in REDIRECIONAMENTOS or not destino or len(r["redirecionamentos"]) >= seguir:
+                break
+            destino = urljoin(atual, destino)
+            r["redirecionamentos"].append({"status": resposta["status"], "de": atual, "para": destino,
+                                           "ip": resposta["ip"], "reusada": resposta["reusada"]})
+            atual = destino
+    except asyncio.TimeoutError:
+        instrumentos.contar("timeouts", origem="http")
+        r["erro"], r["fase_erro"] = f"timeout ({estado['fase']})", estado["fase"]
+    except (OSError, ErroHTTP, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+        r["erro"], r["fase_erro"] = str(e) or type(e).__name__, estado["fase"]
+    finally:
+        if proprio:
+            pool.fechar()
+    fases["total_ms"] = _ms(inicio)
+    r["gargalo"] = gargalo(fases)
+    return r
+
+
+async def sondar_varias(urls, concorrencia=8, timeout=5.0, seguir=5, repeticoes=1, pool=None, **kwargs):
+    # Todas as URLs em paralelo num pool só; a partir da 2ª repetição as conexões já
+    # estão abertas e sobra só o tempo de servidor. Resultados na ordem de `urls`.
+    proprio = pool is None
+    pool = pool or Pool()
+    sem = asyncio.Semaphore(concorrencia)
+
+    async def _uma(url):
+        async with sem:
+            return await sondar(url, timeout, pool, seguir, **kwargs)
+
+    try:
+        resultados = []
+        for rodada in range(repeticoes):
+            for r in await asyncio.gather(*(_uma(u) for u in urls)):
+                r["rodada"] = rodada + 1
+                resultados.append(r)
+        return resultados
+    finally:
+        if proprio:
+            pool.fechar()
+
+
+def classificar_captive(r, esperado=204, trecho=None):
+    if r["erro"]:
+        return SEM_ACESSO
+    if r["status"] == esperado and (trecho is None or trecho in r["corpo"]):
+        return LIVRE
+    if r["status"] in REDIRECIONAMENTOS:
+        return PORTAL
+    return INTERCEPTADO  # resposta trocada no caminho: portal sem redirecionar ou proxy transparente
+
+
+async def detectar_captive(urls=None, timeout=5.0):
+    # urls: {url: (status esperado, trecho do corpo)} ou lista (esperado 204)
+    urls = urls or CAPTIVE
+    if not isinstance(urls, dict):
+        urls = {u: CAPTIVE.get(u, (204, None)) for u in urls}
+    sondas = await sondar_varias(list(urls), timeout=timeout, seguir=0)
+    for r in sondas:
+        r["captive"] = classificar_captive(r, *urls[r["url"]])
+    estados = {r["captive"] for r in sondas}
+    estado = next((e for e in (PORTAL, INTERCEPTADO, LIVRE) if e in estados), SEM_ACESSO)
+    # Location pode ser relativo ("/login"): resolvido contra a URL sondada, como nos saltos de sondar()
+    portal = next((urljoin(r["url"], r["cabecalhos"]["location"]) for r in sondas
+                   if r["captive"] == PORTAL and r["cabecalhos"].get("location")), None)
+    return {"estado": estado, "portal": portal, "sondas": sondas}
+
+
+def resumo(r):
+    # Sem corpo nem cabecalhos: cabe no JSON do checkup e do armazém
+    d = {k: v for k, v in r.items() if k not in ("corpo", "cabecalhos")}
+    d["fases"] = {k: round(v, 2) if v is not None else None for k, v in r["fases"].items()}
+    d["location"] = r["cabecalhos"].get("location")
+    return d
+
+
+def testar(urls, **kwargs):
+    return asyncio.run(sondar_varias(urls, **kwargs))
+
+
+def captive(**kwargs):
+    return asyncio.run(detectar_captive(**kwargs))
+
+
+def formatar(resultados):
+    # Uma linha por URL com as fases em ms; erro, redirecionamentos e gargalo embaixo
+    fmt = lambda v: f"{v:7.1f}" if v is not None else "      -"
+    linhas = [f"{'HTTP':>4} {'DNS':>7} {'TCP':>7} {'TLS':>7} {'TTFB':>7} {'Total':>7}  URL"]
+    for r in resultados:
+        f = r["fases"]
+        status = str(r["status"]) if r["status"] else "-"
+        linhas.append(f"{status:>4} {fmt(f['dns_ms'])} {fmt(f['conexao_ms'])} {fmt(f['tls_ms'])} "
+                      f"{fmt(f['ttfb_ms'])} {fmt(f['total_ms'])}  {r['url']}")
+        for red in r["redirecionamentos"]:
+            linhas.append(f"     {red['status']} -> {red['para']}")
+        if r["erro"]:
+            linhas.append(f"     erro: {r['erro']}")
+        elif r["gargalo"]:
+            extra = ", conexão reaproveitada" if r.get("reusada") else ""
+            linhas.append(f"     mais lento: {NOMES_FASES[r['gargalo']]}{extra}")
+    return "\n".join(linhas)
+
+
+class ServidorStub:
+    # Servidor HTTP/1.1 mínimo (keep-alive) para testes offline.
+    # rotas: {"/caminho": (status, corpo) ou (status, corpo, {cabeçalhos})};
+    # atraso: espera antes de cada resposta (aparece como TTFB).
+    ROTAS_PADRAO = {
+        "/generate_204": (204, b""),
+        "/success.txt": (200, b"success\n"),
+        "/ip": (200, b"203.0.113.7\n"),
+        "/portal": (302, b"", {"Location": "/login"}),
+        "/login": (200, b"<html>Entre com seu voucher</html>"),
+    }
+
+    def __init__(self, rotas=None, host="127.0.0.1", porta=0, atraso=0.0, contexto_ssl=None):
+        self.rotas = dict(rotas or self.ROTAS_PADRAO)
+        self.host = host
+        self.porta = porta
+        self.atraso = atraso
+        self.contexto_ssl = contexto_ssl
+        self.conexoes = 0
+        self.requisicoes = 0
+        self._servidor = None
+
+    def url(self, caminho="/"):
+        esquema = "https" if self.contexto_ssl else "http"
+        return f"{esquema}://{self.host}:{self.porta}{caminho}"
+
+    async def _atender(self, reader, writer):
+        self.conexoes += 1
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    return
+                metodo, caminho = linha.decode("latin-1").split()[:2]
+                fechar = False
+                while True:
+                    cabecalho = await reader.readline()
+                    if not cabecalho.strip():
+                        break
+                    if cabecalho.lower().startswith(b"connection:") and b"close" in cabecalho.lower():
+                        fechar = True
+                self.requisicoes += 1
+                status, corpo, *extras = self.rotas.get(caminho, (404, b"nao encontrado\n"))
+                if self.atraso:
+                    await asyncio.sleep(self.atraso)
+                cabecalhos = {"Content-Length": str(len(corpo))}
+                cabecalhos.update(extras[0] if extras else {})
+                writer.write((f"HTTP/1.1 {status} X\r\n" +
+                              "".join(f"{k}: {v}\r\n" for k, v in cabecalhos.items()) + "\r\n").encode() +
+                             (b"" if metodo == "HEAD" else corpo))
+                await writer.drain()
+                if fechar:
+                    return
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # cliente sumiu ou o laço está encerrando
+        finally:
+            writer.close()
+
+    async def iniciar(self):
+        self._servidor = await asyncio.start_server(self._atender, self.host, self.porta, ssl=self.contexto_ssl)
+        self.porta = self._servidor.sockets[0].getsockname()[1]
+        return self
+
+    def parar(self):
+        if self._servidor:
+            self._servidor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sondas HTTP(S) com tempo por fase (DNS, TCP, TLS, TTFB)")
+    parser.add_argument("urls", nargs="*", help=f"padrão: {' '.join(URLS_PADRAO)}")
+    parser.add_argument("--captive", action="store_true", help="detecta captive portal")
+    parser.add_argument("--repeticoes", type=int, default=1, help="rodadas (a 2ª reaproveita conexões)")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--seguir", type=int, default=5, help="máximo de redirecionamentos")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    if args.captive:
+        r = captive(urls=args.urls or None, timeout=args.timeout)
+        if args.json:
+            print(json.dumps({"estado": r["estado"], "portal": r["portal"],
+                              "sondas": [resumo(s) for s in r["sondas"]]}, ensure_ascii=False, indent=2))
+        else:
+            print(formatar(r["sondas"]))
+            print(f"\nCaptive portal: {r['estado']}" + (f" -> {r['portal']}" if r["portal"] else ""))
+        return 0 if r["estado"] == LIVRE else 1
+
+    resultados = testar(args.urls or URLS_PADRAO, concorrencia=args.concorrencia, timeout=args.timeout,
+                        seguir=args.seguir, repeticoes=args.repeticoes)
+    if args.json:
+        print(json.dumps([resumo(r) for r in resultados], ensure_ascii=False, indent=2))
+    else:
+        print(formatar(resultados))
+    return 1 if all(r["erro"] for r in resultados) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+# Levantamento Wi-Fi contínuo - usado por wifi_site_survey
+# Lê o `nmcli -t` (saída terse: campos separados por ':' com '\:' e '\\' escapados,
+# então SSID com espaço ou dois-pontos não quebra a linha) a cada `intervalo`
+# segundos e guarda uma série compacta de sinal por BSSID. Cada varredura devolve
+# só o que mudou (novos, alterados, sumidos) para a tela atualizar linha a linha.
+#
+# Congestionamento por canal: em 2,4 GHz um canal de 20 MHz invade até 4 canais
+# vizinhos (espaçamento de 5 MHz), então cada AP conta inteiro no próprio canal
+# (co-canal) e com peso decrescente nos vizinhos (sobreposição), ponderado pelo
+# sinal. Em 5/6 GHz os canais de 20 MHz não se sobrepõem: só conta co-canal.
+#
+# Mapa de calor: o técnico informa o cômodo ("sala", "quarto"...) e cada
+# varredura fica registrada com ele; no fim sai a média de sinal por cômodo.
+#
+#   python wifi.py [--intervalo 5] [--duracao 60] [--local sala] [-i wlan0] [--json]
+
+import argparse
+import json
+import sys
+import time
+from array import array
+
+import armazem
+import comandos
+import registro
+
+CAMPOS = ("IN-USE", "BSSID", "SSID", "CHAN", "FREQ", "RATE", "SIGNAL", "SECURITY")
+CANAIS_24_LIVRES = (1, 6, 11)
+CANAIS_5_COMUNS = (36, 40, 44, 48, 149, 153, 157, 161)
+ALCANCE_SOBREPOSICAO = 5   # canais 2,4 GHz a menos de 5 de distância se sobrepõem
+LIMITE_SERIE = 720         # 1 h de histórico por BSSID a cada 5 s
+BARRAS = "▁▂▃▄▅▆▇█"
+
+
+def dividir_terse(linha):
+    # "a\:b:c\\d:e" -> ["a:b", "c\d", "e"]
+    campos, atual, escape = [], [], False
+    for c in linha:
+        if escape:
+            atual.append(c)
+            escape = False
+        elif c == "\\":
+            escape = True
+        elif c == ":":
+            campos.append("".join(atual))
+            atual = []
+        else:
+            atual.append(c)
+    campos.append("".join(atual))
+    return campos
+
+
+def _numero(texto):
+    digitos = "".join(c for c in texto if c.isdigit())
+    return int(digitos) if digitos else None
+
+
+def banda(freq_mhz):
+    if freq_mhz is None:
+        return None
+    if freq_mhz < 3000:
+        return "2.4"
+    return "6" if freq_mhz >= 5925 else "5"
+
+
+def varrer(interface=None, rescan="auto", timeout=20):
+    # Uma varredura; devolve (redes, erro). Cada rede é um dict com os campos de CAMPOS.
+    if not comandos.existe("nmcli"):
+        return [], "Erro: 'nmcli' não encontrado. Instale o NetworkManager para usar esta função."
+    args = ["nmcli", "-t", "-f", ",".join(CAMPOS), "device", "wifi", "list"]
+    if interface:
+        args += ["ifname", interface]
+    args += ["--rescan", rescan]
+    saida, erro, codigo = comandos.executar(args, timeout)
+    if codigo != 0:
+        return [], erro or f"nmcli terminou com código {codigo}"
+    redes = []
+    for linha in saida.splitlines():
+        partes = dividir_terse(linha)
+        if len(partes) != len(CAMPOS):
+            continue
+        em_uso, bssid, ssid, canal, freq, taxa, sinal, seguranca = partes
+        if not bssid:
+            continue
+        redes.append({
+            "bssid": bssid.upper(),
+            "ssid": ssid or "(oculta)",
+            "canal": _numero(canal),
+            "freq_mhz": _numero(freq),
+            "taxa": taxa,
+            "sinal": _numero(sinal) or 0,
+            "seguranca": seguranca or "aberta",
+            "em_uso": em_uso.strip() == "*",
+        })
+    return redes, None
+
+
+class HistoricoBSSID:
+    # Série de sinal (0-100, um byte por amostra) com instante relativo ao início
+    __slots__ = ("bssid", "ssid", "canal", "freq_mhz", "seguranca", "em_uso",
+                 "ts", "sinal", "vistos", "ultimo_ts", "minimo", "maximo")
+
+    def __init__(self, rede):
+        self.bssid = rede["bssid"]
+        self.ts = array("f")
+        self.sinal = array("B")
+        self.vistos = 0
+        self.minimo = 100
+        self.maximo = 0
+        self.ultimo_ts = None
+        self.atualizar_dados(rede)
+
+    def atualizar_dados(self, rede):
+        self.ssid = rede["ssid"]
+        self.canal = rede["canal"]
+        self.freq_mhz = rede["freq_mhz"]
+        self.seguranca = rede["seguranca"]
+        self.em_uso = rede["em_uso"]
+
+    def adicionar(self, t, sinal):
+        if len(self.sinal) >= LIMITE_SERIE:
+            # Descarta a metade mais antiga de uma vez (evita deslocar a cada amostra)
+            del self.ts[:LIMITE_SERIE // 2]
+            del self.sinal[:LIMITE_SERIE // 2]
+        self.ts.append(t)
+        self.sinal.append(max(0, min(100, sinal)))
+        self.vistos += 1
+        self.ultimo_ts = t
+        self.minimo = min(self.minimo, sinal)
+        self.maximo = max(self.maximo, sinal)
+
+    @property
+    def atual(self):
+        return self.sinal[-1] if self.sinal else None
+
+    @property
+    def media(self):
+        return sum(self.sinal) / len(self.sinal) if self.sinal else None
+
+    def grafico(self, n=12):
+        return "".join(BARRAS[min(len(BARRAS) - 1, s * len(BARRAS) // 101)] for s in self.sinal[-n:])
+
+    def como_dict(self, serie=False):
+        d = {"bssid": self.bssid, "ssid": self.ssid, "canal": self.canal, "freq_mhz": self.freq_mhz,
+             "banda": banda(self.freq_mhz), "seguranca": self.seguranca, "em_uso": self.em_uso,
+             "sinal": self.atual, "sinal_medio": round(self.media, 1) if self.sinal else None,
+             "sinal_min": self.minimo, "sinal_max": self.maximo, "vistos": self.vistos}
+        if serie:
+            d["serie"] = [[round(t, 1), s] for t, s in zip(self.ts, self.sinal)]
+        return d
+
+
+class Levantamento:
+    def __init__(self, db=None, interface=None, sumir_apos=3):
+        self.db = db
+        self.interface = interface
+        self.sumir_apos = sumir_apos    # varreduras sem ver o BSSID até considerá-lo sumido
+        self.inicio = time.time()
+        self.historicos = {}
+        self.varreduras = 0
+        self.local = None
+        self.por_local = {}              # local -> bssid -> [soma, n]
+        self._ausente = {}
+
+    def registrar(self, redes, ts=None):
+        # Incorpora uma varredura; devolve {"novos", "alterados", "sumidos"} (listas de BSSID)
+        ts = time.time() if ts is None else ts
+        t = ts - self.inicio
+        self.varreduras += 1
+        novos, alterados, vistos = [], [], set()
+        for rede in redes:
+            bssid = rede["bssid"]
+            vistos.add(bssid)
+            h = self.historicos.get(bssid)
+            if h is None:
+                h = self.historicos[bssid] = HistoricoBSSID(rede)
+                novos.append(bssid)
+            else:
+                mudou = (h.atual != rede["sinal"] or h.canal != rede["canal"]
+                         or h.em_uso != rede["em_uso"] or bssid in self._ausente)
+                h.atualizar_dados(rede)
+                if mudou:
+                    alterados.append(bssid)
+            h.adicionar(t, rede["sinal"])
+            self._ausente.pop(bssid, None)
+            if self.local:
+                acumulado = self.por_local.setdefault(self.local, {}).setdefault(bssid, [0, 0])
+                acumulado[0] += rede["sinal"]
+                acumulado[1] += 1
+        sumidos = []
+        for bssid in self.historicos:
+            if bssid in vistos:
+                continue
+            faltas = self._ausente[bssid] = self._ausente.get(bssid, 0) + 1
+            if faltas == self.sumir_apos:
+                sumidos.append(bssid)
+        if self.db:
+            amostra = registro.Resultado("wifi_amostra", "Wi-Fi: varredura", interface=self.interface,
+                                         detalhes={"local": self.local, "t_s": round(t, 1),
+                                                   "redes": {r["bssid"]: r["sinal"] for r in redes}}, ts=ts)
+            amostra.medir("redes", len(redes), "", "Redes vistas")
+            amostra.medir("sinal", max((r["sinal"] for r in redes), default=None), "%", "Melhor sinal", casas=0)
+            self.db.registrar_resultado(amostra)
+        return {"novos": novos, "alterados": alterados, "sumidos": sumidos}
+
+    def sumido(self, bssid):
+        return self._ausente.get(bssid, 0) >= self.sumir_apos
+
+    def ativos(self):
+        return [h for b, h in self.historicos.items() if not self.sumido(b)]
+
+    def canais(self):
+        # {canal: {"banda", "aps", "cocanal", "sobreposicao", "pontuacao"}}; pontuação maior = pior
+        ativos = self.ativos()
+        candidatos = {(c, "2.4") for c in CANAIS_24_LIVRES}
+        candidatos |= {(c, "5") for c in CANAIS_5_COMUNS} if any(banda(h.freq_mhz) == "5" for h in ativos) else set()
+        candidatos |= {(h.canal, banda(h.freq_mhz)) for h in ativos if h.canal}
+        resultado = {}
+        for canal, faixa in sorted(candidatos, key=lambda x: (x[1], x[0])):
+            cocanal = sobreposicao = 0.0
+            aps = 0
+            for h in ativos:
+                if banda(h.freq_mhz) != faixa or not h.canal or h.atual is None:
+                    continue
+                peso = h.atual / 100
+                distancia = abs(h.canal - canal)
+                if distancia == 0:
+                    cocanal += peso
+                    aps += 1
+                elif faixa == "2.4" and distancia < ALCANCE_SOBREPOSICAO:
+                    sobreposicao += peso * (1 - distancia / ALCANCE_SOBREPOSICAO)
+            resultado[canal] = {"banda": faixa, "aps": aps, "cocanal": round(cocanal, 2),
+                                "sobreposicao": round(sobreposicao, 2),
+                                "pontuacao": round(cocanal + sobreposicao, 2)}
+        return resultado
+
+    def recomendacao(self):
+        # Melhor canal por banda entre os candidatos (2,4 GHz só entre 1, 6 e 11)
+        canais = self.canais()
+        melhor = {}
+        for canal, c in canais.items():
+            if c["banda"] == "2.4" and canal not in CANAIS_24_LIVRES:
+                continue
+            atual = melhor.get(c["banda"])
+            if atual is None or c["pontuacao"] < canais[atual]["pontuacao"]:
+                melhor[c["banda"]] = canal
+        return melhor
+
+    def mapa_calor(self):
+        # {local: {bssid: sinal médio}} das varreduras feitas em cada cômodo
+        return {local: {b: round(s / n, 1) for b, (s, n) in redes.items()}
+                for local, redes in self.por_local.items()}
+
+    def resumo(self, serie=False):
+        return {
+            "varreduras": self.varreduras,
+            "duracao_s": round(time.time() - self.inicio, 1),
+            "redes": [h.como_dict(serie) for h in sorted(self.historicos.values(),
+                                                          key=lambda h: -(h.atual or 0))],
+            "canais": self.canais(),
+            "recomendado": self.recomendacao(),
+            "mapa_calor": self.mapa_calor(),
+        }
+
+
+def acompanhar(levantamento, intervalo=5.0, duracao=None, ao_varrer=None, ao_erro=None, parar=None,
+               espera_inicial=0.0):
+    # Varre a cada `intervalo` s pelo relógio (sem acumular atraso) até `duracao`,
+    # parar() devolver True ou Ctrl+C. ao_varrer(mudancas) recebe o que mudou.
+    inicio = time.monotonic()
+    if espera_inicial:
+        time.sleep(espera_inicial)
+    proximo = time.monotonic()
+    while True:
+        redes, erro = varrer(levantamento.interface)
+        if erro:
+            if ao_erro:
+                ao_erro(erro)
+            if not levantamento.varreduras:
+                return erro
+        else:
+            mudancas = levantamento.registrar(redes)
+            if ao_varrer:
+                ao_varrer(mudancas)
+        proximo += intervalo
+        agora = time.monotonic()
+        if (duracao is not None and proximo - inicio > duracao) or (parar and parar()):
+            break
+        time.sleep(max(0.0, proximo - agora))
+    if levantamento.db:
+        levantamento.db.flush()
+    return None
+
+
+def formatar_canais(levantamento):
+    canais = levantamento.canais()
+    recomendado = levantamento.recomendacao()
+    linhas = [f"{'Canal':>5} {'Banda':>5} {'APs':>4} {'Co-canal':>9} {'Sobrepos.':>9} {'Pontuação':>9}"]
+    for canal, c in canais.items():
+        marca = "  ← recomendado" if recomendado.get(c["banda"]) == canal else ""
+        linhas.append(f"{canal:>5} {c['banda']:>5} {c['aps']:>4} {c['cocanal']:>9.2f} "
+                      f"{c['sobreposicao']:>9.2f} {c['pontuacao']:>9.2f}{marca}")
+    return "\n".join(linhas)
+
+
+def formatar_mapa(levantamento):
+    mapa = levantamento.mapa_calor()
+    if not mapa:
+        return "Sem cômodos registrados (informe --local ou o cômodo a cada passada)."
+    bssids = sorted({b for redes in mapa.values() for b in redes},
+                    key=lambda b: -max(r.get(b, 0) for r in mapa.values()))[:8]
+    nomes = {b: levantamento.historicos[b].ssid[:14] for b in bssids}
+    linhas = [f"{'Cômodo':<14} " + " ".join(f"{nomes[b]:>14}" for b in bssids)]
+    for local, redes in mapa.items():
+        linhas.append(f"{local[:14]:<14} " + " ".join(
+            f"{redes[b]:>13.0f}%" if b in redes else f"{'-':>14}" for b in bssids))
+    return "\n".join(linhas)
+
+
+def formatar(levantamento):
+    linhas = [f"{'SSID':<24} {'BSSID':<17} {'Canal':>5} {'Sinal':>5} {'Méd':>4} {'Mín':>4} {'Máx':>4}  Segurança"]
+    for h in sorted(levantamento.historicos.values(), key=lambda h: -(h.atual or 0)):
+        uso = "*" if h.em_uso else " "
+        linhas.append(f"{uso}{h.ssid[:23]:<23} {h.bssid:<17} {h.canal or '-':>5} {h.atual:>4}% "
+                      f"{h.media:>4.0f} {h.minimo:>4} {h.maximo:>4}  {h.seguranca}")
+    linhas.append("")
+    linhas.append(formatar_canais(levantamento))
+    if levantamento.por_local:
+        linhas.append("")
+        linhas.append(formatar_mapa(levantamento))
+    linhas.append(f"\n{levantamento.varreduras} varredura(s), {len(levantamento.historicos)} BSSID(s)")
+    return "\n".join(linhas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="elias --wifi", description="Levantamento Wi-Fi contínuo")
+    parser.add_argument("-i", "--interface")
+    parser.add_argument("--intervalo", type=float, default=5.0)
+    parser.add_argument("--duracao", type=float, help="segundos (padrão: até Ctrl+C)")
+    parser.add_argument("--local", help="cômodo/ponto onde o técnico está (mapa de calor)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    lev = Levantamento(db=armazem.abrir(), interface=args.interface)
+    lev.local = args.local
+
+    def _ao_varrer(m):
+        if args.json:
+            return
+        hora = time.strftime("%H:%M:%S")
+        for b in m["novos"]:
+            h = lev.historicos[b]
+            print(f"[{hora}] + {h.ssid} {b} canal {h.canal} sinal {h.atual}%", flush=True)
+        for b in m["alterados"]:
+            h = lev.historicos[b]
+            print(f"[{hora}]   {h.ssid} {b} sinal {h.atual}% {h.grafico()}", flush=True)
+        for b in m["sumidos"]:
+            print(f"[{hora}] - {lev.historicos[b].ssid} {b} sumiu", flush=True)
+
+    try:
+        erro = acompanhar(lev, args.intervalo, args.duracao, _ao_varrer,
+                          ao_erro=lambda e: print(e, file=sys.stderr))
+    except KeyboardInterrupt:
+        erro = None
+    if erro:
+        return 1
+    print(json.dumps(lev.resumo(serie=True), ensure_ascii=False, indent=2) if args.json else "\n" + formatar(lev))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())